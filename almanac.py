@@ -0,0 +1,188 @@
+import calendar
+import datetime
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from skyfield.searchlib import find_discrete
+
+import series_cache
+from ephemeris_registry import get_timescale
+from instrumentation import timed, count
+from moon_events import EVENT_EPSILON_DAYS, moon_quarter_at, moon_sign_index_at
+from moon_phases import find_moon_eclipses
+from moon_zodiac import get_gate_lines
+from skyfield_helpers import date_to_timescale_time, dates_to_timescale_time, get_file_path
+from timeline import DATE_RANGE
+
+# === daily almanac ===
+# A row per local calendar day of a year: the Moon at local noon (phase, illuminated fraction, longitude, sign, gate
+# and line) and the events of the day (the quarter, the sign ingress and the eclipse, with their local clock times).
+# A year is computed at once: one vectorized phase and longitude query at its noons, one search of the events of
+# the whole year on the polynomials of the engine, each event put in its day by a binary search in the local
+# midnights. The table is stored under the cache root like the series cache, keyed by the code and the ephemeris,
+# and per year and time zone (the UTC offsets of its days), so the days of a month or a year for the calendar grid
+# are a slice of an array in memory.
+# A day has at most one event of each kind: quarters are ~7 days apart, the Moon stays ~2.5 days in a sign.
+
+ALMANAC_FORMAT_VERSION = 1
+ALMANAC_YEARS = (DATE_RANGE[0].year, DATE_RANGE[1].year - 1)
+NO_EVENT = -1  # in quarter, ingress_sign and the minutes of a day without that event
+
+almanac_dtype = np.dtype([
+    ('date', 'datetime64[D]'),  # local date
+    ('noon_tt', 'f8'),
+    ('phase', 'f8'),  # deg., at local noon
+    ('illumination', 'f8'),  # illuminated fraction of the disc 0 - 1, at local noon
+    ('lon', 'f8'),  # ecliptic longitude (deg.), at local noon
+    ('sign', 'i1'),  # index in moon_zodiac.signs
+    ('gate', 'i1'),
+    ('line', 'i1'),
+    ('quarter', 'i1'),  # index in moon_events.quarter_names
+    ('quarter_tt', 'f8'),
+    ('quarter_minute', 'i2'),  # local clock time, minutes from midnight
+    ('ingress_sign', 'i1'),
+    ('ingress_tt', 'f8'),
+    ('ingress_minute', 'i2'),
+    ('eclipse', 'i1'),  # rating of an eclipse maximum in the day, 0 none, see eclipse_catalog.eclipse_types
+])
+
+_lock = threading.Lock()
+_almanac_dir = None
+_years = {}  # (year, zone key) -> table
+_zone_keys = {}  # (year, tzinfo) -> zone key, so that a year in memory is found without converting its days
+
+
+def get_almanac_dir():
+    global _almanac_dir
+    if _almanac_dir is None:
+        import body_positions, chebyshev_engine, eclipse_catalog, ephemeris_registry
+        import moon_events, moon_phases, moon_zodiac
+
+        # the gates come from the hexagram table, the key follows its content as it does the ephemeris
+        hexagram_path = get_file_path('./hexagram_data.txt')
+        version = (f"almanac {ALMANAC_FORMAT_VERSION} {series_cache.engine} "
+                   f"{os.path.getsize(hexagram_path)} {series_cache.file_digest(hexagram_path)}")
+        key = series_cache.cache_key(version,
+                                     (body_positions.__file__, chebyshev_engine.__file__, eclipse_catalog.__file__,
+                                      ephemeris_registry.__file__, moon_events.__file__, moon_phases.__file__,
+                                      moon_zodiac.__file__, series_cache.__file__, __file__))
+        # per engine, the almanac of one is not stale for the other
+        prefix = f"almanac-{series_cache.engine}-"
+        _almanac_dir = series_cache.make_cache_dir(os.path.join(series_cache.cache_root, prefix + key), prefix)
+    return _almanac_dir
+
+
+def clear_memory():
+    global _almanac_dir
+    with _lock:
+        _years.clear()
+        _zone_keys.clear()
+        _almanac_dir = None
+
+
+def _local_times(year, hour, tz):
+    # aware datetimes of an hour of every day of a year in a zone (tzinfo, None for the local zone of the system)
+    first = datetime.datetime(year, 1, 1, hour)
+    days = [first + datetime.timedelta(days=i) for i in range(366 if calendar.isleap(year) else 365)]
+    if tz is None:
+        return [day.astimezone() for day in days]
+    return [day.replace(tzinfo=tz) for day in days]
+
+
+def _zone_key(midnights, noons):
+    # the UTC offsets of a year of days identify its zone, e.g. also its daylight saving time rules of that year
+    offsets = np.array([date.utcoffset().total_seconds() for date in midnights + noons], dtype=np.int32)
+    return hashlib.sha1(offsets.tobytes()).hexdigest()[:12]
+
+
+def _local_minutes(tt, tz):
+    # local clock times (minutes from midnight) of TT times
+    times = get_timescale().tt_jd(tt).utc_datetime()
+    local_times = [time.astimezone(tz) for time in np.atleast_1d(times)]
+    return np.array([time.hour * 60 + time.minute for time in local_times], dtype=np.int16)
+
+
+# the events of a year are searched on the polynomials of the engine, where moon_events searches the ephemeris:
+# as precise as the engine, a fraction of a second for times shown to the minute
+def _quarter_at(t):
+    return (series_cache.moon_phase_at(t) // 90).astype(int) % 4
+
+_quarter_at.step_days = moon_quarter_at.step_days
+
+
+def _sign_index_at(t):
+    return (series_cache.moon_longitude_at(t) // 30).astype(int) % 12
+
+_sign_index_at.step_days = moon_sign_index_at.step_days
+
+
+def _search_quarters(start_time, end_time):
+    return find_discrete(start_time, end_time, _quarter_at, epsilon=EVENT_EPSILON_DAYS)
+
+
+def _search_ingresses(start_time, end_time):
+    return find_discrete(start_time, end_time, _sign_index_at, epsilon=EVENT_EPSILON_DAYS)
+
+
+@timed('almanac.compute_year')
+def compute_year(year, midnights, noons, tz):
+    ts = get_timescale()
+    noon_time = dates_to_timescale_time(noons)
+    midnight_tt = dates_to_timescale_time(midnights).tt
+    end_time = date_to_timescale_time(midnights[-1] + datetime.timedelta(days=1))
+
+    table = np.zeros(len(noons), dtype=almanac_dtype)
+    table['date'] = np.arange(f"{year}-01-01", f"{year + 1}-01-01", dtype='datetime64[D]')
+    table['noon_tt'] = noon_time.tt
+    table['phase'] = series_cache.moon_phase_at(noon_time)
+    # of the elongation in longitude, the latitude of the Moon (5 deg. at most) changes it by under a percent
+    table['illumination'] = (1 - np.cos(np.radians(table['phase']))) / 2
+    table['lon'] = series_cache.moon_longitude_at(noon_time)
+    table['sign'] = (table['lon'] // 30).astype(int) % 12
+    table['gate'], table['line'] = get_gate_lines(table['lon'])
+
+    table['quarter'] = table['ingress_sign'] = NO_EVENT
+    table['quarter_minute'] = table['ingress_minute'] = NO_EVENT
+    table['quarter_tt'] = table['ingress_tt'] = np.nan
+    start_time = ts.tt_jd(midnight_tt[0])
+    for search, value_field, tt_field, minute_field in (
+            (_search_quarters, 'quarter', 'quarter_tt', 'quarter_minute'),
+            (_search_ingresses, 'ingress_sign', 'ingress_tt', 'ingress_minute'),
+            (find_moon_eclipses, 'eclipse', None, None)):
+        t, values = search(start_time, end_time)
+        if not len(values):
+            continue
+        days = np.searchsorted(midnight_tt, t.tt, side='right') - 1
+        table[value_field][days] = values
+        if tt_field is not None:
+            table[tt_field][days] = t.tt
+            table[minute_field][days] = _local_minutes(t.tt, tz)
+    return table
+
+
+def get_year(year, tz=None):
+    # the almanac of a year in a zone (tzinfo, None for the local zone of the system): from memory, the cache, or
+    # computed and stored
+    key = year, _zone_keys.get((year, tz))
+    if key in _years:
+        return _years[key]
+    if not ALMANAC_YEARS[0] <= year <= ALMANAC_YEARS[1]:
+        raise ValueError(f"year {year} out of the ephemeris range {ALMANAC_YEARS[0]} - {ALMANAC_YEARS[1]}")
+    with _lock:
+        midnights, noons = _local_times(year, 0, tz), _local_times(year, 12, tz)
+        key = year, _zone_key(midnights, noons)
+        if key not in _years:
+            path = os.path.join(get_almanac_dir(), f"{year}-{key[1]}.npy") if series_cache.enabled else None
+            _years[key] = series_cache.load_or_compute(path, lambda: compute_year(year, midnights, noons, tz))
+            count('almanac.years_loaded')
+        _zone_keys[year, tz] = key[1]
+    return _years[key]
+
+
+def month_table(year, month, tz=None):
+    # the almanac rows of the days of a month, a view of the year table
+    first = datetime.date(year, month, 1).timetuple().tm_yday - 1
+    return get_year(year, tz)[first:first + calendar.monthrange(year, month)[1]]
@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+import pytest
+
+# === benchmark harness ===
+# A benchmark measures the best time per call over a few repeats (as timeit does) and reports it against the stored
+# baseline of the same name in baselines.json. The speed of a machine varies, also from minute to minute on a shared
+# one, so every time is normalized: a fixed calibration workload is timed along with each benchmark, and the times
+# are scaled to the calibration time stored with the baselines. Even so a busy machine easily takes half as long
+# again, so the times only fail a test when the comparison is asked for; a time above the baseline times
+# BENCHMARK_THRESHOLD fails then:
+#   MOON_CALENDAR_BENCHMARK_COMPARE=1 python -m pytest benchmarks
+# After an intended change, or to take a new reference machine, store new baselines with
+#   MOON_CALENDAR_BENCHMARK_UPDATE=1 python -m pytest benchmarks
+# A summary of the normalized times against the baselines is printed at the end of the run.
+# The caches are kept in a directory of the run, removed at its end: the tests neither read what an earlier run
+# or the application left in the user cache directory nor leave anything there.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+BENCHMARK_THRESHOLD = float(os.environ.get('MOON_CALENDAR_BENCHMARK_THRESHOLD', '2.0'))  # lower on a quiet machine
+BENCHMARK_UPDATE = os.environ.get('MOON_CALENDAR_BENCHMARK_UPDATE', '0') != '0'
+BENCHMARK_COMPARE = os.environ.get('MOON_CALENDAR_BENCHMARK_COMPARE', '0') != '0' and not BENCHMARK_UPDATE
+BENCHMARK_REPEAT = 5
+BENCHMARK_MIN_SECONDS = 0.05  # per repeat, a fast function is called as many times as that takes
+
+sys.path.insert(0, REPO_DIR)
+os.environ.setdefault('MPLBACKEND', 'Agg')
+CACHE_DIR = tempfile.mkdtemp(prefix='moon-calendar-cache-')
+os.environ['MOON_CALENDAR_CACHE_DIR'] = CACHE_DIR  # before the repo modules read it on import
+
+
+def load_baselines():
+    # (calibration seconds, {name: seconds}) of the reference run
+    if not os.path.exists(BASELINES_FILE):
+        return None, {}
+    with open(BASELINES_FILE, encoding='utf-8') as f:
+        stored = json.load(f)
+    return stored['calibration'], stored['benchmarks']
+
+
+def calibration_work():
+    # a fixed mix of interpreter and numpy work, like the code measured
+    values = np.random.default_rng(0).random(20000)
+    np.sort(values)
+    np.interp(values, np.linspace(0, 1, 1000), np.cos(np.linspace(0, 10, 1000)))
+    return sum(i * i for i in range(20000))
+
+
+def calibration_seconds():
+    return min(timeit.repeat(calibration_work, repeat=BENCHMARK_REPEAT, number=3)) / 3
+
+
+class Benchmark:
+    def __init__(self, calibration, baselines):
+        self.calibration = calibration  # of the baselines, or of this run when there are none
+        self.baselines = baselines
+        self.results = {}  # name -> normalized seconds per call, of this run
+
+    def __call__(self, name, function, repeat=BENCHMARK_REPEAT):
+        # the best time (normalized seconds) per call of function()
+        timer = timeit.Timer(function)
+        number = 1
+        while timer.timeit(number) < BENCHMARK_MIN_SECONDS and number < 1_000_000:
+            number *= 10  # the first call also warms up what function uses
+        return self.record(name, lambda: min(timer.repeat(repeat, number)) / number)
+
+    def measure(self, measure):
+        seconds = measure()
+        calibration = calibration_seconds()
+        if self.calibration is None:
+            self.calibration = calibration
+        return seconds * self.calibration / calibration
+
+    def record(self, name, measure):
+        # the time of measure() (normalized seconds), also for times measured otherwise, e.g. in a subprocess;
+        # when compared, a time over the limit is measured once more before failing, a burst of other work may
+        # have slowed it
+        seconds = self.measure(measure)
+        baseline = self.baselines.get(name)
+        if BENCHMARK_COMPARE and baseline is not None and seconds > baseline * BENCHMARK_THRESHOLD:
+            seconds = min(seconds, self.measure(measure))
+        self.results[name] = seconds
+        if BENCHMARK_COMPARE and baseline is not None:
+            assert seconds <= baseline * BENCHMARK_THRESHOLD, \
+                f"{name}: {format_seconds(seconds)} per call (normalized), baseline {format_seconds(baseline)}, " \
+                f"limit x{BENCHMARK_THRESHOLD}"
+        return seconds
+
+
+def format_seconds(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+_benchmark = Benchmark(*load_baselines())
+
+
+@pytest.fixture(scope='session')
+def bench():
+    return _benchmark
+
+
+@pytest.fixture
+def no_cache(monkeypatch):
+    # values and events computed, not read from the caches filled by an earlier run
+    import almanac
+    import series_cache
+
+    monkeypatch.setattr(series_cache, 'enabled', False)
+    almanac.clear_memory()
+    yield
+    almanac.clear_memory()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    if BENCHMARK_UPDATE and _benchmark.results:
+        baselines = dict(_benchmark.baselines, **_benchmark.results)
+        with open(BASELINES_FILE, 'w', encoding='utf-8') as f:
+            json.dump({'calibration': _benchmark.calibration,
+                       'benchmarks': {name: baselines[name] for name in sorted(baselines)}}, f, indent=2)
+            f.write('\n')
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _benchmark.results:
+        return
+    terminalreporter.section('benchmarks')
+    for name, seconds in sorted(_benchmark.results.items()):
+        baseline = _benchmark.baselines.get(name)
+        ratio = f"x{seconds / baseline:.2f} of {format_seconds(baseline)}" if baseline else "no baseline"
+        terminalreporter.write_line(f"{name:<40} {format_seconds(seconds):>10}  {ratio}")
+    if BENCHMARK_UPDATE:
+        terminalreporter.write_line(f"baselines stored in {BASELINES_FILE}")
+    elif not BENCHMARK_COMPARE:
+        terminalreporter.write_line(f"not compared, set MOON_CALENDAR_BENCHMARK_COMPARE=1 to fail above "
+                                    f"x{BENCHMARK_THRESHOLD} of the baselines")
@@ -0,0 +1,44 @@
+import datetime
+import zoneinfo
+
+import numpy as np
+
+import almanac
+from ephemeris_registry import get_timescale
+from moon_events import search_quarter_phases, search_sign_ingresses
+
+ALMANAC_YEAR = 2031
+ALMANAC_ZONE = zoneinfo.ZoneInfo('America/New_York')  # with daylight saving time
+
+
+def test_almanac_days_hold_their_events(no_cache):
+    table = almanac.get_year(ALMANAC_YEAR, ALMANAC_ZONE)
+    assert len(table) == 365 and table['date'][0] == np.datetime64(f"{ALMANAC_YEAR}-01-01")
+    ts = get_timescale()
+    start_time = ts.from_datetime(datetime.datetime(ALMANAC_YEAR, 1, 1, tzinfo=ALMANAC_ZONE))
+    end_time = ts.from_datetime(datetime.datetime(ALMANAC_YEAR + 1, 1, 1, tzinfo=ALMANAC_ZONE))
+    for (t, values), value_field, tt_field, minute_field in (
+            (search_quarter_phases(start_time, end_time), 'quarter', 'quarter_tt', 'quarter_minute'),
+            (search_sign_ingresses(start_time, end_time), 'ingress_sign', 'ingress_tt', 'ingress_minute')):
+        days = table[table[value_field] != almanac.NO_EVENT]
+        assert np.array_equal(days[value_field], values)
+        assert np.all(np.abs(days[tt_field] - t.tt) * 86400 < 1)
+        local_times = [time.astimezone(ALMANAC_ZONE) for time in t.utc_datetime()]
+        assert [np.datetime64(time.date()) for time in local_times] == list(days['date'])
+        assert [time.hour * 60 + time.minute for time in local_times] == list(days[minute_field])
+    month = almanac.month_table(ALMANAC_YEAR, 3, ALMANAC_ZONE)
+    assert len(month) == 31 and month['date'][0] == np.datetime64(f"{ALMANAC_YEAR}-03-01")
+    assert np.shares_memory(month, table)
+
+
+def test_almanac_year(bench, no_cache):
+    def compute_year():
+        almanac.clear_memory()
+        return almanac.get_year(ALMANAC_YEAR, ALMANAC_ZONE)
+
+    bench('almanac_year', compute_year)
+
+
+def test_almanac_month_table(bench):
+    almanac.get_year(ALMANAC_YEAR, ALMANAC_ZONE)
+    bench('almanac_month_table', lambda: almanac.month_table(ALMANAC_YEAR, 3, ALMANAC_ZONE))
@@ -0,0 +1,32 @@
+import numpy as np
+
+from skyfield.framelib import ecliptic_frame
+
+from body_positions import BODY_TARGETS, CHART_BODIES, chart, ecliptic_positions
+from ephemeris_registry import get_bodies, get_body, get_timescale
+
+CHART_TIMES = 2000
+
+
+def _times(count):
+    # times spread over the whole ephemeris range
+    return get_timescale().tt_jd(np.linspace(2415100.5, 2469000.5, count))
+
+
+def test_positions_match_single_observations():
+    t = _times(200)
+    positions = ecliptic_positions(t)
+    e = get_bodies()[2].at(t)
+    for name, target in BODY_TARGETS.items():
+        lat, lon, _ = e.observe(get_body(target)).apparent().frame_latlon(ecliptic_frame)
+        assert np.allclose((positions[name][0] - lon.degrees + 180) % 360 - 180, 0, atol=1e-9), name
+        assert np.allclose(positions[name][1], lat.degrees, atol=1e-9), name
+    # the true node oscillates within some 2 deg. of the mean node
+    T = (t.tt - 2451545.0) / 36525
+    mean_node = 125.0445479 - 1934.1362891 * T + 0.0020754 * T ** 2
+    assert np.all(np.abs((positions['north_node'][0] - mean_node + 180) % 360 - 180) < 2.5)
+
+
+def test_chart_2k(bench):
+    t = _times(CHART_TIMES)
+    bench(f'chart_{len(CHART_BODIES)}_bodies_2k', lambda: chart(t))
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pytest
+
+import almanac
+import chebyshev_engine
+import series_cache
+from ephemeris_registry import get_timescale
+from moon_events import search_quarter_phases
+
+
+def _clear_memory():
+    for module in (series_cache, chebyshev_engine, almanac):
+        module.clear_memory()
+
+
+@pytest.fixture
+def cache_root(tmp_path, monkeypatch):
+    # an empty cache root of its own, the caches opened again in it
+    monkeypatch.setattr(series_cache, 'cache_root', str(tmp_path))
+    _clear_memory()
+    yield tmp_path
+    _clear_memory()
+
+
+def test_unwritable_cache_root_computes_in_memory(cache_root, monkeypatch):
+    (cache_root / 'file').write_bytes(b'')
+    monkeypatch.setattr(series_cache, 'cache_root', str(cache_root / 'file' / 'cache'))  # under a file
+    ts = get_timescale()
+    t = ts.utc(2031, 3, 1, np.arange(series_cache.DENSE_QUERY_MIN_POINTS))
+    expected = series_cache._compute_moon_phase(t)
+    for engine in ('chebyshev', 'cache'):
+        monkeypatch.setattr(series_cache, 'engine', engine)
+        assert np.allclose(series_cache.moon_phase_at(t), expected, atol=1e-3)
+    assert len(series_cache.get_events(t[0], t[-1], series_cache.QUARTER)[1]) > 0
+    assert len(almanac.get_year(2031)) == 365
+    assert [path.name for path in cache_root.iterdir()] == ['file']
+
+
+def test_disabled_cache_writes_nothing(cache_root, monkeypatch):
+    monkeypatch.setattr(series_cache, 'enabled', False)
+    t = get_timescale().utc(2031, 3, 1, np.arange(100))
+    assert np.allclose(series_cache.moon_phase_at(t), series_cache._compute_moon_phase(t), atol=1e-3)
+    almanac.get_year(2031)
+    assert list(cache_root.iterdir()) == []
+
+
+def test_changed_key_starts_new_cache(cache_root, monkeypatch):
+    source = cache_root / 'source.py'
+    source.write_text('A = 1\n')
+    key = series_cache.cache_key('format 1', (str(source),))
+    assert series_cache.cache_key('format 1', (str(source),)) == key
+    assert series_cache.cache_key('format 2', (str(source),)) != key
+    source.write_text('A = 2\n')
+    assert series_cache.cache_key('format 1', (str(source),)) != key
+
+    cache_dir, table_dir = series_cache.get_cache_dir(), chebyshev_engine.get_table_dir()
+    _clear_memory()
+    monkeypatch.setattr(series_cache, 'CACHE_FORMAT_VERSION', series_cache.CACHE_FORMAT_VERSION + 1)
+    monkeypatch.setattr(chebyshev_engine, 'TABLE_FORMAT_VERSION', chebyshev_engine.TABLE_FORMAT_VERSION + 1)
+    assert series_cache.get_cache_dir() != cache_dir and chebyshev_engine.get_table_dir() != table_dir
+    # the directories of the other keys are removed
+    assert sorted(path.name for path in cache_root.iterdir() if path.is_dir()) == sorted(
+        [os.path.basename(series_cache.get_cache_dir()), os.path.basename(chebyshev_engine.get_table_dir())])
+
+
+def test_events_are_stored_without_the_series(cache_root):
+    # with the Chebyshev engine the hourly series of a chunk is not computed for its events
+    ts = get_timescale()
+    start, end = ts.utc(2031, 3, 1), ts.utc(2031, 4, 1)
+    t, quarters = series_cache.get_events(start, end, series_cache.QUARTER)
+    assert list(quarters) == list(search_quarter_phases(start, end)[1])
+    assert sorted({path.name.split('.', 1)[1] for path in cache_root.glob('series-*/*')}) == ['events.npy']
+    assert series_cache.missing_chunks(t, series_cache.EVENTS) == [] and series_cache.missing_chunks(t) != []
+
+
+def test_interpolation_matches_computation(cache_root, monkeypatch):
+    monkeypatch.setattr(series_cache, 'engine', 'cache')
+    start_tt = series_cache.CHUNK_DAYS * 81900  # a chunk of 2014
+    tt = np.random.default_rng(0).uniform(start_tt, start_tt + series_cache.CHUNK_DAYS,
+                                          series_cache.DENSE_QUERY_MIN_POINTS)
+    t = get_timescale().tt_jd(tt)
+    assert series_cache.missing_chunks(t) == [81900]
+    for interpolated, computed in ((series_cache.moon_phase_at(t), series_cache._compute_moon_phase(t)),
+                                   (series_cache.moon_longitude_at(t), series_cache._compute_moon_longitude(t))):
+        assert np.max(np.abs((interpolated - computed + 180) % 360 - 180)) * 3600 < 1.0  # arcsec
+    assert series_cache.missing_chunks(t) == []
+
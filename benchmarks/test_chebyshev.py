@@ -0,0 +1,58 @@
+import numpy as np
+
+from chebyshev_engine import ACCURACY_ARCSEC, SEGMENT_DAYS, TT_ORIGIN, moon_phase_and_longitude_at
+from ephemeris_registry import get_timescale
+from moon_phases import moon_phase_and_longitude_at as skyfield_moon_phase_and_longitude_at
+from moon_zodiac import get_gate_index, get_gate_lines
+from timeline import DATE_RANGE
+
+VALIDATION_POINTS = 2000
+THROUGHPUT_POINTS = 1_000_000
+
+
+def _arcsec(degrees, expected_degrees):
+    return np.abs((degrees - expected_degrees + 180) % 360 - 180) * 3600
+
+
+def _boundary_arcsec(degrees, boundaries):
+    # the distance of each longitude to the closest of the boundaries (deg.)
+    return np.min(_arcsec(np.asarray(degrees)[:, np.newaxis], np.asarray(boundaries)[np.newaxis, :]), axis=1)
+
+
+def _range_tt():
+    ts = get_timescale()
+    return ts.utc(*DATE_RANGE[0].timetuple()[:3]).tt, ts.utc(*DATE_RANGE[1].timetuple()[:3]).tt
+
+
+def test_chebyshev_matches_skyfield():
+    # random times over the whole range, and the segment edges where a fit is the least accurate
+    start_tt, end_tt = _range_tt()
+    tt = np.random.default_rng(0).uniform(start_tt, end_tt, VALIDATION_POINTS)
+    segment_starts = TT_ORIGIN + np.floor((tt[:200] - TT_ORIGIN) / SEGMENT_DAYS) * SEGMENT_DAYS
+    tt = np.concatenate([tt, segment_starts, segment_starts + SEGMENT_DAYS - 1e-6])
+    t = get_timescale().tt_jd(tt)
+
+    phase, longitude = moon_phase_and_longitude_at(t)
+    expected_phase, expected_longitude = skyfield_moon_phase_and_longitude_at(t)
+    assert _arcsec(phase, expected_phase).max() < ACCURACY_ARCSEC
+    assert _arcsec(longitude, expected_longitude).max() < ACCURACY_ARCSEC
+
+    # the sign and the gate differ only within the accuracy from the boundaries
+    other_sign = (longitude // 30) != (expected_longitude % 360 // 30)
+    assert np.all(_boundary_arcsec(expected_longitude[other_sign], np.arange(0, 360, 30)) < ACCURACY_ARCSEC)
+    gate, line = get_gate_lines(longitude)
+    expected_gate, expected_line = get_gate_lines(expected_longitude)
+    other_line = (gate != expected_gate) | (line != expected_line)
+    assert np.all(_boundary_arcsec(expected_longitude[other_line], get_gate_index()[0]) < ACCURACY_ARCSEC)
+
+
+def test_chebyshev_phase_sign_gate_1m(bench):
+    start_tt = _range_tt()[0] + 365.25 * 124  # 2024, a year of times
+    t = get_timescale().tt_jd(np.linspace(start_tt, start_tt + 365.25, THROUGHPUT_POINTS))
+
+    def phase_sign_gate():
+        phase, longitude = moon_phase_and_longitude_at(t)
+        return phase, (longitude // 30).astype(int), get_gate_lines(longitude)
+
+    seconds = bench('chebyshev_phase_sign_gate_1m', phase_sign_gate)
+    assert seconds < 1.0, f"{THROUGHPUT_POINTS / seconds:.0f} times per second"
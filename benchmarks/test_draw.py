@@ -0,0 +1,116 @@
+import datetime
+import time
+
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import main
+
+CENTER_DATE = datetime.datetime(2024, 4, 8, 12)
+TIMELINE_TIMEOUT = 120  # seconds to compute the timeline, with a cold series cache
+
+
+class HeadlessWidget:
+    # stands for the Tk widgets and window methods the main window calls, doing nothing
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: HeadlessWidget()
+
+
+class HeadlessWindow(HeadlessWidget):
+    # runs the callbacks scheduled with after() when asked, instead of a Tk main loop
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, function=None, *args):
+        self.scheduled.append((function, args))
+        return len(self.scheduled)
+
+    def after_cancel(self, after_id):
+        pass
+
+    def run_scheduled(self, timeout=TIMELINE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while self.scheduled and time.monotonic() < deadline:
+            function, args = self.scheduled.pop(0)
+            function(*args)
+            time.sleep(0.001)
+        assert not self.scheduled, "the timeline was not computed in time"
+
+
+class HeadlessCanvas(FigureCanvasAgg):
+    # the Agg canvas in place of the Tk one, drawing on draw_idle() at once
+    def __init__(self, figure, master=None):
+        super().__init__(figure)
+
+    def get_tk_widget(self):
+        return HeadlessWidget()
+
+    def draw_idle(self, *args, **kwargs):
+        self.draw()
+
+
+@pytest.fixture(scope='module')
+def main_window():
+    canvas_class = main.FigureCanvasTkAgg
+    main.FigureCanvasTkAgg = HeadlessCanvas
+    try:
+        window = HeadlessWindow()
+        main_window = main.MainWindow(window)
+        main_window.fig.set_size_inches(12.6, 5)
+        main_window.center_date = CENTER_DATE
+        yield window, main_window
+    finally:
+        main.FigureCanvasTkAgg = canvas_class
+
+
+@pytest.mark.parametrize('time_range', ['month', 'year'])
+def test_draw_moon_phase_and_icons(bench, main_window, time_range):
+    window, main_window = main_window
+    main_window.select_range(time_range)
+    window.run_scheduled()
+    assert main_window.timeline is not None
+
+    def draw_cycle():
+        # a full redraw of a computed timeline: the line, the icons and the render of the figure
+        main_window.clear_timeline()
+        main_window.draw_moon_phase()
+        main_window.re_draw_all()
+        main_window.canvas.draw()
+
+    bench(f'draw_moon_phase_re_draw_all[{time_range}]', draw_cycle)
+
+
+@pytest.mark.parametrize('view', main.CALENDAR_VIEWS)
+def test_calendar_flip(bench, view):
+    canvas_class = main.FigureCanvasTkAgg
+    main.FigureCanvasTkAgg = HeadlessCanvas
+    try:
+        calendar_window = main.CalendarWindow(HeadlessWindow(), CENTER_DATE)
+    finally:
+        main.FigureCanvasTkAgg = canvas_class
+    calendar_window.select_view(view)
+    years = [CENTER_DATE.year, CENTER_DATE.year + 1]
+    for year in years:
+        calendar_window.show(year)  # the almanac of the years in memory, the icons of all phases made
+
+    def flip():
+        # the next month or year and the render of the figure
+        if calendar_window.year == years[-1]:
+            calendar_window.show(years[0], 1)
+        else:
+            calendar_window.show_next()
+
+    bench(f'calendar_flip[{view}]', flip)
+
+
+def test_calendar_beyond_almanac_years():
+    last_year = main.almanac.ALMANAC_YEARS[1]
+    canvas_class = main.FigureCanvasTkAgg
+    main.FigureCanvasTkAgg = HeadlessCanvas
+    try:
+        calendar_window = main.CalendarWindow(HeadlessWindow(), datetime.datetime(last_year + 1, 6, 1))
+    finally:
+        main.FigureCanvasTkAgg = canvas_class
+    assert (calendar_window.year, calendar_window.month) == (last_year, 12)
+    calendar_window.show_next()  # stays at the last month
+    assert (calendar_window.year, calendar_window.month) == (last_year, 12)
@@ -0,0 +1,62 @@
+import asyncio
+import datetime
+import itertools
+
+import numpy as np
+
+from ephemeris_registry import get_timescale
+from moon_events import aiter_moon_events, iter_moon_events, search_quarter_phases, search_sign_ingresses
+from moon_zodiac import get_gate_lines, moon_longitude
+
+EVENTS_FROM = datetime.datetime(2031, 3, 5, 7, 13)
+EVENTS_TO = datetime.datetime(2031, 4, 4, 7, 13)
+
+
+def test_upcoming_events_match_range_searches(no_cache):
+    events = list(iter_moon_events(EVENTS_FROM, EVENTS_TO))
+    tt = np.array([t.tt for t, _, _ in events])
+    assert np.all(np.diff(tt) >= 0)
+    ts = get_timescale()
+    start_time, end_time = ts.utc(*EVENTS_FROM.timetuple()[:5]), ts.utc(*EVENTS_TO.timetuple()[:5])
+    for kind, (t, _) in (('quarter', search_quarter_phases(start_time, end_time)),
+                         ('sign', search_sign_ingresses(start_time, end_time))):
+        found = tt[[event[1] == kind for event in events]]
+        assert len(found) == len(t), kind
+        assert np.all(np.abs(found - t.tt) * 86400 < 2), kind
+
+
+def test_gate_line_ingresses_change_the_gate_line(no_cache):
+    # checked against the gate lines of the Moon longitude from skyfield around each event, not against the search
+    events = [(t.tt, value) for t, kind, value in iter_moon_events(EVENTS_FROM, EVENTS_TO, kinds=('gate',))]
+    tt = np.array([event_tt for event_tt, _ in events])
+    ts = get_timescale()
+    before = get_gate_lines(moon_longitude(ts.tt_jd(tt - 2 / 86400)))
+    after = get_gate_lines(moon_longitude(ts.tt_jd(tt + 2 / 86400)))
+    assert len(events) > 300 and all((before[0] != after[0]) | (before[1] != after[1]))
+    assert list(zip(after[0].tolist(), after[1].tolist())) == [value for _, value in events]
+
+    # none is missed: the gate line changes as many times on a grid much finer than a line (about 2 hours)
+    start_tt, end_tt = ts.utc(*EVENTS_FROM.timetuple()[:5]).tt, ts.utc(*EVENTS_TO.timetuple()[:5]).tt
+    gates, lines = get_gate_lines(moon_longitude(ts.tt_jd(np.append(np.arange(start_tt, end_tt, 10 / 1440), end_tt))))
+    assert np.count_nonzero((np.diff(gates) != 0) | (np.diff(lines) != 0)) == len(events)
+
+
+def test_async_upcoming_events(no_cache):
+    async def first_quarters():
+        events = []
+        async for event in aiter_moon_events(EVENTS_FROM, kinds=('quarter',)):
+            events.append(event)
+            if len(events) == 4:
+                return events
+
+    events = asyncio.run(first_quarters())
+    assert [value for _, _, value in events] == [value for _, _, value in
+                                                 itertools.islice(iter_moon_events(EVENTS_FROM, kinds=('quarter',)), 4)]
+
+
+def test_next_10_events(bench, no_cache):
+    bench('next_10_events', lambda: list(itertools.islice(iter_moon_events(EVENTS_FROM), 10)))
+
+
+def test_next_4_quarters(bench, no_cache):
+    bench('next_4_quarters', lambda: list(itertools.islice(iter_moon_events(EVENTS_FROM, kinds=('quarter',)), 4)))
@@ -0,0 +1,45 @@
+import csv
+import datetime
+import json
+
+import numpy as np
+import pytest
+
+from calendar_export import export_calendar
+from moon_phases import get_moon_phases
+
+EXPORT_FROM = datetime.datetime(2024, 4, 7, 6, 30)
+EXPORT_TO = datetime.datetime(2024, 4, 9, 6, 30)  # two days of hourly rows
+EXPORT_STEP = datetime.timedelta(hours=1)
+EXPORT_DATES = [EXPORT_FROM + EXPORT_STEP * i for i in range(48)]
+
+
+def test_export_formats_match_get_moon_phases(tmp_path):
+    expected = get_moon_phases(EXPORT_DATES)
+    expected_times = [f"{date:%Y-%m-%dT%H:%M:%S}Z" for date in EXPORT_DATES]
+
+    export_calendar(EXPORT_FROM, EXPORT_TO, EXPORT_STEP, str(tmp_path / 'moon.csv'))
+    with open(tmp_path / 'moon.csv', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['time'] for row in rows] == expected_times
+    assert np.allclose([float(row['phase']) for row in rows], expected, atol=1e-6)
+
+    export_calendar(EXPORT_FROM, EXPORT_TO, EXPORT_STEP, str(tmp_path / 'moon.jsonl'))
+    with open(tmp_path / 'moon.jsonl', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['time'] for record in records] == expected_times
+    assert np.allclose([record['phase'] for record in records], expected, atol=1e-6)
+    assert [record['sign'] for record in records] == [row['sign'] for row in rows]
+
+
+def test_parquet_export_matches_csv(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')  # an optional dependency of this format only
+    export_calendar(EXPORT_FROM, EXPORT_TO, EXPORT_STEP, str(tmp_path / 'moon.csv'))
+    with open(tmp_path / 'moon.csv', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    export_calendar(EXPORT_FROM, EXPORT_TO, EXPORT_STEP, str(tmp_path / 'moon.parquet'))
+    table = pq.read_table(tmp_path / 'moon.parquet').to_pydict()
+    assert [f"{time:%Y-%m-%dT%H:%M:%S}Z" for time in table['time']] == [row['time'] for row in rows]
+    assert np.allclose(table['phase'], get_moon_phases(EXPORT_DATES), atol=1e-9)
+    assert table['gate'] == [int(row['gate']) for row in rows]
+
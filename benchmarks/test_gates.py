@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from moon_zodiac import (GateDataError, parse_gates, load_gate_table, get_gate_line, get_gate_lines, GATE_COUNT,
+                         LINES_PER_GATE)
+from skyfield_helpers import get_file_path
+
+LONGITUDES = np.linspace(0, 360, 100000, endpoint=False)
+AQUARIUS, LEO = 300, 120  # deg.
+
+
+def _data_lines():
+    with open(get_file_path('./hexagram_data.txt'), encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+def _written(tmp_path, lines):
+    # a gate text of the lines, in a file of its own
+    path = tmp_path / 'gates.txt'
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def _parse_error(filename):
+    with pytest.raises(GateDataError) as error:
+        parse_gates(filename)
+    return str(error.value)
+
+
+def test_hexagram_data_tiles_the_wheel():
+    # parse_gates() raises on any gap or overlap, here the table itself is checked
+    table = parse_gates(get_file_path('./hexagram_data.txt'))
+    assert len(table) == GATE_COUNT * LINES_PER_GATE
+    assert sorted(set(table['gate'])) == list(range(1, GATE_COUNT + 1))
+    assert 0 <= table['start'][0] and table['start'][-1] < 360
+    assert np.allclose(np.diff(table['start'], append=table['start'][0] + 360), 360 / len(table))
+    # each gate is one run of its lines in order, the run crossing 0 deg. counted once
+    runs = np.flatnonzero(np.diff(table['gate'], prepend=table['gate'][-1]))
+    assert len(runs) == GATE_COUNT
+    assert all(list(np.roll(table['line'], -first)[:LINES_PER_GATE]) == list(range(1, LINES_PER_GATE + 1))
+               for first in runs)
+
+
+def test_hexagram_data_fixes():
+    # gate 31 in Leo 02° 00' 00" - 07° 37' 30", and the split of lines 1 and 2 of gate 30 at Aquarius 25° 26' 15"
+    # (read as 25° 16' 15" before)
+    split = AQUARIUS + 25 + 26 / 60 + 15 / 3600
+    gates, lines = get_gate_lines([LEO + 2.001, LEO + 7.624, split - 0.001, split + 0.001, AQUARIUS + 25.3])
+    assert list(zip(gates, lines)) == [(31, 1), (31, 6), (30, 1), (30, 2), (30, 1)]
+
+
+def test_missing_quote_names_its_line(tmp_path):
+    lines = _data_lines()
+    assert lines[17] == 'line_1 = 24° 30\' 00" - 25° 26\' 15"'  # of gate_30
+    lines[17] = lines[17][:-1]
+    message = _parse_error(_written(tmp_path, lines))
+    assert message.startswith(f"{tmp_path / 'gates.txt'}:18: expected ")
+
+
+@pytest.mark.parametrize('line_1, what', [('24° 20\' 00" - 25° 16\' 15"', 'an overlap of 00° 10\' 00"'),
+                                          ('24° 40\' 00" - 25° 36\' 15"', 'a gap of 00° 10\' 00"')])
+def test_overlap_or_gap_names_its_line(tmp_path, line_1, what):
+    lines = _data_lines()
+    lines[17] = f"line_1 = {line_1}"  # of gate_30, after line_6 of gate_49 on line 15
+    message = _parse_error(_written(tmp_path, lines))
+    assert message == f"{tmp_path / 'gates.txt'}:18: {what} after line_6 of gate_49 (line 15)"
+
+
+def test_missing_gate(tmp_path):
+    lines = _data_lines()
+    first = lines.index('gate_31 = Leo')
+    del lines[first:first + 1 + LINES_PER_GATE]
+    assert _parse_error(_written(tmp_path, lines)).endswith(": missing gates 31")
+
+
+def test_parse_gates(bench):
+    bench('parse_gates', lambda: parse_gates(get_file_path('./hexagram_data.txt')))
+
+
+def test_load_gate_table(bench):
+    bench('load_gate_table', lambda: load_gate_table(get_file_path('./hexagram_data.txt')))
+
+
+def test_get_gate_line(bench):
+    bench('get_gate_line', lambda: get_gate_line(123.456))
+
+
+def test_get_gate_lines_100k(bench):
+    bench('get_gate_lines_100k', lambda: get_gate_lines(LONGITUDES))
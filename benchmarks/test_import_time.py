@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+# Cold start budgets (seconds) for a fresh interpreter, with a margin for slow build machines
+MAIN_IMPORT_BUDGET = 3.0
+MOON_ZODIAC_IMPORT_BUDGET = 1.5
+COLD_IMPORT_REPEAT = 3  # the best of a few, as for the other benchmarks
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cold_import(statement):
+    # run the import in a new interpreter, so that nothing is cached in sys.modules
+    code = ("import time; started = time.perf_counter(); "
+            f"{statement}; "
+            "print(time.perf_counter() - started)")
+    output = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, env=dict(os.environ, MPLBACKEND='Agg'),
+                            capture_output=True, text=True, check=True).stdout
+    return output.strip().splitlines()
+
+
+def test_main_cold_import_within_budget(bench):
+    seconds = bench.record('cold_import_main',
+                           lambda: min(float(cold_import("import main")[-1]) for _ in range(COLD_IMPORT_REPEAT)))
+    assert seconds < MAIN_IMPORT_BUDGET, f"import main took {seconds:.3f}s"
+
+
+def test_moon_zodiac_cold_import_within_budget(bench):
+    seconds = bench.record('cold_import_moon_zodiac',
+                           lambda: min(float(cold_import("import moon_zodiac")[-1]) for _ in range(COLD_IMPORT_REPEAT)))
+    assert seconds < MOON_ZODIAC_IMPORT_BUDGET, f"import moon_zodiac took {seconds:.3f}s"
+
+
+def test_moon_zodiac_import_is_side_effect_free():
+    lines = cold_import("import moon_zodiac, ephemeris_registry; "
+                        "stats = ephemeris_registry.get_registry_stats(); "
+                        "print(stats['ephemeris_loads'], stats['timescale_loads'], moon_zodiac._gate_index is None)")
+    # no debug prints, no ephemeris or timescale opened, no hexagram table parsed
+    assert len(lines) == 2
+    assert lines[0] == "0 0 True"
@@ -0,0 +1,35 @@
+import csv
+import datetime
+import tempfile
+
+import numpy as np
+
+from calendar_export import export_calendar
+from moon_phases import get_moon_phases, moon_phase_and_longitude_at
+from parallel_series import compute_moon_series
+from skyfield_helpers import dates_to_timescale_time
+
+SERIES_FROM = datetime.datetime(2024, 4, 7, 6, 30)
+SERIES_STEP = datetime.timedelta(hours=1)
+SERIES_DATES = [SERIES_FROM + SERIES_STEP * i for i in range(48)]  # two days of hourly points
+
+
+def test_parallel_series_matches_one_worker():
+    date_to = SERIES_FROM + SERIES_STEP * 500
+    one = compute_moon_series(SERIES_FROM, date_to, SERIES_STEP, workers=1, chunk_points=100)
+    two = compute_moon_series(SERIES_FROM, date_to, SERIES_STEP, workers=2, chunk_points=100)
+    assert len(one) == 500 and np.array_equal(one, two)
+    phase, lon = moon_phase_and_longitude_at(dates_to_timescale_time(SERIES_DATES))
+    assert np.allclose(two['phase'][:48], phase, atol=1e-9) and np.allclose(two['lon'][:48], lon, atol=1e-9)
+
+
+def test_parallel_export_matches_and_removes_its_file(tmp_path, monkeypatch):
+    temporary_dir = tmp_path / 'tmp'
+    temporary_dir.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(temporary_dir))
+    export_calendar(SERIES_DATES[0], SERIES_DATES[-1] + SERIES_STEP, SERIES_STEP, str(tmp_path / 'moon.csv'), workers=2)
+    assert list(temporary_dir.iterdir()) == []
+    with open(tmp_path / 'moon.csv', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == len(SERIES_DATES)
+    assert np.allclose([float(row['phase']) for row in rows], get_moon_phases(SERIES_DATES), atol=1e-5)
@@ -0,0 +1,55 @@
+import numpy as np
+
+from plot_helpers import clip_convex_polygon, ellipse_polygon, lttb_downsample
+
+SERIES_X = np.arange(10000)
+SERIES_Y = np.sin(SERIES_X / 300) + 0.1 * np.random.default_rng(0).standard_normal(len(SERIES_X))
+SQUARE = np.array([[0, 0], [2, 0], [2, 2], [0, 2]], dtype=float)  # counterclockwise
+
+
+def _area(polygon):
+    x, y = np.asarray(polygon).T
+    return (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+
+def test_lttb_keeps_the_endpoints_and_the_size():
+    for threshold in (3, 10, 1000, 9999):
+        kept = lttb_downsample(SERIES_X, SERIES_Y, threshold)
+        assert len(kept) == threshold
+        assert kept[0] == 0 and kept[-1] == len(SERIES_X) - 1
+        assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_keeps_the_peaks():
+    y = np.zeros(1000)
+    y[[123, 456, 789]] = [5, -5, 3]
+    kept = lttb_downsample(np.arange(len(y)), y, 20)
+    assert {123, 456, 789} <= set(kept.tolist())
+
+
+def test_lttb_passes_the_series_through():
+    # with a threshold of its length or more, or below 3 (no bucket between the endpoints)
+    for threshold in (len(SERIES_X), len(SERIES_X) + 1, 2):
+        assert np.array_equal(lttb_downsample(SERIES_X, SERIES_Y, threshold), np.arange(len(SERIES_X)))
+
+
+def test_clip_inside_keeps_the_polygon():
+    circle = ellipse_polygon((1, 1), 1, 1)
+    assert np.allclose(clip_convex_polygon(circle, SQUARE), circle)
+    # a clip polygon inside the subject is the result itself
+    assert np.isclose(_area(clip_convex_polygon(SQUARE, circle)), _area(circle))
+
+
+def test_clip_outside_is_empty():
+    assert len(clip_convex_polygon(SQUARE + 3, SQUARE)) == 0
+    assert len(clip_convex_polygon(ellipse_polygon((-1, 1), 1.5, 1.5), SQUARE)) == 0
+
+
+def test_clip_partial_overlap():
+    shifted = SQUARE + [1, 1]
+    clipped = clip_convex_polygon(shifted, SQUARE)
+    assert np.isclose(_area(clipped), 1)  # the unit square [1, 2] x [1, 2], counterclockwise
+    assert np.all((clipped >= 1 - 1e-12) & (clipped <= 2 + 1e-12))
+    # a disc on an edge of the square: its half inside
+    circle = ellipse_polygon((2, 1), 1, 1)
+    assert np.isclose(_area(clip_convex_polygon(circle, SQUARE)), _area(circle) / 2)
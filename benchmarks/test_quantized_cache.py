@@ -0,0 +1,20 @@
+import datetime
+
+from quantized_cache import QuantizedLRUCache
+
+
+def test_quantized_cache_rounds_and_evicts():
+    calls = []
+    cache = QuantizedLRUCache(lambda date: calls.append(date) or len(calls), maxsize=2)
+    first = datetime.datetime(2024, 4, 8, 18, 17)
+    assert cache(first + datetime.timedelta(seconds=59)) == cache(first) == 1
+    assert calls == [first] and cache.stats() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 2}
+
+    second, third = first + datetime.timedelta(minutes=1), first + datetime.timedelta(minutes=2)
+    cache(second)
+    cache(first)  # the most recently used, so the second is dropped for the third
+    cache(third)
+    assert cache(first) == 1 and cache(second) == 4
+    assert calls == [first, second, third, second] and cache.stats()['size'] == 2
+    cache.clear()
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2}
@@ -0,0 +1,80 @@
+import datetime
+import zoneinfo
+
+import numpy as np
+import pytest
+
+import series_cache
+from ephemeris_registry import get_timescale
+from moon_phases import get_moon_phase, get_moon_phases, get_moon_eclipses
+from moon_events import find_sign_ingresses
+from moon_zodiac import get_moon_at_sign, get_moon_signs, get_sign_change_indices, signs
+from skyfield_helpers import date_to_timescale_time, dates_to_timescale_time, local_to_utc, utc_to_local
+
+QUERY_DATE = datetime.datetime(2024, 4, 8, 18, 17)
+BATCH_DATES = [QUERY_DATE + datetime.timedelta(hours=i) for i in range(24 * 30)]
+CONVERSION_DATES = [QUERY_DATE + datetime.timedelta(seconds=37.5 * i) for i in range(10000)]
+
+
+@pytest.fixture(params=['chebyshev', 'cached', 'ephemeris'])
+def source(request, monkeypatch):
+    # a query evaluated from the polynomials, read from a filled cache chunk, and computed from the ephemeris
+    if request.param != 'chebyshev':
+        monkeypatch.setattr(series_cache, 'engine', 'cache')
+    if request.param == 'cached':
+        for chunk in series_cache.missing_chunks(get_timescale().utc(*QUERY_DATE.timetuple()[:5])):
+            series_cache.get_chunk(chunk)
+    elif request.param == 'ephemeris':
+        monkeypatch.setattr(series_cache, 'enabled', False)
+    return request.param
+
+
+def test_get_moon_phase(bench, source):
+    bench(f'get_moon_phase[{source}]', lambda: get_moon_phase(QUERY_DATE))
+
+
+def test_get_moon_phases_month_hourly(bench, source):
+    bench(f'get_moon_phases_month_hourly[{source}]', lambda: get_moon_phases(BATCH_DATES))
+
+
+def test_get_moon_at_sign(bench, source):
+    bench(f'get_moon_at_sign[{source}]', lambda: get_moon_at_sign(QUERY_DATE))
+
+
+def test_moon_signs_match_get_moon_at_sign():
+    lon, sign_index, degree, d, m, s = get_moon_signs(BATCH_DATES[::7])
+    for i, date in enumerate(BATCH_DATES[::7]):
+        point_lon, point_sign, point_degree, *point_dms = get_moon_at_sign(date)
+        assert abs(lon[i] - point_lon.degrees) < 1e-9 and abs(degree[i] - point_degree) < 1e-9
+        assert signs[sign_index[i]] == point_sign and [d[i], m[i], s[i]] == point_dms
+
+
+def test_sign_changes_match_find_sign_ingresses():
+    sign_index = get_moon_signs(BATCH_DATES)[1]
+    changes = get_sign_change_indices(sign_index)
+    t, entered = find_sign_ingresses(BATCH_DATES[0], BATCH_DATES[-1])
+    assert len(changes) == len(t) > 10
+    # each ingress between the hours before and at the change, into the sign of the change
+    ingress_dates = [date.replace(tzinfo=None) for date in t.utc_datetime()]
+    assert all(BATCH_DATES[i - 1] < date <= BATCH_DATES[i] for i, date in zip(changes, ingress_dates))
+    assert list(sign_index[changes]) == list(entered)
+
+
+def test_get_moon_eclipses_decade(bench):
+    bench('get_moon_eclipses_decade', lambda: get_moon_eclipses(datetime.datetime(2020, 1, 1),
+                                                               datetime.datetime(2030, 1, 1)))
+
+
+def test_time_conversion_zones_and_seconds():
+    ts = get_timescale()
+    expected = ts.from_datetimes([date.replace(tzinfo=datetime.timezone.utc) for date in CONVERSION_DATES])
+    zone = zoneinfo.ZoneInfo('America/Los_Angeles')
+    local_dates = [utc_to_local(date, zone) for date in CONVERSION_DATES]
+    for dates in (CONVERSION_DATES, local_dates, np.array(CONVERSION_DATES, dtype='datetime64[us]')):
+        assert np.all(np.abs(dates_to_timescale_time(dates).tt - expected.tt) * 86400 < 1e-5)
+    assert abs(date_to_timescale_time(local_dates[1]).tt - expected.tt[1]) * 86400 < 1e-5
+    assert local_to_utc(local_dates[1].replace(tzinfo=None), zone) == CONVERSION_DATES[1]
+
+
+def test_dates_to_timescale_time_10k(bench):
+    bench('dates_to_timescale_time_10k', lambda: dates_to_timescale_time(CONVERSION_DATES))
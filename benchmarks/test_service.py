@@ -0,0 +1,109 @@
+import asyncio
+import datetime
+import json
+import threading
+import time
+
+import numpy as np
+
+from ephemeris_registry import get_timescale
+from moon_events import search_quarter_phases
+from moon_phases import get_moon_phase
+from moon_service import MoonService, create_service_executor
+from timeline import DATE_RANGE
+
+
+async def _get(reader, writer, target):
+    # a GET on a kept-alive connection: (status, content type, body bytes)
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode('latin-1'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := (await reader.readline()).strip()):
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers['content-length']))
+    return status, headers['content-type'], body
+
+
+def _serve(requests):
+    # the responses of a service started on an ephemeral port to the targets, sent over one connection
+    async def run():
+        service = MoonService(create_service_executor('thread'))
+        server = await asyncio.start_server(service.handle_connection, '127.0.0.1', 0)
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+            responses = [await _get(reader, writer, target) for target in requests]
+            writer.close()
+            await writer.wait_closed()
+            return responses
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.executor.shutdown()
+
+    return asyncio.run(run())
+
+
+def test_service_answers():
+    (phase_status, _, phase), (sign_status, _, sign), (eclipses_status, _, eclipses), \
+        (calendar_status, calendar_type, calendar), (end_status, _, _) = _serve([
+            '/phase?date=2024-04-08T18:17', '/sign?date=2024-04-08T18:17',
+            '/eclipses?from=2025-01-01&to=2026-01-01', '/calendar?from=2024-04-08&to=2024-04-09&step=1h&format=csv',
+            f"/eclipses?from=2049-01-01&to={DATE_RANGE[1]:%Y-%m-%d}"])
+    assert phase_status == sign_status == eclipses_status == calendar_status == end_status == 200
+
+    phase = json.loads(phase)
+    assert phase['time'] == '2024-04-08T18:17:00Z'
+    assert abs(phase['phase'] - float(get_moon_phase(datetime.datetime(2024, 4, 8, 18, 17)))) < 1e-9
+    assert json.loads(sign)['sign'] == 'Aries'
+    assert [(e['time'][:10], e['kind']) for e in json.loads(eclipses)] == [('2025-03-14', 'total'),
+                                                                          ('2025-09-07', 'total')]
+    assert calendar_type.startswith('text/csv')
+    assert len(calendar.decode('utf-8').splitlines()) == 1 + 24
+
+
+def test_service_rejects_bad_requests():
+    responses = _serve(['/phase?date=2024-13-01', '/phase?date=1899-12-31', '/eclipses?from=2024-01-01&to=2023-01-01',
+                        '/calendar?step=0h', '/calendar?format=xml', '/events?count=0', '/events?kinds=quarter,tide',
+                        '/nowhere'])
+    assert [status for status, _, _ in responses] == [400] * 7 + [404]
+    assert all('error' in json.loads(body) for _, _, body in responses)
+
+
+def test_service_events():
+    [(status, _, body)] = _serve(['/events?from=2024-04-08T18:17&count=5&kinds=quarter'])
+    assert status == 200
+    events = json.loads(body)
+    ts = get_timescale()
+    t, quarters = search_quarter_phases(ts.utc(2024, 4, 8, 18, 17), ts.utc(2024, 6, 1))
+    assert [event['value'] for event in events] == list(quarters[:5])
+    event_times = [datetime.datetime.strptime(event['time'], '%Y-%m-%dT%H:%M:%SZ') for event in events]
+    assert all(abs((event_time - date.replace(tzinfo=None)).total_seconds()) < 2  # read from the cache or searched
+               for event_time, date in zip(event_times, t[:5].utc_datetime()))
+    assert all(event['kind'] == 'quarter' and event['text'] for event in events)
+
+
+def test_identical_batches_share_one_computation():
+    calls = []
+    lock = threading.Lock()
+
+    def compute(value):
+        with lock:
+            calls.append(value)
+        time.sleep(0.1)
+        return np.arange(value)
+
+    async def run():
+        service = MoonService(create_service_executor('thread'))
+        try:
+            first, second, other = await asyncio.gather(service.run_batch(('key', 3), compute, 3),
+                                                        service.run_batch(('key', 3), compute, 3),
+                                                        service.run_batch(('key', 4), compute, 4))
+            return first, second, other
+        finally:
+            service.executor.shutdown()
+
+    first, second, other = asyncio.run(run())
+    assert first is second and len(other) == 4
+    assert sorted(calls) == [3, 4]
@@ -0,0 +1,59 @@
+import datetime
+
+import numpy as np
+
+from timeline import compute_span, merge_spans, trim_span, coarsen_span, grid_index
+
+STEP = datetime.timedelta(minutes=30)  # twice it is still a step of exact events
+FIRST = grid_index(datetime.datetime(2024, 4, 1), STEP)
+DAY_POINTS = datetime.timedelta(days=1) // STEP
+
+
+def _assert_same_timeline(timeline, expected):
+    # the same grid and samples, and the same events up to the precision of the event searches
+    assert timeline.keys() == expected.keys()
+    assert [timeline[key] for key in ('step', 'first', 'last')] == [expected[key] for key in ('step', 'first', 'last')]
+    assert timeline['moon_phase_dates'] == expected['moon_phase_dates']
+    assert len(timeline['moon_phase_dates']) == len(timeline['moon_phases']) == timeline['last'] - timeline['first']
+    for field in ('moon_phases', 'quarter_phases', 'sign_ingress_phases'):
+        assert len(timeline[field]) == len(expected[field])
+        assert np.allclose(timeline[field], expected[field], atol=1e-6)
+    for field in ('quarter_dates', 'sign_ingress_dates'):
+        assert len(timeline[field]) == len(expected[field])
+        assert all(abs((date - expected_date).total_seconds()) < 1
+                   for date, expected_date in zip(timeline[field], expected[field]))
+    assert timeline['sign_ingress_signs'] == expected['sign_ingress_signs']
+    assert timeline['eclipses'] == expected['eclipses']
+
+
+def test_merged_spans_equal_one_span():
+    middle, last = FIRST + 5 * DAY_POINTS, FIRST + 9 * DAY_POINTS
+    whole = compute_span(STEP, FIRST, last)
+    assert whole['quarter_dates'] and whole['sign_ingress_dates']  # events on both sides of the seam
+    _assert_same_timeline(merge_spans([compute_span(STEP, FIRST, middle), compute_span(STEP, middle, last)]), whole)
+
+
+def test_trimmed_span_equals_a_span_of_its_points():
+    whole = compute_span(STEP, FIRST, FIRST + 9 * DAY_POINTS)
+    first, last = FIRST + 2 * DAY_POINTS + 7, FIRST + 6 * DAY_POINTS + 3
+    _assert_same_timeline(trim_span(whole, first, last), compute_span(STEP, first, last))
+
+
+def test_trim_outside_the_span_is_empty():
+    span = compute_span(STEP, FIRST, FIRST + 2 * DAY_POINTS)
+    for first, last in ((span['last'] + 10, span['last'] + 20), (span['first'] - 20, span['first'] - 10),
+                        (span['first'] + 10, span['first'] + 5)):
+        trimmed = trim_span(span, first, last)
+        assert trimmed.keys() == span.keys()
+        assert trimmed['step'] == span['step'] and trimmed['first'] == trimmed['last']
+        assert trimmed['moon_phase_dates'] == [] and len(trimmed['moon_phases']) == 0
+        assert (trimmed['quarter_dates'] == trimmed['sign_ingress_dates'] == trimmed['sign_ingress_signs']
+                == trimmed['eclipses'] == [])
+        assert len(trimmed['quarter_phases']) == len(trimmed['sign_ingress_phases']) == 0
+
+
+def test_coarsened_span_equals_a_span_at_twice_the_step():
+    coarse_first = grid_index(datetime.datetime(2024, 4, 1), 2 * STEP)
+    # from an odd point of the grid: the coarse grid starts at the next point of it
+    span = compute_span(STEP, 2 * coarse_first - 1, 2 * coarse_first + 12 * DAY_POINTS)
+    _assert_same_timeline(coarsen_span(span, 2), compute_span(2 * STEP, coarse_first, coarse_first + 6 * DAY_POINTS))
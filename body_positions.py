@@ -0,0 +1,89 @@
+import numpy as np
+
+from skyfield.framelib import ecliptic_frame
+from skyfield.functions import mxv, to_spherical
+
+from ephemeris_registry import get_bodies, get_body
+from instrumentation import timed
+
+# === apparent positions of several bodies ===
+# The apparent ecliptic longitudes and latitudes (true ecliptic and equinox of date) of any set of bodies of the
+# kernel and of the lunar nodes, for a scalar or array Time in one pass: the position of the Earth and the ecliptic
+# rotation (nutation and precession) are computed once for all the bodies, then each body is one vectorized
+# observation over all the times. A chart of thousands of times and a dozen bodies costs a dozen array
+# observations, not a scalar observation per body and time.
+# The nodes are the true (osculating) nodes of the lunar orbit, from the position and velocity of the Moon
+# observed anyway for the Moon itself.
+
+# chart name -> target in the kernel; DE421 has the centres of the inner planets, the barycentres of the outer ones
+# (within a fraction of an arcsecond of their centres seen from the Earth)
+BODY_TARGETS = {
+    'sun': 'sun',
+    'moon': 'moon',
+    'mercury': 'mercury',
+    'venus': 'venus',
+    'mars': 'mars',
+    'jupiter': 'jupiter barycenter',
+    'saturn': 'saturn barycenter',
+    'uranus': 'uranus barycenter',
+    'neptune': 'neptune barycenter',
+    'pluto': 'pluto barycenter',
+}
+NODES = ('north_node', 'south_node')
+CHART_BODIES = tuple(BODY_TARGETS) + NODES
+
+# a body at a time mapped on the zodiac and the hexagram wheel; sign is the index in moon_zodiac.signs
+chart_dtype = np.dtype([('lon', 'f8'), ('lat', 'f8'), ('sign', 'i8'), ('degree', 'f8'), ('gate', 'i8'),
+                        ('line', 'i8')])
+
+
+def _check_bodies(bodies):
+    unknown = [name for name in bodies if name not in BODY_TARGETS and name not in NODES]
+    if unknown:
+        raise ValueError(f"unknown bodies {', '.join(unknown)}, expected some of {', '.join(CHART_BODIES)}")
+
+
+@timed('bodies.ecliptic_positions')
+def ecliptic_positions(t, bodies=CHART_BODIES):
+    # {name: (longitude, latitude)} in degrees (longitude 0 - 360) of the bodies at a Time, scalar or array
+    _check_bodies(bodies)
+    earth = get_bodies()[2]
+    e = earth.at(t)
+    rotation = ecliptic_frame.rotation_at(t)
+    positions = {}
+    moon = None
+    for name in bodies:
+        if name in NODES or name in positions:
+            continue
+        astrometric = e.observe(get_body(BODY_TARGETS[name]))
+        if name == 'moon':
+            moon = astrometric
+        _, lat, lon = to_spherical(mxv(rotation, astrometric.apparent().xyz.au))
+        positions[name] = np.degrees(lon) % 360, np.degrees(lat)
+    if any(name in NODES for name in bodies):
+        if moon is None:
+            moon = e.observe(get_body('moon'))
+        # the ascending node is where the orbital plane, normal to the angular momentum r x v, crosses the ecliptic
+        r = mxv(rotation, moon.xyz.au)
+        v = mxv(rotation, moon.velocity.au_per_d)
+        h = np.cross(r, v, axis=0)
+        node = np.degrees(np.arctan2(h[0], -h[1])) % 360
+        positions['north_node'] = node, np.zeros_like(node)
+        positions['south_node'] = (node + 180) % 360, np.zeros_like(node)
+    return {name: positions[name] for name in bodies}
+
+
+@timed('bodies.chart')
+def chart(t, bodies=CHART_BODIES):
+    # {name: array of chart_dtype shaped like the times}: the positions of the bodies with their signs, degrees in
+    # the signs and hexagram gates and lines, all the bodies mapped in one lookup
+    from moon_zodiac import get_gate_lines  # it imports this module
+
+    positions = ecliptic_positions(t, bodies)
+    table = np.empty((len(positions),) + np.shape(t.tt), dtype=chart_dtype)
+    for i, (lon, lat) in enumerate(positions.values()):
+        table['lon'][i], table['lat'][i] = lon, lat
+    table['sign'] = (table['lon'] // 30).astype(int) % 12
+    table['degree'] = table['lon'] % 30
+    table['gate'], table['line'] = get_gate_lines(table['lon'])
+    return dict(zip(positions, table))
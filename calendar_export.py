@@ -0,0 +1,219 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import re
+import sys
+import tempfile
+
+import numpy as np
+
+from ephemeris_registry import get_timescale
+from instrumentation import timed
+from moon_phases import get_moon_phases, find_moon_eclipses
+from moon_zodiac import get_moon_signs, get_gate_lines, signs
+from parallel_series import utc_grid, grid_offsets, compute_moon_series
+from skyfield_helpers import to_utc, utc_grid_time, utc_now
+from timeline import DATE_RANGE
+
+# === headless calendar export ===
+# Rows of the Moon calendar for a range at a step, computed and written chunk by chunk through a generator pipeline,
+# so the memory use does not grow with the range, e.g. for decades at minute resolution:
+#   python main.py calendar --from 2000-01-01 --to 2030-01-01 --step 1min --output moon.parquet
+# The phase and longitude are evaluated from the Chebyshev tables (see chebyshev_engine, or the engine chosen in
+# series_cache), or with --workers computed directly from the ephemeris in that many processes (see parallel_series)
+# into a temporary file first.
+
+EXPORT_CHUNK_ROWS = 10080  # a week at minute resolution per computation and write
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+# time: UTC (ISO 8601), phase: Moon - Sun ecliptic longitude (deg.), illumination: illuminated fraction of the disc,
+# longitude: ecliptic longitude of the Moon (deg.), sign and degree in the sign, gate and line,
+# eclipse: rating of a lunar eclipse on the UTC day (0 none, 1 penumbral, 2 partial, 3 total)
+columns = ('time', 'phase', 'illumination', 'longitude', 'sign', 'degree', 'gate', 'line', 'eclipse')
+float_columns = ('phase', 'illumination', 'longitude', 'degree')
+sign_names = np.array([sign.split()[0] for sign in signs])
+
+step_units = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_step(text):
+    # '30s', '1min', '10m', '1h', '1d' to a timedelta
+    match = re.fullmatch(r'\s*(\d+)\s*(s|sec|m|min|h|d)\s*', text)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"invalid step {text!r}, expected e.g. 30s, 1min, 1h or 1d")
+    return datetime.timedelta(seconds=int(match.group(1)) * step_units[match.group(2)])
+
+
+def parse_utc(text):
+    # an ISO date or date and time, UTC unless it has an offset
+    return to_utc(datetime.datetime.fromisoformat(text))
+
+
+@timed('calendar.chunk')
+def calendar_chunk(day, offsets, phase=None, longitude=None):
+    # the columns of the rows at offsets (seconds, int array) from the midnight of a day,
+    # the phase and longitude are evaluated by the engine of series_cache unless given
+    ts = get_timescale()
+    times = np.datetime64(day, 's') + offsets.astype('timedelta64[s]')
+    if phase is None:
+        t = utc_grid_time(day, offsets)
+        phase = get_moon_phases(t)
+        longitude = get_moon_signs(t)[0]
+    sign_index = (longitude // 30).astype(int) % 12
+    degree = longitude % 30
+    gate, line = get_gate_lines(longitude)
+
+    eclipse = np.zeros(len(offsets), dtype=int)
+    row_days = times.astype('datetime64[D]')
+    first_day, last_day = int(offsets[0] // 86400), int(offsets[-1] // 86400)
+    eclipse_times, ratings = find_moon_eclipses(ts.utc(day.year, day.month, day.day + first_day),
+                                                ts.utc(day.year, day.month, day.day + last_day + 1))
+    for eclipse_time, rating in zip(eclipse_times.utc_datetime(), ratings):
+        on_day = row_days == np.datetime64(eclipse_time.date())
+        eclipse[on_day] = np.maximum(eclipse[on_day], rating)
+
+    return {
+        'time': times,
+        'phase': phase,
+        'illumination': (1 - np.cos(np.radians(phase))) / 2,
+        'longitude': longitude,
+        'sign': sign_names[sign_index],
+        'degree': degree,
+        'gate': gate,
+        'line': line,
+        'eclipse': eclipse,
+    }
+
+
+def iter_calendar_chunks(date_from, date_to, step, chunk_rows=EXPORT_CHUNK_ROWS, workers=0):
+    # the column arrays of the rows from date_from (included) to date_to (excluded), chunk_rows rows at a time
+    grid = utc_grid(date_from, date_to, step)
+    day, count = grid[0], grid[3]
+    if not workers:
+        for first in range(0, count, chunk_rows):
+            yield calendar_chunk(day, grid_offsets(grid, first, min(first + chunk_rows, count)))
+        return
+
+    fd, path = tempfile.mkstemp(suffix='.npy')
+    os.close(fd)
+    try:
+        compute_moon_series(date_from, date_to, step, path=path, workers=workers)  # the returned map is dropped
+        # the rows are read a chunk at a time into arrays of their own, not mapped: a file still mapped, e.g. by a
+        # chunk the caller holds, cannot be removed on Windows
+        with open(path, 'rb') as f:
+            version = np.lib.format.read_magic(f)
+            read_header = (np.lib.format.read_array_header_1_0 if version[0] == 1
+                           else np.lib.format.read_array_header_2_0)
+            dtype = read_header(f)[2]
+            for first in range(0, count, chunk_rows):
+                last = min(first + chunk_rows, count)
+                series = np.fromfile(f, dtype=dtype, count=last - first)
+                yield calendar_chunk(day, grid_offsets(grid, first, last), series['phase'], series['lon'])
+    finally:
+        os.remove(path)
+
+
+def _time_text(times):
+    return np.char.add(np.datetime_as_string(times, unit='s'), 'Z')
+
+
+def _text_columns(chunk):
+    # the columns as strings, floats with a fixed precision
+    text = {column: np.char.mod('%.6f', chunk[column]) for column in float_columns}
+    for column in ('gate', 'line', 'eclipse'):
+        text[column] = chunk[column].astype(str)
+    text['time'] = _time_text(chunk['time'])
+    text['sign'] = chunk['sign']
+    return [text[column] for column in columns]
+
+
+def write_csv(chunks, f):
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(columns)
+    for chunk in chunks:
+        writer.writerows(zip(*_text_columns(chunk)))
+        f.flush()
+
+
+def write_jsonl(chunks, f):
+    for chunk in chunks:
+        values = [np.round(chunk[column], 6).tolist() if column in float_columns
+                  else _time_text(chunk[column]).tolist() if column == 'time' else chunk[column].tolist()
+                  for column in columns]
+        for row in zip(*values):
+            f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            f.write('\n')
+        f.flush()
+
+
+def write_parquet(chunks, path):
+    # a row group per chunk; pyarrow is an optional dependency needed for this format only
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            arrays = {column: pa.array(chunk[column]) for column in columns}
+            arrays['time'] = pa.array(chunk['time'].astype(np.int64), type=pa.timestamp('s', tz='UTC'))
+            table = pa.table(arrays)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export_calendar(date_from, date_to, step, output='-', format=None, workers=0):
+    # writes the calendar rows to a file, or to stdout for '-'; the format is guessed from the file extension
+    if format is None:
+        extension = os.path.splitext(output)[1].lstrip('.')
+        format = extension if extension in FORMATS else 'csv'
+    chunks = iter_calendar_chunks(date_from, date_to, step, workers=workers)
+    if format == 'parquet':
+        if output == '-':
+            raise ValueError("parquet output needs a file")
+        write_parquet(chunks, output)
+        return
+    write = write_csv if format == 'csv' else write_jsonl
+    if output == '-':
+        write(chunks, sys.stdout)
+    else:
+        with open(output, 'w', newline='', encoding='utf-8') as f:
+            write(chunks, f)
+
+
+def add_export_arguments(parser):
+    today = utc_now().strftime('%Y-%m-%d')
+    parser.add_argument('--from', dest='date_from', default=today,
+                        help="UTC start, YYYY-MM-DD or YYYY-MM-DDTHH:MM (default today)")
+    parser.add_argument('--to', dest='date_to', help="UTC end, excluded (default 30 days after the start)")
+    parser.add_argument('--step', default='1h', help="row step: 30s, 1min, 1h, 1d... (default 1h)")
+    parser.add_argument('--format', choices=FORMATS, help="csv, jsonl or parquet (default by the output extension)")
+    parser.add_argument('--output', '-o', default='-', help="output file (default stdout)")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="compute the series directly from the ephemeris in this many processes "
+                             "instead of reading the cache")
+
+
+def run_export(parser, args):
+    try:
+        date_from = parse_utc(args.date_from)
+        date_to = parse_utc(args.date_to) if args.date_to else date_from + datetime.timedelta(days=30)
+        step = parse_step(args.step)
+    except ValueError as e:
+        parser.error(str(e))
+    if not DATE_RANGE[0] <= date_from < date_to <= DATE_RANGE[1]:
+        parser.error(f"the range should be within {DATE_RANGE[0]:%Y-%m-%d} - {DATE_RANGE[1]:%Y-%m-%d}")
+    if args.format == 'parquet' and args.output == '-':
+        parser.error("parquet output needs --output")
+    export_calendar(date_from, date_to, step, args.output, args.format, args.workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Moon calendar export")
+    add_export_arguments(parser)
+    run_export(parser, parser.parse_args())
@@ -0,0 +1,151 @@
+import math
+import os
+import threading
+
+import numpy as np
+from numpy.polynomial import chebyshev
+
+import series_cache
+from ephemeris_registry import get_timescale
+from instrumentation import timed, count
+
+# === Chebyshev polynomial engine ===
+# The apparent ecliptic longitudes of the Moon and the Sun, as computed by moon_phases.moon_phase_at() and
+# moon_zodiac.moon_longitude() (light time, aberration and nutation of both bodies), approximated by Chebyshev
+# polynomials per segment of SEGMENT_DAYS. A segment is fitted at the Chebyshev nodes of its interval, and the fits
+# are made per block of BLOCK_SEGMENTS segments on first use and stored under the cache root like the series cache
+# (about 1 MB for the whole ephemeris range), or kept in memory only while the cache is disabled. The phase, sign or
+# gate of a time is then a polynomial evaluation: millions of times per second instead of a skyfield evaluation each.
+# The error against skyfield is a few milliarcseconds, well within ACCURACY_ARCSEC, checked by
+# benchmarks/test_chebyshev.py over the whole range.
+
+TABLE_FORMAT_VERSION = 1
+ACCURACY_ARCSEC = 1.0
+TT_ORIGIN = 2451545.0  # J2000, the segments start at whole multiples of SEGMENT_DAYS from it
+SEGMENT_DAYS = 8.0
+MOON_DEGREE = 12
+SUN_DEGREE = 5  # fitted at the nodes of the Moon degree
+BLOCK_SEGMENTS = 32  # about 8.5 months fitted at once, some 40 ms
+EVALUATION_CHUNK = 1 << 20  # times evaluated at once, bounding the temporary arrays
+
+_lock = threading.Lock()
+_table_dir = None
+_blocks = {}  # block index -> (BLOCK_SEGMENTS, MOON_DEGREE + 1 + SUN_DEGREE + 1) coefficients, Moon first
+_block_locks = {}  # block index -> lock held while it is loaded or fitted, other blocks are not held up
+
+
+def get_table_dir():
+    global _table_dir
+    if _table_dir is None:
+        import body_positions, ephemeris_registry, moon_phases  # moon_phases imports series_cache, which imports
+                                                                # this module on use
+
+        key = series_cache.cache_key(f"chebyshev {TABLE_FORMAT_VERSION} {SEGMENT_DAYS} {MOON_DEGREE} {SUN_DEGREE}",
+                                     (body_positions.__file__, ephemeris_registry.__file__, moon_phases.__file__,
+                                      __file__))
+        _table_dir = series_cache.make_cache_dir(os.path.join(series_cache.cache_root, f"chebyshev-{key}"),
+                                                 'chebyshev-')
+    return _table_dir
+
+
+@timed('chebyshev.fit_block')
+def fit_block(block):
+    # the coefficients of the segments of a block, fitted to skyfield at the Chebyshev nodes of each segment
+    from moon_phases import moon_phase_and_longitude_at
+
+    node_count = MOON_DEGREE + 1
+    nodes = np.cos(np.pi * (np.arange(node_count) + 0.5) / node_count)  # in [-1, 1]
+    starts = TT_ORIGIN + (block * BLOCK_SEGMENTS + np.arange(BLOCK_SEGMENTS)) * SEGMENT_DAYS
+    tt = starts[:, np.newaxis] + (nodes + 1) / 2 * SEGMENT_DAYS
+    phase, moon = moon_phase_and_longitude_at(get_timescale().tt_jd(tt.ravel()))
+    moon = moon.reshape(tt.shape)
+    sun = (moon - phase.reshape(tt.shape)) % 360
+    # a polynomial needs a continuous longitude within the segment
+    moon_coefficients = chebyshev.chebfit(nodes, np.unwrap(moon, period=360, axis=1).T, MOON_DEGREE)
+    sun_coefficients = chebyshev.chebfit(nodes, np.unwrap(sun, period=360, axis=1).T, SUN_DEGREE)
+    return np.hstack([moon_coefficients.T, sun_coefficients.T])
+
+
+def _block_lock(block):
+    with _lock:
+        return _block_locks.setdefault(block, threading.Lock())
+
+
+def get_block(block):
+    block = int(block)
+    if block in _blocks:
+        return _blocks[block]
+    with _block_lock(block):
+        if block not in _blocks:
+            path = os.path.join(get_table_dir(), f"{block}.npy") if series_cache.enabled else None
+            _blocks[block] = series_cache.load_or_compute(path, lambda: fit_block(block))
+            count('chebyshev.blocks_loaded')
+    return _blocks[block]
+
+
+def clear_memory():
+    # forget the loaded blocks and the table dir, the files stay on disk
+    global _table_dir
+    with _lock:
+        _blocks.clear()
+        _table_dir = None
+
+
+def _clenshaw(coefficients, rows, x):
+    # the Chebyshev series of the coefficient rows (one per time) at x; coefficients is (degree + 1, rows)
+    b1 = b2 = np.zeros(len(x))
+    for k in range(len(coefficients) - 1, 0, -1):
+        b1, b2 = coefficients[k].take(rows) + 2 * x * b1 - b2, b1
+    return coefficients[0].take(rows) + x * b1 - b2
+
+
+def longitudes_at_tt(tt):
+    # the apparent ecliptic longitudes (deg., 0 - 360) of the Moon and the Sun at TT Julian dates (an array)
+    tt = np.asarray(tt, dtype=float).ravel()
+    moon, sun = np.empty(len(tt)), np.empty(len(tt))
+    for start in range(0, len(tt), EVALUATION_CHUNK):
+        part = slice(start, start + EVALUATION_CHUNK)
+        position = (tt[part] - TT_ORIGIN) / SEGMENT_DAYS
+        segments = np.floor(position).astype(np.int64)
+        x = 2 * (position - segments) - 1
+        # a table of the blocks of these times only, so that far apart times do not fit everything between them
+        blocks, block_rows = np.unique(segments // BLOCK_SEGMENTS, return_inverse=True)
+        table = np.concatenate([get_block(block) for block in blocks]).T.copy()
+        rows = block_rows.ravel() * BLOCK_SEGMENTS + segments % BLOCK_SEGMENTS
+        moon[part] = _clenshaw(table[:MOON_DEGREE + 1], rows, x)
+        sun[part] = _clenshaw(table[MOON_DEGREE + 1:], rows, x)
+    return moon % 360, sun % 360
+
+
+def _longitudes_at_scalar_tt(tt):
+    # longitudes_at_tt() for one time in plain floats, a numpy operation per step costs more than the step itself
+    position = (tt - TT_ORIGIN) / SEGMENT_DAYS
+    segment = math.floor(position)
+    x = 2 * (position - segment) - 1
+    row = get_block(segment // BLOCK_SEGMENTS)[segment % BLOCK_SEGMENTS].tolist()
+    longitudes = []
+    for coefficients in (row[:MOON_DEGREE + 1], row[MOON_DEGREE + 1:]):
+        b1 = b2 = 0.0
+        for c in coefficients[:0:-1]:
+            b1, b2 = c + 2 * x * b1 - b2, b1
+        longitudes.append((coefficients[0] + x * b1 - b2) % 360)
+    return longitudes
+
+
+def moon_phase_and_longitude_at(t):
+    # the Moon phase and ecliptic longitude (deg.) at a Time, scalar or array,
+    # like moon_phases.moon_phase_and_longitude_at()
+    if np.ndim(t.tt) == 0:
+        moon, sun = _longitudes_at_scalar_tt(float(t.tt))
+        return (moon - sun) % 360, moon
+    moon, sun = longitudes_at_tt(t.tt)
+    phase = (moon - sun) % 360
+    return phase.reshape(np.shape(t.tt)), moon.reshape(np.shape(t.tt))
+
+
+def moon_phase_at(t):
+    return moon_phase_and_longitude_at(t)[0]
+
+
+def moon_longitude_at(t):
+    return moon_phase_and_longitude_at(t)[1]
@@ -0,0 +1,71 @@
+import numpy as np
+
+import ephemeris_registry
+from ephemeris_registry import get_timescale
+from instrumentation import timed
+from skyfield_helpers import get_file_path
+
+# === lunar eclipses catalog ===
+# All lunar eclipses of the DE421 span, found once with moon_phases.search_moon_eclipses() and shipped as a text
+# table, so an eclipse query is a binary search in sorted arrays instead of a root-finding pass over the range.
+# Regenerate with `python eclipse_catalog.py` after changing the search.
+
+CATALOG_FILE = 'lunar_eclipses.txt'
+CATALOG_YEARS = (1900, 2051)  # the catalog covers 1900-01-01 - 2051-01-01 UTC (exclusive), the years 1900 - 2050
+
+eclipse_types = {1: 'penumbral', 2: 'partial', 3: 'total'}
+
+_catalog = None
+
+
+@timed('eclipses.read_catalog')
+def read_catalog(filename):
+    # returns the ephemeris name, the covered TT range and the sorted arrays of eclipse maxima TT and ratings
+    ephemeris, start_tt, end_tt = None, None, None
+    tt, ratings = [], []
+    with open(filename, 'r') as f:
+        for line in f:
+            if line.startswith('# ephemeris = '):
+                ephemeris = line.split(' = ')[1].strip()
+            elif line.startswith('# tt_range = '):
+                start_tt, end_tt = map(float, line.split(' = ')[1].split(' - '))
+            elif line.strip() and not line.startswith('#'):
+                eclipse_tt, _, _, rating = line.strip().split(', ')
+                tt.append(float(eclipse_tt))
+                ratings.append(int(rating))
+    return ephemeris, start_tt, end_tt, np.asarray(tt), np.asarray(ratings, dtype=int)
+
+
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        _catalog = read_catalog(get_file_path(CATALOG_FILE))
+    return _catalog
+
+
+def find_catalog_eclipses(start_time, end_time):
+    # times and ratings of the catalogued eclipses in the range,
+    # or None when the catalog does not apply (another ephemeris or a range outside of the catalog)
+    ephemeris, start_tt, end_tt, tt, ratings = get_catalog()
+    if ephemeris != ephemeris_registry.EPHEMERIS_FILE or start_time.tt < start_tt or end_time.tt > end_tt:
+        return None
+    first, last = np.searchsorted(tt, [start_time.tt, end_time.tt])
+    return get_timescale().tt_jd(tt[first:last]), ratings[first:last]
+
+
+def generate_catalog(filename, years=CATALOG_YEARS):
+    from moon_phases import search_moon_eclipses
+
+    ts = get_timescale()
+    start_time, end_time = ts.utc(years[0], 1, 1), ts.utc(years[1], 1, 1)
+    t, ratings = search_moon_eclipses(start_time, end_time)
+    with open(filename, 'w') as f:
+        f.write(f"# lunar eclipses {years[0]} - {years[1] - 1}: time of maximum (TT Julian date, UTC), type, rating\n")
+        f.write(f"# ephemeris = {ephemeris_registry.EPHEMERIS_FILE}\n")
+        f.write(f"# tt_range = {start_time.tt:.6f} - {end_time.tt:.6f}\n")
+        for eclipse_tt, eclipse_utc, rating in zip(t.tt, t.utc_strftime(), ratings):
+            f.write(f"{eclipse_tt:.6f}, {eclipse_utc}, {eclipse_types[rating]}, {rating}\n")
+
+
+if __name__ == "__main__":
+    generate_catalog(CATALOG_FILE)
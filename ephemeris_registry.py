@@ -0,0 +1,93 @@
+import threading
+import time
+
+from skyfield.api import load
+
+from instrumentation import timer
+
+# === process-wide ephemeris registry ===
+# The JPL kernel, the timescale and the body segments are opened once per process
+# on first use and shared by moon_phases, moon_zodiac, body_positions and skyfield_helpers afterwards.
+
+EPHEMERIS_FILE = 'de421.bsp'  # JPL ephemeris DE421 (covers 1900-2050)
+
+_lock = threading.Lock()
+_ephemeris = None
+_timescale = None
+_bodies = None
+_body_segments = {}  # target name -> segment of the kernel
+
+_stats = {
+    'ephemeris_loads': 0,
+    'ephemeris_hits': 0,
+    'ephemeris_load_seconds': 0.0,
+    'timescale_loads': 0,
+    'timescale_hits': 0,
+    'timescale_load_seconds': 0.0,
+}
+
+
+def get_ephemeris():
+    global _ephemeris
+    if _ephemeris is None:
+        with _lock:
+            if _ephemeris is None:
+                from skyfield_helpers import get_file_path  # skyfield_helpers imports this module
+                started = time.perf_counter()
+                with timer('ephemeris.load'):
+                    _ephemeris = load(get_file_path(EPHEMERIS_FILE))
+                _stats['ephemeris_load_seconds'] += time.perf_counter() - started
+                _stats['ephemeris_loads'] += 1
+                return _ephemeris
+    _stats['ephemeris_hits'] += 1
+    return _ephemeris
+
+
+def get_timescale():
+    global _timescale
+    if _timescale is None:
+        with _lock:
+            if _timescale is None:
+                started = time.perf_counter()
+                with timer('ephemeris.timescale_load'):
+                    _timescale = load.timescale()
+                _stats['timescale_load_seconds'] += time.perf_counter() - started
+                _stats['timescale_loads'] += 1
+                return _timescale
+    _stats['timescale_hits'] += 1
+    return _timescale
+
+
+def get_bodies():
+    # (sun, moon, earth) segments of the shared kernel
+    global _bodies
+    if _bodies is None:
+        eph = get_ephemeris()
+        _bodies = eph['sun'], eph['moon'], eph['earth']
+    else:
+        _stats['ephemeris_hits'] += 1
+    return _bodies
+
+
+def get_body(target):
+    # the segment of any target of the shared kernel, e.g. 'mars' or 'jupiter barycenter'
+    segment = _body_segments.get(target)
+    if segment is None:
+        segment = _body_segments[target] = get_ephemeris()[target]
+    else:
+        _stats['ephemeris_hits'] += 1
+    return segment
+
+
+def get_registry_stats():
+    return dict(_stats)
+
+
+def reset_registry():
+    # drop the loaded kernel and timescale, e.g. to switch the ephemeris file or in benchmarks
+    global _ephemeris, _timescale, _bodies
+    with _lock:
+        _ephemeris = _timescale = _bodies = None
+        _body_segments.clear()
+        for key in _stats:
+            _stats[key] = type(_stats[key])()
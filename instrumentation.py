@@ -0,0 +1,100 @@
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+
+# === timing and counting instrumentation ===
+# Named timers, as a context manager or a decorator, and counters around the expensive steps: ephemeris loads,
+# batch computations, eclipse searches and redraws. Each timing is added to the totals in `stats` and logged at the
+# DEBUG level of this module's logger. It is off unless MOON_CALENDAR_INSTRUMENT=1 or enable() is called: a timer is
+# then a shared no-op context and a decorated function costs a flag check. The totals are kept per process, the
+# timings in worker processes of a process pool go to their log only.
+
+enabled = os.environ.get('MOON_CALENDAR_INSTRUMENT', '0') != '0'
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+stats = {}  # timer name -> [calls, total seconds, last seconds]
+counters = {}  # counter name -> count
+
+_no_timer = contextlib.nullcontext()
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+class _Timer:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.started)
+
+
+def timer(name):
+    # with timer('name'): ... -- times the block
+    return _Timer(name) if enabled else _no_timer
+
+
+def timed(name):
+    # @timed('name') -- times every call of the function
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def record(name, seconds):
+    # a timing measured otherwise, e.g. from a request to its result
+    with _lock:
+        entry = stats.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = seconds
+    logger.debug("%s: %.2f ms", name, seconds * 1000)
+
+
+def count(name, n=1):
+    if enabled:
+        with _lock:
+            counters[name] = counters.get(name, 0) + n
+
+
+def last_seconds(name):
+    # the last timing of a timer, None before the first one
+    entry = stats.get(name)
+    return entry[2] if entry else None
+
+
+def reset():
+    with _lock:
+        stats.clear()
+        counters.clear()
+
+
+def report():
+    # the totals as text, the most expensive timers first
+    with _lock:
+        lines = [f"{name:<32} {calls:>7} calls {total * 1000:>11.1f} ms total {total / calls * 1000:>9.2f} ms mean"
+                 for name, (calls, total, _) in sorted(stats.items(), key=lambda item: -item[1][1])]
+        lines += [f"{name:<32} {value:>7}" for name, value in sorted(counters.items())]
+    return '\n'.join(lines)
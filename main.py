@@ -5,25 +5,164 @@
 
 # eclipses https://stackoverflow.com/questions/64658304/determining-lunar-eclipse-in-skyfield
 
-# pyinstaller --clean -y -n "moon_calendar" --add-data="./hexagram_data.txt":"./hexagram_data.txt" --add-data="./de421.bsp":"./de421.bsp" --onefile --windowed main.py
+# pyinstaller --clean -y -n "moon_calendar" --add-data="./hexagram_data.txt":"./hexagram_data.txt" --add-data="./de421.bsp":"./de421.bsp" --add-data="./lunar_eclipses.txt":"./lunar_eclipses.txt" --onefile --windowed main.py
 
+import argparse
+import calendar
+import cProfile
 import datetime
-
+import functools
+import logging
+import multiprocessing
+import os
+import pstats
+import sys
+import time
+import zoneinfo
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
 import tkinter as tk
+import dateutil.tz
 import matplotlib.dates as mdates
+from matplotlib.artist import Artist
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.widgets import Button, TextBox
-from matplotlib.patches import Ellipse
-from matplotlib.ticker import MaxNLocator
-
+from matplotlib.widgets import Button, RadioButtons, TextBox
+from matplotlib.backend_bases import MouseButton
+from matplotlib.collections import PathCollection
+from matplotlib.path import Path
+from matplotlib.text import TextPath
+from matplotlib.transforms import Affine2D
+
+import almanac
+import instrumentation
+from calendar_export import add_export_arguments, run_export
+from eclipse_catalog import eclipse_types
+from instrumentation import timed, last_seconds
+from moon_events import quarter_names
 from moon_phases import get_moon_phase, get_moon_eclipses
-from moon_zodiac import get_moon_at_sign
+from moon_service import add_service_arguments, run_service
+from moon_zodiac import get_moon_at_sign, current_position_report, signs
+from plot_helpers import ellipse_polygon, clip_convex_polygon
+from quantized_cache import QuantizedLRUCache
+from skyfield_helpers import local_to_utc, utc_now, utc_to_local
+from timeline import (PLOTTED_POINTS_PER_PIXEL, DATE_RANGE, sample_step, grid_index, compute_spans,
+                      merge_spans, trim_span, coarsen_span, plot_points)
+
+# Cursor queries are memoized at this resolution, and the phase is read from the plotted series when possible
+CURSOR_QUERY_RESOLUTION = datetime.timedelta(minutes=1)
+CURSOR_QUERY_CACHE_SIZE = 4096
+CURSOR_PHASE_FROM_SERIES = True
+
+# Timeline computations run in a pool of 'thread' or 'process' workers, polled from the Tk loop
+TIMELINE_EXECUTOR = os.environ.get('MOON_CALENDAR_EXECUTOR', 'thread')
+TIMELINE_WORKERS = 2
+TIMELINE_POLL_MS = 50
+
+# Selectable timeline ranges (days), the mouse wheel zooms between MIN_TIME_RANGE and MAX_TIME_RANGE
+TIME_RANGES = {'week': 7, 'month': 28, 'year': 365, 'decade': 3652}
+MIN_TIME_RANGE = datetime.timedelta(days=1)
+MAX_TIME_RANGE = datetime.timedelta(days=2 * 3652)
+ZOOM_FACTOR = 1.25  # per mouse wheel step
+
+# The computed timeline is a buffer around the shown range, so that panning moves over already computed data
+# while the newly exposed edges are computed in the background. Sizes are fractions of the shown range per side.
+BUFFER_MARGIN = 1.0  # computed ahead
+BUFFER_REFILL = 0.5  # computing ahead starts when less is left
+BUFFER_KEEP = 2.0  # dropped beyond
+
+MIN_ICON_SPACING_PX = 24  # closer moon or sign icons are thinned out
+TICK_SPACING_PX = 30
+
+# Moon and sign icons have a fixed size on screen. All the icons of a kind are a single collection of paths in points
+# placed at the event dates, so a zoom does not resize them and their number does not add artists.
+MOON_ICON_SIZE_PT = 18  # diameter
+MOON_ICON_PHASE_STEP = 1.0  # (deg.) icon shapes are made for the phase rounded to this and reused
+SIGN_ICON_SIZE_PT = 17
+SIGN_ICON_GAP_PT = 5  # between the curve and the top of a sign glyph under it
+
+PROFILE_TOP_FUNCTIONS = 30  # printed by --profile, by the cumulative time
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def moon_icon_shapes(phase, eclipse=0):
+    # a Moon icon at a phase and an eclipse rating as a list of (path, face color, edge color, line width)
+    # in points around the icon center, drawn in order; the shadows are clipped to the disc here,
+    # since the paths of a collection can not have clip paths of their own
+    # https://palettemaker.com/colors/moon
+    # https://www.schemecolor.com/moon-colors.php
+    # https://www.color-hex.com/color-palette/9473
+    moon_color = '#F6F1D5'
+    edge_shadow_color = '#94908D'
+    deep_shadow_color = '#51607E'
+    eclipse_color = '#731c1c'
+
+    diameter = MOON_ICON_SIZE_PT
+    moon_window = ellipse_polygon((0, 0), diameter, diameter)  # the visible side of the moon
+    shapes = [(moon_window, moon_color, edge_shadow_color, 1)]  # the solar light
+
+    # Process full moon states  (TODO: replace the special fix with a nice automatic solution)
+    if 180 - 5 < phase < 180 + 5:
+        if eclipse > 1:  # rank 2 or 3
+            shapes.append((moon_window, eclipse_color, deep_shadow_color, 3))
+        elif eclipse == 1:
+            earth_shadow_edge_rounding = 0.87
+            earth_shadow_shift = diameter * earth_shadow_edge_rounding * 0.6
+            earth_shadow = ellipse_polygon((0, -earth_shadow_shift), diameter / earth_shadow_edge_rounding, diameter)
+            shapes.append((clip_convex_polygon(earth_shadow, moon_window), eclipse_color, deep_shadow_color, 2))
+    else:
+        # moon moves from left to right, thus solar light and moon shadow side moves from right to left
+        moon_shadow_edge_rounding = 0.87  # this for visual effect
+        moon_shadow_shift = diameter * moon_shadow_edge_rounding * ((-phase) if phase < 180 else (360 - phase)) / 180
+        moon_shadow = ellipse_polygon((moon_shadow_shift, 0), diameter, diameter / moon_shadow_edge_rounding)
+        shapes.append((clip_convex_polygon(moon_shadow, moon_window), deep_shadow_color, edge_shadow_color, 2))
+
+    return [(Path(np.concatenate([vertices, vertices[:1]]), closed=True), face_color, edge_color, line_width)
+            for vertices, face_color, edge_color, line_width in shapes if len(vertices)]
+
+
+@functools.lru_cache(maxsize=None)
+def sign_icon_path(sign_icon):
+    # the glyph as a path in points, centered horizontally with its top at 0
+    path = TextPath((0, 0), sign_icon, size=SIGN_ICON_SIZE_PT)
+    extents = path.get_extents()
+    return path.transformed(Affine2D().translate(-(extents.x0 + extents.x1) / 2, -extents.y1))
+
+
+def add_icon_collection(axes, paths, offsets, scale=1.0, **kwargs):
+    # the paths are in points (times scale) around their offsets, which are in data coordinates
+    icons = PathCollection(paths, offsets=offsets, offset_transform=axes.transData,
+                           transform=Affine2D().scale(scale / 72) + axes.figure.dpi_scale_trans, **kwargs)
+    axes.add_collection(icons, autolim=False)
+    return icons
+
+
+def create_executor(kind=TIMELINE_EXECUTOR):
+    if kind == 'process':
+        return ProcessPoolExecutor(max_workers=TIMELINE_WORKERS)
+    elif kind == 'thread':
+        return ThreadPoolExecutor(max_workers=TIMELINE_WORKERS)
+    raise ValueError(kind)
+
+
+class DrawStart(Artist):
+    # an empty artist drawn first of a figure: the time a full redraw starts, the draw_event is sent at its end
+    zorder = -np.inf
+
+    def __init__(self):
+        super().__init__()
+        self.started = None
+
+    def draw(self, renderer):
+        self.started = time.perf_counter()
 
 # === calendar window part ===
 
 class MainWindow:
-    def __init__(self, window):
+    def __init__(self, window, overlay=False, tz=None):
 
         self.window = window
         self.window.title("Moon Calendar")
@@ -36,14 +175,39 @@ class MainWindow:
 
         # moon phase timeline graphic
         self.graph_axes = self.fig.add_axes([0.075, 0.25, 0.75, 0.70])  # (x0, y0, dx, dy) start and size in % of fig
-        self.current_date = self.center_date = self.cursor_date = datetime.datetime.today()
+        # the dates are naive UTC like those of the timeline, and shown in the local time of tz (tzinfo, None for the
+        # local zone of the system)
+        self.tz = tz
+        self.current_date = self.center_date = self.cursor_date = utc_now()
+        self.cursor_x = mdates.date2num(self.cursor_date)
         self.date_format = "%Y-%m-%d"
-        self.time_range_days = 28
-        self.draw_moon_phase()
+        self.time_range = datetime.timedelta(days=TIME_RANGES['month'])
+        self.cursor_phase_from_series = CURSOR_PHASE_FROM_SERIES
+        self.cursor_moon_phase_cache = QuantizedLRUCache(
+            get_moon_phase, resolution=CURSOR_QUERY_RESOLUTION, maxsize=CURSOR_QUERY_CACHE_SIZE)
+        self.cursor_moon_sign_cache = QuantizedLRUCache(
+            lambda date: get_moon_at_sign(date)[1], resolution=CURSOR_QUERY_RESOLUTION, maxsize=CURSOR_QUERY_CACHE_SIZE)
+        # the timeline (a buffer around the shown range) is computed in the background,
+        # nothing to show until the first result
+        self.executor = create_executor()
+        self.timeline_future = None
+        self.timeline_request = None
+        self.timeline_request_started = None
+        self.timeline = None
+        self.icons_extent = None  # the range and the plot size the icons were drawn for
+        self.icon_artists = []
+        self.phase_line = None
+        self.pan_start = None  # (x pixel, center date) when panning with the right mouse button
+        self.moon_phases = np.empty(0)
+        self.moon_phase_dates = []
+        self.moon_phase_x = np.empty(0)
+        self.moon_phases_unwrapped = np.empty(0)
+        self.progress_text = self.graph_axes.text(
+            0.5, 0.5, '', transform=self.graph_axes.transAxes, va='center', ha='center', color='gray')
 
         # text box for date input
         self.date_intput_axes = self.fig.add_axes([0.865, 0.85, 0.10, 0.05])
-        self.date_input_box = TextBox(self.date_intput_axes, "Enter date (YYYY-MM-DD)", initial=self.center_date.strftime(self.date_format))
+        self.date_input_box = TextBox(self.date_intput_axes, "Enter date (YYYY-MM-DD)", initial=self.local_date_text(self.center_date))
         date_intput_label = self.date_intput_axes.get_children()[0]  # label is a child of the TextBox axis
         date_intput_label.set_position([0.5, 1.80])  # [x,y] - change here to set the position
         date_intput_label.set_verticalalignment('top')
@@ -69,13 +233,35 @@ class MainWindow:
         reset_button_text.set_horizontalalignment('center')
         self.reset_button.on_clicked(self.reset)
 
+        # calendar grid button
+        self.calendar_axes = self.fig.add_axes([0.865, 0.55, 0.10, 0.05])
+        self.calendar_button = Button(self.calendar_axes, 'Calendar', color='lightgray', hovercolor='0.975')
+        self.calendar_button.on_clicked(self.show_calendar)
+        self.calendar_window = None
+
+        # time range selector
+        self.range_axes = self.fig.add_axes([0.865, 0.03, 0.10, 0.17], frame_on=False)
+        self.range_buttons = RadioButtons(self.range_axes, list(TIME_RANGES),
+                                          active=list(TIME_RANGES.values()).index(self.time_range.days))
+        self.range_buttons.on_clicked(self.select_range)
+
         # Initialize cursor at current datetime
-        self.cursor_info_axes = self.fig.add_axes([0.865, 0.25, 0.10, 0.32], frame_on=False)
+        self.cursor_info_axes = self.fig.add_axes([0.865, 0.22, 0.10, 0.30], frame_on=False)
         self.cursor_info_axes.set_xticks([])
         self.cursor_info_axes.set_yticks([])
+        # the cursor line and info are an overlay blitted over the cached rest of the figure (animated artists
+        # are skipped by the full redraws), so moving the cursor does not redraw the plot
         self.cursor_info = self.cursor_info_axes.text(
-            0.5, 0.45, '', transform=self.cursor_info_axes.transAxes, va='center', ha='center')
+            0.5, 0.45, '', transform=self.cursor_info_axes.transAxes, va='center', ha='center', animated=True)
         self.update_cursor_info_text()
+        # the debug overlay: the compute and draw times of the last frame, blitted with the cursor
+        self.overlay = overlay
+        if overlay:
+            instrumentation.enable()
+        self.timing_text = self.fig.text(0.005, 0.01, '', fontsize=8, family='monospace', color='gray',
+                                         animated=True, visible=overlay)
+        self.draw_start = self.fig.add_artist(DrawStart())
+        self.background = None
         # Store the id of the vertical line (initially None)
         self.cursor_line_id = None
         # Boolean to check if the mouse button is being held down
@@ -83,46 +269,283 @@ class MainWindow:
         self.info_window = None
 
         # To redraw circles
-        self.fig.canvas.mpl_connect('resize_event', self.re_draw_all)
+        self.fig.canvas.mpl_connect('resize_event', self.onresize)
+        # To cache the background of the overlay
+        self.fig.canvas.mpl_connect('draw_event', self.ondraw)
         # Connect to mouse events
         self.fig.canvas.mpl_connect("button_press_event", self.onclick)
         self.fig.canvas.mpl_connect("button_release_event", self.offclick)
         self.fig.canvas.mpl_connect("motion_notify_event", self.onmove)
+        self.fig.canvas.mpl_connect("scroll_event", self.onscroll)
+        # To stop the timeline workers with the window
+        self.canvas.get_tk_widget().bind('<Destroy>', self.ondestroy, add='+')
+
+        self.update_view()
 
     def submit(self, event):
-        self.graph_axes.cla()
-        self.center_date = datetime.datetime.strptime(self.date_input_box.text, self.date_format)
-        self.draw_moon_phase()
-        self.re_draw_all()
+        self.center_date = local_to_utc(datetime.datetime.strptime(self.date_input_box.text, self.date_format), self.tz)
+        self.update_view()
 
     def reset(self, event):
         self.close_info_window()
-        self.graph_axes.cla()
-        self.current_date = self.center_date = self.cursor_date = datetime.datetime.now()
-        self.date_input_box.set_val(self.center_date.strftime(self.date_format))
+        self.current_date = self.center_date = self.cursor_date = utc_now()
+        self.cursor_x = mdates.date2num(self.cursor_date)
+        self.date_input_box.set_val(self.local_date_text(self.center_date))
         self.update_cursor_info_text()
-        self.draw_moon_phase()
+        self.update_view()
+
+    def show_calendar(self, event):
+        # the month of the shown date, in a window of its own kept open along with this one
+        local_date = utc_to_local(self.center_date, self.tz)
+        if self.calendar_window is not None and self.calendar_window.window.winfo_exists():
+            self.calendar_window.show(*CalendarWindow.almanac_month(local_date.year, local_date.month))
+            self.calendar_window.window.lift()
+            return
+        self.calendar_window = CalendarWindow(tk.Toplevel(self.window), local_date, on_select=self.select_date,
+                                              tz=self.tz)
+
+    def select_date(self, date):
+        # a day clicked in the calendar grid, centered at its local noon
+        self.date_input_box.set_val(date.strftime(self.date_format))
+        self.center_date = local_to_utc(date, self.tz)
+        self.update_view()
+
+    def local_date_text(self, date):
+        return utc_to_local(date, self.tz).strftime(self.date_format)
+
+    def axis_tz(self):
+        # the dates axis needs a tzinfo for the local zone of the system too, that of dateutil (used by matplotlib)
+        return self.tz if self.tz is not None else dateutil.tz.tzlocal()
+
+    def select_range(self, label):
+        self.time_range = datetime.timedelta(days=TIME_RANGES[label])
+        self.update_view()
+
+    def view_bounds(self):
+        view_start = self.center_date - self.time_range / 2
+        return view_start, view_start + self.time_range
+
+    def view_grid(self, step):
+        # the grid points covering the shown range
+        view_start, view_end = self.view_bounds()
+        return grid_index(view_start, step), grid_index(view_end, step) + 1
+
+    def update_view(self):
+        # show the range around center_date: the plot moves at once over the computed timeline,
+        # and what is missing of the range and of the margins around it is computed in the background
+        width_px = max(100, int(self.graph_axes.get_window_extent().width))
+        step = sample_step(self.time_range, width_px)
+        view_first, view_last = self.view_grid(step)
+        margin = int(self.time_range * BUFFER_MARGIN / step)
+        refill = int(self.time_range * BUFFER_REFILL / step)
+
+        timeline_changed = False
+        if self.timeline is not None and self.timeline['step'] != step:
+            # zoomed out: the finer samples are reused, zoomed in: recomputed
+            if step > self.timeline['step']:
+                self.timeline = coarsen_span(self.timeline, step // self.timeline['step'])
+            else:
+                self.timeline = None
+            timeline_changed = True
+        if self.timeline is not None and (self.timeline['last'] <= self.timeline['first']
+                                          or self.timeline['last'] < view_first - margin
+                                          or self.timeline['first'] > view_last + margin):
+            self.timeline = None  # jumped far away
+            timeline_changed = True
+
+        if timeline_changed:
+            self.cancel_timeline_request()
+            if self.timeline is not None:
+                self.draw_timeline()
+            else:
+                self.clear_timeline()
+        elif self.timeline is not None:
+            self.graph_axes.set_xlim(*self.view_bounds())
+            # the icons are placed in data coordinates, so panning moves them, and only a zoom or resize
+            # (changing how many of them fit) redraws them
+            if self.icons_extent != self.get_icons_extent():
+                self.re_draw_all()
+
+        if self.timeline_future is None:
+            first_allowed, last_allowed = grid_index(DATE_RANGE[0], step) + 1, grid_index(DATE_RANGE[1], step)
+            if self.timeline is None:
+                # the shown range first, the margins are requested when it is drawn
+                bounds = [(max(view_first, first_allowed), min(view_last, last_allowed))]
+            else:
+                bounds = []
+                if self.timeline['first'] > max(view_first - refill, first_allowed):
+                    bounds.append((max(view_first - margin, first_allowed), self.timeline['first']))
+                if self.timeline['last'] < min(view_last + refill, last_allowed):
+                    bounds.append((self.timeline['last'], min(view_last + margin, last_allowed)))
+            bounds = [(first, last) for first, last in bounds if first < last]
+            if bounds:
+                self.request_timeline(step, bounds, replace=self.timeline is None)
+            elif self.timeline is None:
+                self.progress_text.set_text("Out of the ephemeris range")
+        self.canvas.draw_idle()
+
+    def request_timeline(self, step, bounds, replace):
+        self.timeline_future = self.executor.submit(compute_spans, step, bounds)
+        self.timeline_request = {'step': step, 'replace': replace}
+        self.timeline_request_started = time.perf_counter()
+        if replace:
+            self.update_progress()
+        self.window.after(TIMELINE_POLL_MS, self.poll_timeline, self.timeline_future)
+
+    def cancel_timeline_request(self):
+        # the pending request became stale: cancelled if not started yet, otherwise ignored when done
+        if self.timeline_future is not None:
+            self.timeline_future.cancel()
+        self.timeline_future = self.timeline_request = None
+
+    def poll_timeline(self, future):
+        # runs in the Tk loop, the only place where results of the workers are drawn
+        if future is not self.timeline_future:
+            return  # stale
+        if not future.done():
+            if self.timeline_request['replace']:
+                self.update_progress()
+            self.window.after(TIMELINE_POLL_MS, self.poll_timeline, future)
+            return
+        request = self.timeline_request
+        self.timeline_future = self.timeline_request = None
+        if instrumentation.enabled:
+            instrumentation.record('gui.timeline', time.perf_counter() - self.timeline_request_started)
+        if future.exception() is not None:
+            self.progress_text.set_text(f"Computation failed: {future.exception()}")
+            self.canvas.draw_idle()
+            return
+
+        # the spans adjoin the timeline they were requested for, it is changed only here or with a cancel
+        spans = future.result()
+        if request['replace']:
+            self.timeline = merge_spans(spans)
+        else:
+            before = [span for span in spans if span['last'] == self.timeline['first']]
+            after = [span for span in spans if span['first'] == self.timeline['last']]
+            self.timeline = merge_spans(before + [self.timeline] + after)
+        # drop what got too far from the shown range
+        step = self.timeline['step']
+        view_first, view_last = self.view_grid(step)
+        keep = int(self.time_range * BUFFER_KEEP / step)
+        self.timeline = trim_span(self.timeline, view_first - keep, view_last + keep)
+        self.draw_timeline()
+        self.update_view()  # computes ahead, or what the view moved to meanwhile
+
+    def update_progress(self):
+        elapsed = time.perf_counter() - self.timeline_request_started
+        self.progress_text.set_text(f"Computing {self.time_range / datetime.timedelta(days=1):.0f} days around "
+                                    f"{self.local_date_text(self.center_date)}... {elapsed:.1f} s")
+        self.canvas.draw_idle()
+
+    def clear_timeline(self):
+        self.graph_axes.cla()
+        self.cursor_line_id = None  # removed with the rest of the axes content
+        self.icon_artists = []
+        self.phase_line = None
+        self.progress_text = self.graph_axes.text(
+            0.5, 0.5, '', transform=self.graph_axes.transAxes, va='center', ha='center', color='gray')
+
+    @timed('gui.draw_timeline')
+    def draw_timeline(self):
+        timeline = self.timeline
+        self.moon_phases = timeline['moon_phases']
+        self.moon_phase_dates = timeline['moon_phase_dates']
+        self.moon_phase_x = mdates.date2num(self.moon_phase_dates)
+        self.moon_phases_unwrapped = np.unwrap(self.moon_phases, period=360)
+
+        # an extended timeline only replaces the line data and the icons, the axes are set up once
+        if self.phase_line is None:
+            self.clear_timeline()
+            self.draw_moon_phase()
+        else:
+            self.phase_line.set_data(*self.get_plot_points())
+            self.graph_axes.relim()
+            self.graph_axes.autoscale_view(scalex=False)
+            self.graph_axes.set_xlim(*self.view_bounds())
         self.re_draw_all()
 
-    def re_draw_all(self, resize_event=None):
+    def ondestroy(self, destroy_event):
+        # the window is closed: the queued timeline computations are dropped and the workers stopped
+        self.timeline_future = self.timeline_request = None
+        self.executor.shutdown(cancel_futures=True)
+
+    def onresize(self, resize_event):
+        # the sampling follows the plot width, and the icons are sized by it
+        self.update_view()
+
+    def ondraw(self, draw_event):
+        # a full redraw: cache it without the overlay, then draw the overlay over it
+        if instrumentation.enabled and self.draw_start.started is not None:
+            instrumentation.record('gui.draw', time.perf_counter() - self.draw_start.started)
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_overlay()
+
+    @timed('gui.overlay')
+    def draw_overlay(self):
+        # restores the cached figure and draws the cursor line and info only
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        if self.cursor_line_id is not None:
+            self.graph_axes.draw_artist(self.cursor_line_id)
+        self.cursor_info_axes.draw_artist(self.cursor_info)
+        if self.overlay:
+            self.timing_text.set_text(self.get_timing_text())
+            self.fig.draw_artist(self.timing_text)
+        self.canvas.blit(self.fig.bbox)
+
+    def get_timing_text(self):
+        # the last timeline computation (from the request to the result), its plot, and the last frame
+        timings = [('timeline', 'gui.timeline'), ('plot', 'gui.draw_timeline'), ('icons', 'gui.icons'),
+                   ('draw', 'gui.draw'), ('overlay', 'gui.overlay')]
+        return '  '.join(f"{label} {last_seconds(name) * 1000:.0f} ms" for label, name in timings
+                         if last_seconds(name) is not None)
+
+    def get_icons_extent(self):
+        bbox = self.graph_axes.get_window_extent()
+        return self.time_range, bbox.width, bbox.height
+
+    @timed('gui.icons')
+    def re_draw_all(self):
+
+        # nothing computed yet
+        if self.timeline is None:
+            return
 
-        # remove all Ellipse objects from the plot
-        if resize_event is not None:
-            for item in self.graph_axes.patches:
-                if isinstance(item, Ellipse):
-                    item.remove()
+        # remove the icons drawn for the previous size
+        for artist in self.icon_artists:
+            artist.remove()
+        self.icon_artists = []
+        self.icons_extent = self.get_icons_extent()
 
         # self.draw_moon_phase()
-        self.draw_moon_phase_icons(self.moon_phases, self.moon_phase_dates)
-        self.draw_moon_sign_icons(self.moon_phases, self.moon_phase_dates)
-
-        if resize_event is not None:
-            resize_event.canvas.draw()
-        else:
-            self.canvas.draw()
+        # keep the icons apart: too dense quarter icons are reduced to new and full moons, then to eclipses only,
+        # and too dense sign icons are not drawn; the timeline is longer than the shown range by the buffer margins
+        timeline_range = (self.timeline['last'] - self.timeline['first']) * self.timeline['step']
+        max_icons = self.graph_axes.get_window_extent().width / MIN_ICON_SPACING_PX * (timeline_range / self.time_range)
+        quarter_phases, quarter_dates = self.timeline['quarter_phases'], self.timeline['quarter_dates']
+        eclipses = self.timeline['eclipses']
+        if len(quarter_dates) > max_icons:
+            eclipse_days = {eclipse_time[:10] for eclipse_time, _ in eclipses}
+            keep = [phase % 180 == 0 for phase in quarter_phases]
+            if sum(keep) > max_icons:
+                keep = [phase == 180 and date.strftime(self.date_format) in eclipse_days
+                        for date, phase in zip(quarter_dates, quarter_phases)]
+            quarter_phases = [phase for phase, kept in zip(quarter_phases, keep) if kept]
+            quarter_dates = [date for date, kept in zip(quarter_dates, keep) if kept]
+        self.draw_moon_phase_icons(quarter_phases, quarter_dates, eclipses)
+        if len(self.timeline['sign_ingress_dates']) <= max_icons:
+            self.draw_moon_sign_icons(self.timeline['sign_ingress_phases'], self.timeline['sign_ingress_dates'],
+                                      self.timeline['sign_ingress_signs'])
+
+        self.canvas.draw_idle()
 
     def onclick(self, event):
-        if event.inaxes == self.cursor_info_axes and event.dblclick:
+        if event.inaxes == self.graph_axes and event.button == MouseButton.RIGHT:
+            self.pan_start = event.x, self.center_date
+        elif event.inaxes == self.cursor_info_axes and event.dblclick:
             self.show_info()
         elif event.inaxes == self.graph_axes and event.dblclick:
             self.cursor_line_dragging = True
@@ -134,8 +557,16 @@ class MainWindow:
 
     def offclick(self, event):
         self.cursor_line_dragging = False
+        self.pan_start = None
 
     def onmove(self, event):
+        if self.pan_start is not None:
+            # drag to pan: the date under the mouse follows it
+            start_x, start_center_date = self.pan_start
+            width_px = self.graph_axes.get_window_extent().width
+            self.center_date = start_center_date - self.time_range * ((event.x - start_x) / width_px)
+            self.update_view()
+            return
         if not self.cursor_line_dragging:
             return
         self.update_cursor_line_and_label(event)
@@ -143,12 +574,24 @@ class MainWindow:
         if self.info_window:
             self.update_info_window()
 
+    def onscroll(self, event):
+        # the mouse wheel zooms in and out around the date under the mouse
+        if event.inaxes != self.graph_axes:
+            return
+        zoom = 1 / ZOOM_FACTOR if event.button == 'up' else ZOOM_FACTOR
+        time_range = min(max(self.time_range * zoom, MIN_TIME_RANGE), MAX_TIME_RANGE)
+        mouse_date = mdates.num2date(event.xdata).replace(tzinfo=None)
+        self.center_date = mouse_date + (self.center_date - mouse_date) * (time_range / self.time_range)
+        self.time_range = time_range
+        self.update_view()
+
     def update_cursor_info_text(self):
-        # For minute precision, change "%Y-%m-%d" to "%Y-%m-%d %H:%M:%S" or "%Y-%m-%d %H:%M"
-        date_text = self.cursor_date.strftime(self.date_format)
-        time_text = self.cursor_date.strftime("%H:%M")
-        moon_phase = get_moon_phase(self.cursor_date)
-        moon_sign = get_moon_at_sign(self.cursor_date)[1]
+        # in local time; for minute precision, change "%Y-%m-%d" to "%Y-%m-%d %H:%M:%S" or "%Y-%m-%d %H:%M"
+        local_date = utc_to_local(self.cursor_date, self.tz)
+        date_text = local_date.strftime(self.date_format)
+        time_text = local_date.strftime("%H:%M %Z")
+        moon_phase = self.get_cursor_moon_phase()
+        moon_sign = self.cursor_moon_sign_cache(self.cursor_date)
         self.cursor_info.set_text(
             "Selected position:\n\n"
             "Date: {}\n"
@@ -157,23 +600,31 @@ class MainWindow:
             "Sign: {}\n"
             .format(date_text, time_text, moon_phase, moon_sign))
 
+    def get_cursor_moon_phase(self):
+        # interpolate the already computed series when the cursor is within it, no ephemeris query at all
+        if (self.cursor_phase_from_series and len(self.moon_phase_x)
+                and self.moon_phase_x[0] <= self.cursor_x <= self.moon_phase_x[-1]):
+            return np.interp(self.cursor_x, self.moon_phase_x, self.moon_phases_unwrapped) % 360
+        return self.cursor_moon_phase_cache(self.cursor_date)
+
     def update_cursor_line_and_label(self, event):
         # Check if click was in plot axis
         if event.inaxes == self.graph_axes:
             # Current values
-            self.cursor_date = mdates.num2date(event.xdata)
+            self.cursor_x = event.xdata
+            self.cursor_date = mdates.num2date(event.xdata).replace(tzinfo=None)  # UTC
 
-            # Remove old line
-            if self.cursor_line_id:
-                self.cursor_line_id.remove()
-            # Add a vertical line at cursor position
-            self.cursor_line_id = self.graph_axes.axvline(event.xdata, color='r', linestyle='--')
+            # Move the line to the cursor position, add it at the first time
+            if self.cursor_line_id is None:
+                self.cursor_line_id = self.graph_axes.axvline(event.xdata, color='r', linestyle='--', animated=True)
+            else:
+                self.cursor_line_id.set_xdata([event.xdata, event.xdata])
 
             # Update label
             self.update_cursor_info_text()
 
-        # Redraw canvas
-        self.canvas.draw()
+            # Redraw the overlay only
+            self.draw_overlay()
 
     def update_info_window(self):
         # check if window still exists
@@ -211,33 +662,30 @@ class MainWindow:
         self.info_window.deiconify()  # show window after setup
 
     def close_info_window(self, event=None):
-        print(f"DEBUG close_info_window() event {event}")
+        logger.debug("close_info_window() event %s", event)
         if self.info_window and self.info_window.winfo_exists():
             self.info_window.destroy()
             self.info_window = None
 
     def draw_moon_phase(self):
 
-        # Initialize base date
-        base_date = self.center_date - datetime.timedelta(days=self.time_range_days//2)
-        moon_phase_dates = [base_date + datetime.timedelta(hours=x) for x in range(self.time_range_days*24)]
-        moon_phases = [get_moon_phase(d) for d in moon_phase_dates]
-        y = [mf if mf  <= 180 else (360 - mf) for mf in moon_phases]
+        # the whole computed timeline is plotted, and the shown range is set by the x limits
+        plot_dates, self.y = self.get_plot_points()
         #y = np.sin(np.linspace(0, 2 * np.pi, numdays))
 
-        self.y = y
-        self.moon_phases = moon_phases
-        self.moon_phase_dates = moon_phase_dates
-
-        self.graph_axes.plot(moon_phase_dates, y, color='#1f77b4')  # color default '#1f77b4' or 'k' (black)
-        self.graph_axes.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+        self.phase_line, = self.graph_axes.plot(plot_dates, self.y, color='#1f77b4')  # color default '#1f77b4' or 'k' (black)
+        self.graph_axes.set_xlim(*self.view_bounds())
+        # the ticks at and the labels of local dates
+        self.graph_axes.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d', tz=self.axis_tz()))
         #self.graph_axes.xaxis.set_major_locator(mdates.DayLocator())
-        # Use MaxNLocator to limit the number of ticks
-        self.graph_axes.xaxis.set_major_locator(MaxNLocator(nbins=self.time_range_days*24+1, integer=True))
+        # Limit the number of ticks by the plot width, whatever the range and the sample count are
+        max_ticks = max(4, int(self.graph_axes.get_window_extent().width // TICK_SPACING_PX))
+        self.graph_axes.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=3, maxticks=max_ticks,
+                                                                       tz=self.axis_tz()))
         # # Create a function format_date that takes a tick value, x, and the position and returns the date string
         # def format_date(x, pos=None): return num2date(x).strftime('%Y-%m-%d')
         # #self.graph_axes.xaxis.set_major_formatter(FuncFormatter(format_date))
-        self.graph_axes.set_xlabel('Time (days)')
+        self.graph_axes.set_xlabel(f"Time (days, {utc_to_local(self.center_date, self.tz).strftime('%Z')})")
         self.graph_axes.set_ylabel('Moon Phase (deg.)')
         self.graph_axes.grid(True)
 
@@ -249,149 +697,310 @@ class MainWindow:
             label.set_ha("right")
             label.set_rotation(30)
             # Make cursor date label bold
-            if label.get_text() == self.center_date.strftime(self.date_format):
+            if label.get_text() == self.local_date_text(self.center_date):
                 label.set_weight('bold')
-        # Make dashed vertical line at the current datetime
-        self.current_date = datetime.datetime.now()
-        if moon_phase_dates[0] <= self.current_date <= moon_phase_dates[-1]:
-            self.graph_axes.axvline(mdates.date2num(self.current_date), color='k', linestyle='--')
+        # Make dashed vertical line at the current datetime (it is out of the x limits when not in the range)
+        self.current_date = utc_now()
+        self.graph_axes.axvline(mdates.date2num(self.current_date), color='k', linestyle='--')
+
+    def get_plot_points(self):
+        # the timeline line reduced to about the pixel count of the shown range
+        view_samples = self.time_range / self.timeline['step']
+        threshold = int(self.graph_axes.get_window_extent().width * PLOTTED_POINTS_PER_PIXEL
+                        * len(self.moon_phase_dates) / view_samples)
+        return plot_points(self.timeline, threshold)
 
-    def draw_moon_phase_icons(self, moon_phases, moon_phase_dates):
+    def draw_moon_phase_icons(self, moon_phases, moon_phase_dates, eclipses=None):
 
         x_y_ph_pos = []  # collect list of tuples with image coordinates and phase
 
         # a single date passed for drawing
-        if not ((isinstance(moon_phases, list)) and (moon_phase_dates, list)):
+        if np.ndim(moon_phases) == 0:
             y_pos = moon_phases if moon_phases <= 180 else (360 - moon_phases)
             x_y_ph_pos.append((moon_phase_dates, y_pos, moon_phases))
-            eclipses = get_moon_eclipses(moon_phase_dates - datetime.timedelta(days=1),
-                                         moon_phase_dates + datetime.timedelta(days=1))
+            if eclipses is None:
+                eclipses = get_moon_eclipses(moon_phase_dates - datetime.timedelta(days=1),
+                                             moon_phase_dates + datetime.timedelta(days=1))
 
         else:
-            target_moon_phases = [0, 90, 180, 270, 360]
-            moon_phase_step = 1.5 * abs(moon_phases[1] - moon_phases[0])
-            # the highest phase may be e.g. 359.45 not, 360, and diff is higher than step 0.45 vs 0.57+
-            print(f"DEBUG draw_moon_phase_icons(): phase step {moon_phase_step})")
-            eclipses = get_moon_eclipses(moon_phase_dates[0], moon_phase_dates[-1])
+            # icons at the given (e.g. quarter events) dates and phases
+            if eclipses is None:
+                eclipses = get_moon_eclipses(moon_phase_dates[0], moon_phase_dates[-1]) if moon_phase_dates else []
 
-            for i, moon_phase in enumerate(moon_phases):
-                if any((abs(ph - moon_phase) < moon_phase_step) for ph in target_moon_phases):
-                    y_pos = moon_phase if moon_phase <= 180 else (360 - moon_phase)
-                    if ((len(x_y_ph_pos) > 0 and abs(x_y_ph_pos[-1][1] - y_pos) > 2 * moon_phase_step)
-                            or len(x_y_ph_pos) == 0):
-                        x_y_ph_pos.append((moon_phase_dates[i], y_pos, moon_phase))
+            for moon_phase_date, moon_phase in zip(moon_phase_dates, moon_phases):
+                y_pos = moon_phase if moon_phase <= 180 else (360 - moon_phase)
+                x_y_ph_pos.append((moon_phase_date, y_pos, moon_phase))
 
-        print(f"DEBUG draw_moon_phase_icons(): total {len(x_y_ph_pos)} points at the positions x,y: {x_y_ph_pos}")
+        logger.debug("draw_moon_phase_icons(): total %d points at the positions x,y: %s", len(x_y_ph_pos), x_y_ph_pos)
 
+        paths, offsets, face_colors, edge_colors, line_widths = [], [], [], [], []
         for x_pos, y_pos, phase in x_y_ph_pos:
             date_eclipses = [eclipse_rank for eclipse_time, eclipse_rank in eclipses
                              if x_pos.strftime(self.date_format) in eclipse_time]
-            has_eclipse = max(date_eclipses) if date_eclipses else False
-            self.draw_moon(x_pos=x_pos, y_pos=y_pos, phase=phase, eclipse=has_eclipse)
-
-    def draw_moon(self, x_pos=0, y_pos=0, phase=0, eclipse=False):
-        # https://palettemaker.com/colors/moon
-        # https://www.schemecolor.com/moon-colors.php
-        # https://www.color-hex.com/color-palette/9473
-        moon_color = '#F6F1D5'
-        edge_shadow_color = '#94908D'
-        deep_shadow_color = '#51607E'
-        eclipse_color = '#731c1c'
-
-        # window_width, window_height = self.canvas.get_width_height()  # get 800x600 values
-        bbox = self.graph_axes.get_window_extent().transformed(self.canvas.figure.dpi_scale_trans.inverted())
-        window_width, window_height = bbox.width, bbox.height
-
-        # Calculate x and y data ranges
-        x_range = max(xlim := self.graph_axes.get_xlim()) - min(xlim)
-        y_range = max(ylim := self.graph_axes.get_ylim()) - min(ylim)
-
-        # Diameter of circular patches as fractions of data ranges
-        x_diameter = x_range / window_width / 4
-        y_diameter = y_range / window_height / 4
-
-        # Center coordinates
-        center_x = mdates.date2num(x_pos)
-        center_y = y_pos
-
-        print(f"DEBUG draw_moon(): center_x {center_x:.3f}, center_y {center_y:.3f}, x_diameter {x_diameter:.3f}, y_diameter {y_diameter:.3f}")
-
-        # Create a window (visible side of the moon)
-        moon_window_circle = Ellipse((center_x, center_y), x_diameter, y_diameter,
-                                color='none', zorder=1) # transform=ax.transData | ax.transAxes, the same for all
-
-        solar_light_circle = Ellipse((center_x, center_y), x_diameter, y_diameter,
-                                     fill=True, facecolor=moon_color, edgecolor=edge_shadow_color, lw=1, zorder=2)
+            has_eclipse = max(date_eclipses) if date_eclipses else 0
+            rounded_phase = round(phase / MOON_ICON_PHASE_STEP) * MOON_ICON_PHASE_STEP % 360
+            for path, face_color, edge_color, line_width in moon_icon_shapes(rounded_phase, has_eclipse):
+                paths.append(path)
+                offsets.append((mdates.date2num(x_pos), y_pos))
+                face_colors.append(face_color)
+                edge_colors.append(edge_color)
+                line_widths.append(line_width)
+        self.add_icon_collection(paths, offsets, facecolors=face_colors, edgecolors=edge_colors,
+                                 linewidths=line_widths, zorder=2)
+
+    def draw_moon_sign_icons(self, moon_phases, moon_phase_dates, moon_signs):
+
+        # sign icons at the given (e.g. sign ingress events) dates and phases, under the curve
+        paths, offsets = [], []
+        for ingress_date, phase, sign in zip(moon_phase_dates, moon_phases, moon_signs):
+            y_pos = phase if phase <= 180 else (360 - phase)
+            paths.append(sign_icon_path(sign.split()[1]).transformed(Affine2D().translate(0, -SIGN_ICON_GAP_PT)))
+            offsets.append((mdates.date2num(ingress_date), y_pos))
+        self.add_icon_collection(paths, offsets, facecolors='k', edgecolors='none', linewidths=0, zorder=2)
+
+    def add_icon_collection(self, paths, offsets, **kwargs):
+        if paths:
+            self.icon_artists.append(add_icon_collection(self.graph_axes, paths, offsets, **kwargs))
+
+
+# === calendar grid part ===
+# A month of day cells or a year of day icons, read from the almanac: a year table is computed (or loaded) once,
+# then flipping to another month or year is a slice of it. The texts of the cells are made once and only get new
+# strings, and the moon icons of the shown days are a single collection, so a flip costs the redraw of the figure.
+
+CALENDAR_VIEWS = ('month', 'year')
+MONTH_ICON_SCALE = 1.6  # of MOON_ICON_SIZE_PT
+YEAR_ICON_SCALE = 0.7
+MONTH_ROWS = 6  # weeks a month spans at most
+
+
+class CalendarWindow:
+    def __init__(self, window, date, on_select=None, tz=None):
+        # on_select(datetime) is called with the local noon of a clicked day; the days are those of tz (tzinfo),
+        # default the local zone of the system
+        self.window = window
+        self.window.title("Moon Calendar - grid")
+        self.on_select = on_select
+        self.tz = tz
+        self.year, self.month = self.almanac_month(date.year, date.month)
+        self.view = 'month'
+        self.days = None  # the almanac rows shown
+        self.icons = None
+
+        self.fig = Figure(figsize=(8, 6), dpi=100)
+        self.canvas = FigureCanvasTkAgg(self.fig, master=window)
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
 
-        # moon moves from left to right, thus solar light and moon shadow side moves from right to left
-        moon_shadow_edge_rounding = 0.87  # this for visual effect
-        moon_shadow_shift = x_diameter * moon_shadow_edge_rounding * ((-phase) if phase < 180 else ((360-phase))) / 180
-        moon_shadow_circle = Ellipse((center_x + moon_shadow_shift, center_y),
-                                     x_diameter, y_diameter / moon_shadow_edge_rounding,
-                               fill=True, facecolor=deep_shadow_color, edgecolor=edge_shadow_color, lw=2,  zorder=3)
+        self.title = self.fig.text(0.5, 0.94, '', ha='center', va='center', fontsize=14, weight='bold')
+        self.previous_axes = self.fig.add_axes([0.30, 0.915, 0.06, 0.05])
+        self.previous_button = Button(self.previous_axes, '<', color='lightgray', hovercolor='0.975')
+        self.previous_button.on_clicked(self.show_previous)
+        self.next_axes = self.fig.add_axes([0.64, 0.915, 0.06, 0.05])
+        self.next_button = Button(self.next_axes, '>', color='lightgray', hovercolor='0.975')
+        self.next_button.on_clicked(self.show_next)
+        self.view_axes = self.fig.add_axes([0.02, 0.89, 0.12, 0.10], frame_on=False)
+        self.view_buttons = RadioButtons(self.view_axes, list(CALENDAR_VIEWS), active=0)
+        self.view_buttons.on_clicked(self.select_view)
+
+        # the month: a header of week days over 7 x MONTH_ROWS cells (x the week day, y the week)
+        self.month_axes = self.fig.add_axes([0.02, 0.02, 0.96, 0.86])
+        self.month_axes.set_axis_off()
+        self.month_axes.set_xlim(0, 7)
+        self.month_axes.set_ylim(MONTH_ROWS, -0.3)
+        for x in range(8):
+            self.month_axes.plot([x, x], [0, MONTH_ROWS], color='lightgray', lw=1)
+        for y in range(MONTH_ROWS + 1):
+            self.month_axes.plot([0, 7], [y, y], color='lightgray', lw=1)
+        for x, day_name in enumerate(calendar.day_abbr):
+            self.month_axes.text(x + 0.5, -0.15, day_name, ha='center', va='center', weight='bold')
+        self.cell_texts = []  # (day number, illumination, position and events) per cell
+        for y in range(MONTH_ROWS):
+            for x in range(7):
+                self.cell_texts.append((
+                    self.month_axes.text(x + 0.05, y + 0.06, '', ha='left', va='top', weight='bold'),
+                    self.month_axes.text(x + 0.95, y + 0.06, '', ha='right', va='top', fontsize=8, color='gray'),
+                    self.month_axes.text(x + 0.5, y + 0.6, '', ha='center', va='top', fontsize=7.5,
+                                         linespacing=1.2)))
+
+        # the year: a row of day icons per month
+        self.year_axes = self.fig.add_axes([0.08, 0.02, 0.90, 0.86], visible=False)
+        self.year_axes.set_axis_off()
+        self.year_axes.set_xlim(0.5, 31.5)
+        self.year_axes.set_ylim(12.5, -0.2)
+        for day in range(1, 32):
+            self.year_axes.text(day, 0, str(day), ha='center', va='center', fontsize=7, color='gray')
+        for month in range(1, 13):
+            self.year_axes.text(0.2, month, calendar.month_abbr[month], ha='right', va='center')
 
-        if eclipse > 1:  # rank 2 or 3
-            earth_shadow_circle = Ellipse((center_x, center_y), x_diameter, y_diameter,
-                                   fill=True, facecolor=eclipse_color, edgecolor=deep_shadow_color, lw=3,  zorder=4)
-        elif eclipse == 1:
-            earth_shadow_edge_rounding = 0.87
-            earth_shadow_shift = y_diameter * earth_shadow_edge_rounding * 0.6
-            earth_shadow_circle = Ellipse((center_x, center_y - earth_shadow_shift),
-                                          x_diameter / earth_shadow_edge_rounding, y_diameter,
-                                   fill=True, facecolor=eclipse_color, edgecolor=deep_shadow_color, lw=2,  zorder=4)
-        else:
-            earth_shadow_circle = Ellipse((center_x, center_y), x_diameter , y_diameter,
-                                   fill=True, facecolor=eclipse_color, edgecolor=deep_shadow_color, lw=3,  zorder=4)
-
-        # Add shapes and clippers
-        # https://stackoverflow.com/questions/67075348/what-is-the-difference-between-add-artist-or-add-patch
-        self.graph_axes.add_artist(moon_window_circle)  # should be first to get proper coords for clipping
-        self.graph_axes.add_artist(solar_light_circle)
-        solar_light_circle.set_clip_path(moon_window_circle)
-
-        # Process full moon states  (TODO: replace the special fix with a nice automatic solution)
-        if 180 - 5 < phase < 180 + 5:
-            if eclipse:
-                self.graph_axes.add_artist(earth_shadow_circle)
-                earth_shadow_circle.set_clip_path(moon_window_circle)
+        self.fig.canvas.mpl_connect("button_press_event", self.onclick)
+        self.update_grid()
+
+    @staticmethod
+    def almanac_month(year, month):
+        # the month of a date, or the closest one of the almanac years for a date beyond them
+        first_year, last_year = almanac.ALMANAC_YEARS
+        if year < first_year:
+            return first_year, 1
+        if year > last_year:
+            return last_year, 12
+        return year, month
+
+    def show(self, year, month=None):
+        # nothing beyond the years of the almanac
+        if not almanac.ALMANAC_YEARS[0] <= year <= almanac.ALMANAC_YEARS[1]:
+            return
+        self.year = year
+        if month is not None:
+            self.month = month
+        self.update_grid()
+
+    def show_previous(self, event=None):
+        if self.view == 'year':
+            self.show(self.year - 1)
         else:
-            self.graph_axes.add_artist(moon_shadow_circle)
-            moon_shadow_circle.set_clip_path(moon_window_circle)
-
-        # print(f"DEBUG", moon_window_circle.get_path().contains_point((center_x, center_y))) -- always false
-
-
-    def draw_moon_sign_icons(self, moon_phases, moon_phase_dates):
-
-        moon_phases_list = moon_phases if isinstance(moon_phases, list) else [moon_phases]
+            self.show(self.year - (self.month == 1), (self.month - 2) % 12 + 1)
 
-        moon_phase_dates_list = moon_phase_dates if isinstance(moon_phase_dates, list) else [moon_phase_dates]
-        
-        moon_signs_dated_list = [(date, phase, get_moon_at_sign(date)[1])
-                                 for date, phase in zip(moon_phase_dates_list, moon_phases_list)]
+    def show_next(self, event=None):
+        if self.view == 'year':
+            self.show(self.year + 1)
+        else:
+            self.show(self.year + (self.month == 12), self.month % 12 + 1)
 
-        for i_date, (date, phase, sign) in enumerate(moon_signs_dated_list):
-            if i_date == 0:
-                pass  # self.draw_moon_sign(date, phase, sign)  # drawn too close, not nice
-            else:
-                prev_sign = moon_signs_dated_list[i_date - 1][2]
-                if sign != prev_sign:
-                    self.draw_moon_sign(date, phase, sign)
+    def select_view(self, label):
+        self.view = label
+        self.month_axes.set_visible(label == 'month')
+        self.year_axes.set_visible(label == 'year')
+        self.update_grid()
 
-    def draw_moon_sign(self, x_pos=0, y_pos=0, sign=None):
-        # Coordinates are the left bottom corner of annotation, thus center letters with x-0.25 and y-16
-        horizontal_position = mdates.num2date(mdates.date2num(x_pos) - 0.25).replace(tzinfo=None)
-        vertical_position = (y_pos if y_pos <= 180 else (360 - y_pos)) - 16
-        sign_icon = sign.split()[1]
-        self.graph_axes.annotate(sign_icon, xy=(horizontal_position, vertical_position), fontsize=17)
+    def onclick(self, event):
+        # a day of the year view opens its month, a day of the month is passed to on_select
+        if event.inaxes == self.year_axes and event.xdata is not None:
+            day, month = round(event.xdata), round(event.ydata)
+            if 1 <= month <= 12 and 1 <= day <= calendar.monthrange(self.year, month)[1]:
+                self.view_buttons.set_active(CALENDAR_VIEWS.index('month'))  # calls select_view()
+                self.show(self.year, month)
+        elif event.inaxes == self.month_axes and event.xdata is not None and self.on_select is not None:
+            first_weekday, day_count = calendar.monthrange(self.year, self.month)
+            day = int(event.ydata) * 7 + int(event.xdata) - first_weekday + 1
+            if 1 <= day <= day_count and event.ydata >= 0:
+                self.on_select(datetime.datetime(self.year, self.month, day, 12))
+
+    @timed('gui.calendar')
+    def update_grid(self):
+        if self.icons is not None:
+            self.icons.remove()
+            self.icons = None
+        if self.view == 'month':
+            self.days = almanac.month_table(self.year, self.month, self.tz)
+            self.title.set_text(f"{calendar.month_name[self.month]} {self.year}")
+            self.fill_month()
+        else:
+            self.days = almanac.get_year(self.year, self.tz)
+            self.title.set_text(str(self.year))
+            self.fill_year()
+        self.canvas.draw_idle()
+
+    def fill_month(self):
+        first_weekday = calendar.monthrange(self.year, self.month)[0]
+        today = utc_to_local(utc_now(), self.tz).date()
+        for cell, (number_text, illumination_text, day_text) in enumerate(self.cell_texts):
+            i = cell - first_weekday
+            if not 0 <= i < len(self.days):
+                for text in (number_text, illumination_text, day_text):
+                    text.set_text('')
+                continue
+            day = self.days[i]
+            number_text.set_text(str(i + 1))
+            number_text.set_color('r' if (self.year, self.month, i + 1) == today.timetuple()[:3] else 'k')
+            illumination_text.set_text(f"{day['illumination'] * 100:.0f}%")
+            lines = [f"{signs[day['sign']].split()[1]} {day['gate']}.{day['line']}"]
+            if day['quarter'] != almanac.NO_EVENT:
+                lines.append(f"{quarter_names[day['quarter']]} {self.clock_text(day['quarter_minute'])}")
+            if day['ingress_sign'] != almanac.NO_EVENT:
+                lines.append(f"→{signs[day['ingress_sign']].split()[1]} {self.clock_text(day['ingress_minute'])}")
+            if day['eclipse']:
+                lines.append(f"{eclipse_types[day['eclipse']]} eclipse")
+            day_text.set_text('\n'.join(lines))
+        offsets = [((first_weekday + i) % 7 + 0.5, (first_weekday + i) // 7 + 0.33) for i in range(len(self.days))]
+        self.icons = self.add_day_icons(self.month_axes, offsets, MONTH_ICON_SCALE)
+
+    def fill_year(self):
+        dates = self.days['date']
+        months = dates.astype('datetime64[M]').astype(int) % 12 + 1
+        days = (dates - dates.astype('datetime64[M]')).astype(int) + 1
+        self.icons = self.add_day_icons(self.year_axes, list(zip(days, months)), YEAR_ICON_SCALE)
+
+    def add_day_icons(self, axes, offsets, scale):
+        # the icon of a day shows its quarter when it has one, otherwise its phase at noon, and its eclipse
+        phases = np.where(self.days['quarter'] != almanac.NO_EVENT, self.days['quarter'] * 90.0, self.days['phase'])
+        phases = np.where(self.days['eclipse'] > 0, 180.0, phases)
+        rounded_phases = np.round(phases / MOON_ICON_PHASE_STEP) * MOON_ICON_PHASE_STEP % 360
+        paths, icon_offsets, face_colors, edge_colors, line_widths = [], [], [], [], []
+        for offset, phase, eclipse in zip(offsets, rounded_phases.tolist(), self.days['eclipse'].tolist()):
+            for path, face_color, edge_color, line_width in moon_icon_shapes(phase, eclipse):
+                paths.append(path)
+                icon_offsets.append(offset)
+                face_colors.append(face_color)
+                edge_colors.append(edge_color)
+                line_widths.append(line_width * scale)
+        return add_icon_collection(axes, paths, icon_offsets, scale, facecolors=face_colors, edgecolors=edge_colors,
+                                   linewidths=line_widths, zorder=2)
+
+    @staticmethod
+    def clock_text(minute):
+        return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def run_command(parser, args):
+    if args.command == 'position':
+        print(current_position_report())
+    elif args.command == 'calendar':
+        run_export(parser, args)
+    elif args.command == 'serve':
+        run_service(args)
+    else:
+        current_moon_phase = get_moon_phase(date=None)
+        print(f'Current Moon phase is {current_moon_phase:.1f} '
+              f'(Legend: New Moon 0/360, Full Moon 180)')
+
+        window = tk.Tk()
+        window.geometry('1260x500')  # '800x600'
+        MainWindow(window, overlay=args.overlay, tz=zoneinfo.ZoneInfo(args.tz) if args.tz else None)
+        tk.mainloop()
 
 
 if __name__ == "__main__":
-    current_moon_phase = get_moon_phase(date=None)
-    print(f'Current Moon phase is {current_moon_phase:.1f} '
-          f'(Legend: New Moon 0/360, Full Moon 180)')
-
-    window = tk.Tk()
-    window.geometry('1260x500')  # '800x600'
-    MainWindow(window)
-    tk.mainloop()
\ No newline at end of file
+    multiprocessing.freeze_support()  # for the process pool executor in a frozen build
+
+    parser = argparse.ArgumentParser(description="Moon Calendar")
+    parser.add_argument('command', nargs='?', choices=['gui', 'position', 'calendar', 'serve'], default='gui',
+                        help="'gui' (default) opens the calendar window, 'position' prints the current Moon position, "
+                             "'calendar' writes the calendar rows of a range without a display, "
+                             "'serve' answers Moon queries over local HTTP/JSON")
+    parser.add_argument('--log-level', default=os.environ.get('MOON_CALENDAR_LOG_LEVEL', 'WARNING').upper(),
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="DEBUG also logs the time of every instrumented step (default WARNING)")
+    parser.add_argument('--overlay', action='store_true', help="show the compute and draw times over the plot")
+    parser.add_argument('--tz', help="time zone of the dates shown, e.g. Europe/Berlin (default the local one)")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="profile the run (the main process) with cProfile, write the stats to FILE "
+                             "and print the top functions")
+    add_export_arguments(parser.add_argument_group("calendar options"))
+    add_service_arguments(parser.add_argument_group("serve options"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format='%(asctime)s %(name)s %(levelname)s: %(message)s')
+    if args.log_level == 'DEBUG' or args.overlay:
+        instrumentation.enable()
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        run_command(parser, args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        if instrumentation.enabled:
+            logger.info("timings:\n%s", instrumentation.report())
\ No newline at end of file
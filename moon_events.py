@@ -0,0 +1,204 @@
+import asyncio
+import itertools
+
+import numpy as np
+
+from skyfield.searchlib import find_discrete
+
+import series_cache
+from eclipse_catalog import find_catalog_eclipses, eclipse_types
+from ephemeris_registry import get_ephemeris, get_timescale
+from instrumentation import timed
+from moon_phases import moon_phase_at
+from moon_zodiac import moon_longitude, get_gate_index, signs
+from skyfield_helpers import date_to_timescale_time
+
+# === exact events search ===
+# Instead of sampling a range (e.g. hourly) and comparing neighbour samples, the functions below find the exact
+# instants where a discrete value of the Moon position changes. Quarters and sign ingresses are searched with
+# skyfield find_discrete, at a step shorter than the shortest possible interval between two changes; the gate and
+# line ingresses, too many for that, come from the unwrapped longitude refined with Newton steps. An already
+# computed series is only interpolated at its crossings (find_series_crossings), for approximate events.
+
+EVENT_EPSILON_DAYS = 1.0 / 86400  # events are located to a second
+
+quarter_names = ['New Moon', 'First Quarter', 'Full Moon', 'Last Quarter']
+
+
+def moon_quarter_at(t):
+    # 0 - 3 for the phase ranges starting with the new moon 0, first quarter 90, full moon 180 and last quarter 270
+    return (np.asarray(moon_phase_at(t)) // 90).astype(int) % 4
+
+moon_quarter_at.step_days = 1.0  # quarters are at least ~6.5 days apart
+
+
+def moon_sign_index_at(t):
+    return (np.asarray(moon_longitude(t).degrees) // 30).astype(int) % 12
+
+moon_sign_index_at.step_days = 0.5  # the Moon stays in a sign for at least ~2 days
+
+
+def find_quarter_phases(date_from, date_to):
+    # times of the exact new moon, first quarter, full moon and last quarter in a range,
+    # and the quarter index (in quarter_names) of each one; the phase at an event is 90 * quarter index
+    return series_cache.get_events(date_to_timescale_time(date_from), date_to_timescale_time(date_to),
+                                   series_cache.QUARTER)
+
+
+def find_sign_ingresses(date_from, date_to):
+    # times of the Moon entering a zodiac sign in a range, and the index (in moon_zodiac.signs) of the entered sign
+    return series_cache.get_events(date_to_timescale_time(date_from), date_to_timescale_time(date_to),
+                                   series_cache.SIGN)
+
+
+@timed('events.search_quarter_phases')
+def search_quarter_phases(start_time, end_time):
+    # the search behind find_quarter_phases(), bypassing the cache
+    return find_discrete(start_time, end_time, moon_quarter_at, epsilon=EVENT_EPSILON_DAYS)
+
+
+@timed('events.search_sign_ingresses')
+def search_sign_ingresses(start_time, end_time):
+    # the search behind find_sign_ingresses(), bypassing the cache
+    return find_discrete(start_time, end_time, moon_sign_index_at, epsilon=EVENT_EPSILON_DAYS)
+
+
+def find_gate_line_ingresses(date_from, date_to, step_days=0.1):
+    # times of the Moon entering a hexagram gate line in a range, and the gate and line numbers of the entered one.
+    # With ~380 boundaries per lap find_discrete would need a sub-hour step and a refinement of thousands of
+    # intervals, so here the geocentric longitude of the Moon (which never goes retrograde) is inverted instead:
+    # sampled and unwrapped, interpolated at every boundary, then refined with Newton steps.
+    ts = get_timescale()
+    start_time, end_time = date_to_timescale_time(date_from), date_to_timescale_time(date_to)
+    starts, gate_numbers, line_numbers = get_gate_index()
+
+    jd = np.linspace(start_time.tt, end_time.tt, max(2, int(np.ceil((end_time.tt - start_time.tt) / step_days)) + 1))
+    lon = np.unwrap(np.asarray(moon_longitude(ts.tt_jd(jd)).degrees), period=360)
+    speed = np.gradient(lon, jd)  # deg./day
+
+    # every boundary in every lap of the range
+    laps = np.arange(np.floor(lon[0] / 360), np.floor(lon[-1] / 360) + 1)
+    targets = (starts[np.newaxis, :] + 360 * laps[:, np.newaxis]).ravel()
+    index = np.tile(np.arange(len(starts)), len(laps))
+    crossed = (targets > lon[0]) & (targets <= lon[-1])
+    targets, index = targets[crossed], index[crossed]
+
+    event_jd = np.interp(targets, lon, jd)
+    event_speed = np.interp(event_jd, jd, speed)
+    for _ in range(4):
+        if not len(event_jd):
+            break
+        delta_days = ((targets - moon_longitude(ts.tt_jd(event_jd)).degrees + 180) % 360 - 180) / event_speed
+        event_jd = event_jd + delta_days
+        if np.max(np.abs(delta_days)) < EVENT_EPSILON_DAYS:
+            break
+
+    return ts.tt_jd(event_jd), gate_numbers[index], line_numbers[index]
+
+
+def find_series_crossings(tt, unwrapped_degrees, step_degrees):
+    # approximate events from an already computed series: the TT times where unwrapped (increasing) degrees cross
+    # multiples of step_degrees, linearly interpolated between the samples, and the index of the entered step
+    # (e.g. step 90 for the phase quarters, 30 for the signs of the longitude); as precise as the series sampling
+    first_step = np.floor(unwrapped_degrees[0] / step_degrees) + 1
+    last_step = np.floor(unwrapped_degrees[-1] / step_degrees)
+    steps = np.arange(first_step, last_step + 1)
+    crossing_tt = np.interp(steps * step_degrees, unwrapped_degrees, tt)
+    return crossing_tt, steps.astype(int) % int(round(360 / step_degrees))
+
+
+# === upcoming events ===
+# The events from a time on in time order, computed only as far as the consumer pulls them: the generators search a
+# window at a time, the first of FIRST_WINDOW_DAYS and each next one twice as long up to MAX_WINDOW_DAYS, so the
+# next few events cost the search of a day or two instead of a fixed month. Quarters and sign ingresses are read
+# from the series cache where its chunks are stored and searched in the window otherwise, eclipses come from the
+# catalog, gate/line ingresses are searched.
+
+EVENT_KINDS = ('quarter', 'sign', 'gate', 'eclipse')
+FIRST_WINDOW_DAYS = 1.0
+MAX_WINDOW_DAYS = 16.0
+
+
+def describe_event(kind, value):
+    # the text of an event: value is the quarter index, the sign index, (gate, line) or the eclipse rating
+    if kind == 'quarter':
+        return quarter_names[value]
+    elif kind == 'sign':
+        return f"Moon enters {signs[value]}"
+    elif kind == 'gate':
+        return f"Moon enters gate {value[0]} line {value[1]}"
+    return f"{eclipse_types[value].capitalize()} lunar eclipse"
+
+
+def _ephemeris_end_tt():
+    # the last TT date for which all the segments of the kernel are defined, less a margin for the light time
+    return min(segment.end_jd for segment in get_ephemeris().spk.segments) - 1.0
+
+
+def _stored_in_cache(start_time, end_time):
+    tt = np.append(np.arange(start_time.tt, end_time.tt, series_cache.CHUNK_DAYS), end_time.tt)
+    return series_cache.enabled and not series_cache.missing_chunks(get_timescale().tt_jd(tt), series_cache.EVENTS)
+
+
+@timed('events.window')
+def window_events(start_time, end_time, kinds=EVENT_KINDS):
+    # the events of the kinds in a window as (TT, kind, value), sorted by time
+    events = []
+    cached = _stored_in_cache(start_time, end_time)
+    for kind, cache_kind, search in (('quarter', series_cache.QUARTER, search_quarter_phases),
+                                     ('sign', series_cache.SIGN, search_sign_ingresses)):
+        if kind in kinds:
+            t, values = (series_cache.get_events(start_time, end_time, cache_kind) if cached
+                         else search(start_time, end_time))
+            events += zip(t.tt.tolist(), itertools.repeat(kind), np.asarray(values).tolist())
+    if 'gate' in kinds:
+        t, gate_numbers, line_numbers = find_gate_line_ingresses(start_time, end_time)
+        events += zip(t.tt.tolist(), itertools.repeat('gate'), zip(gate_numbers.tolist(), line_numbers.tolist()))
+    if 'eclipse' in kinds:
+        eclipses = find_catalog_eclipses(start_time, end_time)
+        if eclipses is None:
+            eclipses = series_cache.get_events(start_time, end_time, series_cache.ECLIPSE)
+        t, ratings = eclipses
+        events += zip(t.tt.tolist(), itertools.repeat('eclipse'), np.asarray(ratings).tolist())
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+def _iter_windows(date_from, date_to, kinds):
+    # the events of the successive windows, a list per window
+    unknown = [kind for kind in kinds if kind not in EVENT_KINDS]
+    if unknown:
+        raise ValueError(f"unknown event kinds {', '.join(unknown)}, expected some of {', '.join(EVENT_KINDS)}")
+    ts = get_timescale()
+    start_tt = date_to_timescale_time(date_from).tt
+    end_tt = date_to_timescale_time(date_to).tt if date_to is not None else _ephemeris_end_tt()
+    days = FIRST_WINDOW_DAYS
+    while start_tt < end_tt:
+        window_end_tt = min(start_tt + days, end_tt)
+        events = window_events(ts.tt_jd(start_tt), ts.tt_jd(window_end_tt), kinds)
+        if events:
+            times = ts.tt_jd([tt for tt, _, _ in events])
+            yield [(times[i], kind, value) for i, (_, kind, value) in enumerate(events)]
+        start_tt = window_end_tt
+        days = min(2 * days, MAX_WINDOW_DAYS)
+
+
+def iter_moon_events(date_from=None, date_to=None, kinds=EVENT_KINDS):
+    # (time, kind, value) of the events from date_from (default now) on, in time order, until date_to (default the
+    # end of the ephemeris); see describe_event() for the values, e.g.
+    #   for t, kind, value in itertools.islice(iter_moon_events(kinds=('quarter',)), 4): ...
+    for events in _iter_windows(date_from, date_to, kinds):
+        yield from events
+
+
+async def aiter_moon_events(date_from=None, date_to=None, kinds=EVENT_KINDS, executor=None):
+    # iter_moon_events() for an event loop: each window is searched in a thread of the executor (the default one of
+    # the loop by default), so the loop keeps running while a window is searched
+    loop = asyncio.get_running_loop()
+    windows = _iter_windows(date_from, date_to, kinds)
+    while True:
+        events = await loop.run_in_executor(executor, next, windows, None)
+        if events is None:
+            return
+        for event in events:
+            yield event
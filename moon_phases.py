@@ -1,12 +1,19 @@
+import logging
+
 import numpy as np
 
-from skyfield.api import load
 from skyfield.constants import ERAD
 from skyfield.functions import angle_between, length_of
 from skyfield.searchlib import find_maxima
-from skyfield.framelib import ecliptic_frame
 
-from skyfield_helpers import date_to_timescale_time, get_file_path
+import series_cache
+from body_positions import ecliptic_positions
+from eclipse_catalog import find_catalog_eclipses
+from ephemeris_registry import get_bodies
+from instrumentation import timed
+from skyfield_helpers import date_to_timescale_time, dates_to_timescale_time
+
+logger = logging.getLogger(__name__)
 
 # === skyfield part ===
 
@@ -15,34 +22,60 @@ def get_moon_phase(date=None):
     # Create a timescale and ask the current time.
     t = date_to_timescale_time(date)
 
-    # Load the JPL ephemeris DE421 (covers 1900-2050).
-    eph = load(get_file_path('de421.bsp'))
-    sun, moon, earth = eph['sun'], eph['moon'], eph['earth']
+    return series_cache.moon_phase_at(t)
+
+def get_moon_phases(dates):
+
+    # The same as get_moon_phase(), but for a whole list of dates (or an array Time) at once:
+    # a single observation pass instead of one ephemeris evaluation per date
+    t = dates_to_timescale_time(dates)
+
+    return np.asarray(series_cache.moon_phase_at(t), dtype=float)
 
-    # planets = load('de421.bsp')
-    # earth, mars = planets['earth'], planets['mars']
-    #
-    # # What's the position of Mars, viewed from Earth?
-    # astrometric = earth.at(t).observe(mars)
-    # ra, dec, distance = astrometric.radec()
-    #
-    # print(ra)
-    # print(dec)
-    # print(distance)
+def moon_phase_at(t):
 
-    e = earth.at(t)
-    _, slon, _ = e.observe(sun).apparent().frame_latlon(ecliptic_frame)
-    _, mlon, _ = e.observe(moon).apparent().frame_latlon(ecliptic_frame)
-    phase = (mlon.degrees - slon.degrees) % 360.0
+    # The Moon - Sun ecliptic longitude (deg.), from the JPL ephemeris DE421 (covers 1900-2050).
+    return moon_phase_and_longitude_at(t)[0]
 
-    return phase
+def moon_phase_and_longitude_at(t):
+
+    # moon_phase_at() and moon_zodiac.moon_longitude() in a single pass, both in degrees
+    positions = ecliptic_positions(t, ('sun', 'moon'))
+    slon, mlon = positions['sun'][0], positions['moon'][0]
+
+    return (mlon - slon) % 360.0, mlon
 
 def get_moon_eclipses(date_from, date_to):
 
-    eph = load('de421.bsp')
-    earth = eph['earth']
-    moon = eph['moon']
-    sun = eph['sun']
+    start_time = date_to_timescale_time(date_from)
+    end_time = date_to_timescale_time(date_to)
+
+    # a binary search in the shipped catalog, the (cached) search only for other ephemerides or ranges
+    catalog_eclipses = find_catalog_eclipses(start_time, end_time)
+    if catalog_eclipses is not None:
+        t, totality_rating = catalog_eclipses
+    else:
+        t, totality_rating = series_cache.get_events(start_time, end_time, series_cache.ECLIPSE)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%d moon eclipses found in range from %s to %s: dates %s, totality rating %s", len(t),
+                     start_time.utc_strftime(), end_time.utc_strftime(), t.utc_strftime(), totality_rating)
+
+    return [(d, int(r)) for d, r in zip(t.utc_strftime(), totality_rating)]
+
+def find_moon_eclipses(start_time, end_time):
+
+    # the catalogued eclipses when the catalog applies, otherwise a search
+    catalog_eclipses = find_catalog_eclipses(start_time, end_time)
+    if catalog_eclipses is not None:
+        return catalog_eclipses
+    return search_moon_eclipses(start_time, end_time)
+
+@timed('eclipses.search')
+def search_moon_eclipses(start_time, end_time):
+
+    # times of the lunar eclipses maxima in the range and their totality rating:
+    # 1 penumbral, 2 partial, 3 total
+    sun, moon, earth = get_bodies()
 
     def f(t):
         e = earth.at(t).position.au
@@ -52,10 +85,6 @@ def get_moon_eclipses(date_from, date_to):
 
     f.step_days = 5.0
 
-    ts = load.timescale()
-    start_time = date_to_timescale_time(date_from)
-    end_time = date_to_timescale_time(date_to)
-
     t, y = find_maxima(start_time, end_time, f)
 
     e = earth.at(t).position.m
@@ -84,8 +113,6 @@ def get_moon_eclipses(date_from, date_to):
     penumbral = penumbral[mask]
     partial = partial[mask]
     total = total[mask]
-    totality_rating = [0 + penumbral + partial + total]
-    print(f"DEBUG: {len(t)} moon eclipses found in range from {start_time.utc_strftime()} to {start_time.utc_strftime()}: "
-          f"dates {t.utc_strftime()}, totality rating {totality_rating}")
+    totality_rating = 0 + penumbral + partial + total
 
-    return [(d, r) for d,r in zip(t.utc_strftime(), totality_rating)]
+    return t, totality_rating
@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import traceback
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from calendar_export import parse_step, parse_utc, iter_calendar_chunks, write_csv, write_jsonl
+import series_cache
+from eclipse_catalog import eclipse_types
+from ephemeris_registry import get_timescale
+from moon_events import EVENT_KINDS, aiter_moon_events, describe_event
+from moon_phases import get_moon_phase, find_moon_eclipses
+from moon_zodiac import get_moon_at_sign, get_gate_line, get_gate_index
+from parallel_series import init_worker
+from skyfield_helpers import date_to_timescale_time, utc_now
+from timeline import DATE_RANGE
+
+# === local HTTP/JSON service ===
+# One long-running process keeps the ephemeris, the gate index and the series cache resident, so a query costs
+# the lookup only, not the imports and the kernel load of a new process:
+#   python main.py serve --port 8765
+#   GET /phase?date=2024-04-08T18:00  /sign  /gate  (the date is UTC, default now)
+#   GET /eclipses?from=2024-01-01&to=2026-01-01
+#   GET /calendar?from=2024-01-01&to=2024-02-01&step=1h&format=jsonl|csv
+#   GET /events?from=2024-04-08T18:00&count=10&kinds=quarter,sign,gate,eclipse  (the next events, default from now)
+# Point queries are answered in a thread of the service process from the Chebyshev engine (a block not loaded yet
+# is fitted then, without holding up the event loop), or from the series cache: a query in a chunk not cached yet
+# is computed directly then, and the chunk is filled in the background for the next ones.
+# Eclipse searches and calendars run in an executor, and concurrent identical batch requests share one computation.
+# Connections are kept alive (HTTP/1.1), so a client sending many queries pays the connection setup once.
+
+SERVICE_HOST = os.environ.get('MOON_CALENDAR_HOST', '127.0.0.1')
+SERVICE_PORT = int(os.environ.get('MOON_CALENDAR_PORT', '8765'))
+SERVICE_EXECUTOR = os.environ.get('MOON_CALENDAR_SERVICE_EXECUTOR', 'process')
+SERVICE_WORKERS = 2
+MAX_CALENDAR_ROWS = 100000  # about ten weeks at minute resolution per request, the CLI export has no limit
+MAX_EVENTS = 1000
+
+CALENDAR_FORMATS = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class RequestError(ValueError):
+    pass
+
+
+def _utc_text(date):
+    return date.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_date(query, name, default, range_end=False):
+    # range_end: the end of a range, which may be the end of DATE_RANGE itself
+    try:
+        date = parse_utc(query[name]) if name in query else default
+    except ValueError:
+        raise RequestError(f"invalid {name} {query[name]!r}, expected YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]")
+    if not (DATE_RANGE[0] <= date < DATE_RANGE[1] or range_end and date == DATE_RANGE[1]):
+        raise RequestError(f"{name} should be within {DATE_RANGE[0]:%Y-%m-%d} - {DATE_RANGE[1]:%Y-%m-%d}")
+    return date
+
+
+def _parse_range(query, default_days):
+    date_from = _parse_date(query, 'from', utc_now())
+    date_to = _parse_date(query, 'to', min(date_from + datetime.timedelta(days=default_days), DATE_RANGE[1]),
+                          range_end=True)
+    if date_to <= date_from:
+        raise RequestError("'to' should be after 'from'")
+    return date_from, date_to
+
+
+def _point_time(query):
+    # the time of a point query, to the microsecond
+    date = _parse_date(query, 'date', utc_now())
+    return date, date_to_timescale_time(date)
+
+
+def eclipses_between(date_from, date_to):
+    # runs in the executor: the lunar eclipses in a range as JSON-ready dicts
+    t, ratings = find_moon_eclipses(date_to_timescale_time(date_from), date_to_timescale_time(date_to))
+    return [{'time': _utc_text(d), 'rating': int(r), 'kind': eclipse_types[int(r)]}
+            for d, r in zip(t.utc_datetime(), ratings)]
+
+
+# the point queries, run in a thread: the time as text and the Time of a query to the answer
+def phase_at(date, t):
+    phase = float(get_moon_phase(t))
+    return {'time': _utc_text(date), 'phase': phase, 'illumination': (1 - math.cos(math.radians(phase))) / 2}
+
+
+def sign_at(date, t):
+    lon, sign, degree, d, m, s = get_moon_at_sign(t)
+    return {'time': _utc_text(date), 'longitude': lon.degrees, 'sign': sign.split()[0], 'symbol': sign.split()[1],
+            'degree': degree, 'dms': f"{d}°{m}'{s}\""}
+
+
+def gate_at(date, t):
+    lon = get_moon_at_sign(t)[0]
+    gate, line = get_gate_line(lon)
+    return {'time': _utc_text(date), 'longitude': lon.degrees, 'gate': gate, 'line': line}
+
+
+def _interpolates_cache():
+    return series_cache.enabled and series_cache.engine != 'chebyshev'
+
+
+def fill_cache_chunk(chunk):
+    # runs in the executor: computes and stores a chunk of the series cache
+    series_cache.get_chunk(chunk)
+    return chunk
+
+
+def calendar_text(date_from, date_to, step, format):
+    # runs in the executor: the calendar rows of a range as CSV or JSON lines text
+    f = io.StringIO()
+    write = write_csv if format == 'csv' else write_jsonl
+    write(iter_calendar_chunks(date_from, date_to, step), f)
+    return f.getvalue()
+
+
+def create_service_executor(kind=SERVICE_EXECUTOR):
+    if kind == 'process':
+        return ProcessPoolExecutor(max_workers=SERVICE_WORKERS, initializer=init_worker)
+    elif kind == 'thread':
+        return ThreadPoolExecutor(max_workers=SERVICE_WORKERS)
+    raise ValueError(kind)
+
+
+class MoonService:
+    def __init__(self, executor=None):
+        self.executor = executor or create_service_executor()
+        self.pending = {}  # key of a running batch request -> its future, shared by identical requests
+        self.filling = set()  # cache chunks being filled in the executor
+        self.routes = {
+            '/phase': self.phase,
+            '/sign': self.sign,
+            '/gate': self.gate,
+            '/eclipses': self.eclipses,
+            '/calendar': self.calendar,
+            '/events': self.events,
+        }
+
+    def warm_up(self):
+        # the kernel, the gate index and the polynomials or cache chunk of today are loaded before the first request
+        if _interpolates_cache():
+            for chunk in series_cache.missing_chunks(get_timescale().now()):
+                series_cache.get_chunk(chunk)
+        get_moon_at_sign(get_timescale().now())
+        get_gate_index()
+
+    def fill_cache(self, t):
+        # the cache chunks of a point query not stored yet are filled in the background,
+        # when the values are interpolated from the cache and not evaluated from polynomials
+        if not _interpolates_cache():
+            return
+        for chunk in series_cache.missing_chunks(t):
+            if chunk not in self.filling:
+                self.filling.add(chunk)
+                future = asyncio.get_running_loop().run_in_executor(self.executor, fill_cache_chunk, chunk)
+                future.add_done_callback(lambda _, chunk=chunk: self.filling.discard(chunk))
+
+    # --- endpoints, each returns (content type, body text) or a JSON-ready object ---
+
+    async def run_point(self, query, function):
+        # a point query in a thread of the default executor, where the polynomials and the cache chunks it loads
+        # stay for the next queries (a worker process would keep them to itself)
+        date, t = _point_time(query)
+        self.fill_cache(t)
+        return await asyncio.get_running_loop().run_in_executor(None, function, date, t)
+
+    async def phase(self, query):
+        return await self.run_point(query, phase_at)
+
+    async def sign(self, query):
+        return await self.run_point(query, sign_at)
+
+    async def gate(self, query):
+        return await self.run_point(query, gate_at)
+
+    async def eclipses(self, query):
+        date_from, date_to = _parse_range(query, 365)
+        return await self.run_batch(('eclipses', date_from, date_to), eclipses_between, date_from, date_to)
+
+    async def calendar(self, query):
+        date_from, date_to = _parse_range(query, 30)
+        try:
+            step = parse_step(query.get('step', '1h'))
+        except ValueError as e:
+            raise RequestError(str(e))
+        format = query.get('format', 'jsonl')
+        if format not in CALENDAR_FORMATS:
+            raise RequestError(f"invalid format {format!r}, expected one of {', '.join(CALENDAR_FORMATS)}")
+        if (date_to - date_from) / step > MAX_CALENDAR_ROWS:
+            raise RequestError(f"more than {MAX_CALENDAR_ROWS} rows, use a longer step or 'python main.py calendar'")
+        text = await self.run_batch(('calendar', date_from, date_to, step, format),
+                                    calendar_text, date_from, date_to, step, format)
+        return CALENDAR_FORMATS[format], text
+
+    async def events(self, query):
+        # searched a window at a time in a thread (the generator of windows does not go to a process) until enough
+        date_from = _parse_date(query, 'from', utc_now())
+        start_time = date_to_timescale_time(date_from)
+        try:
+            count = int(query.get('count', '10'))
+        except ValueError:
+            count = 0
+        if not 1 <= count <= MAX_EVENTS:
+            raise RequestError(f"count should be a number within 1 - {MAX_EVENTS}")
+        kinds = query.get('kinds', ','.join(EVENT_KINDS)).split(',')
+        if not set(kinds) <= set(EVENT_KINDS):
+            raise RequestError(f"invalid kinds {query['kinds']!r}, expected some of {','.join(EVENT_KINDS)}")
+        events = []
+        async with contextlib.aclosing(aiter_moon_events(start_time, DATE_RANGE[1], kinds)) as upcoming:
+            async for t, kind, value in upcoming:
+                events.append({'time': _utc_text(t.utc_datetime()), 'kind': kind, 'value': value,
+                               'text': describe_event(kind, value)})
+                if len(events) == count:
+                    break
+        return events
+
+    async def run_batch(self, key, function, *args):
+        # the result of function(*args) in the executor; a request identical to a running one waits for that one
+        future = self.pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+            self.pending[key] = future
+            future.add_done_callback(lambda _: self.pending.pop(key, None))
+        return await asyncio.shield(future)  # a client leaving does not cancel the computation of the others
+
+    # --- HTTP ---
+
+    async def respond(self, method, target):
+        url = urllib.parse.urlsplit(target)
+        endpoint = self.routes.get(url.path)
+        if endpoint is None:
+            return 404, {'error': f"unknown path {url.path}, expected one of {', '.join(self.routes)}"}
+        if method not in ('GET', 'HEAD'):
+            return 405, {'error': "only GET is supported"}
+        try:
+            return 200, await endpoint(dict(urllib.parse.parse_qsl(url.query)))
+        except RequestError as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            traceback.print_exc()
+            return 500, {'error': f"{type(e).__name__}: {e}"}
+
+    async def handle_connection(self, reader, writer):
+        # requests of a connection are answered in order until the client closes it or asks to
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if 'content-length' in headers:
+                    await reader.readexactly(int(headers['content-length']))  # a body is not used
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    method, target, version = None, '/', 'HTTP/1.0'
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+
+                if method is None:
+                    status, result = 400, {'error': "malformed request line"}
+                    keep_alive = False
+                else:
+                    status, result = await self.respond(method, target)
+                if isinstance(result, tuple):
+                    content_type, body = result
+                else:
+                    content_type, body = 'application/json', json.dumps(result, ensure_ascii=False)
+                body = body.encode('utf-8')
+                head = (f"HTTP/1.1 {status} {reasons[status]}\r\n"
+                        f"Content-Type: {content_type}\r\n"
+                        f"Content-Length: {len(body)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+                writer.write(head.encode('latin-1') + (body if method != 'HEAD' else b''))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Moon calendar service on http://{host}:{port}/ ({', '.join(self.routes)})")
+        async with server:
+            await server.serve_forever()
+
+
+def add_service_arguments(parser):
+    parser.add_argument('--host', default=SERVICE_HOST, help=f"address to listen on (default {SERVICE_HOST})")
+    parser.add_argument('--port', type=int, default=SERVICE_PORT, help=f"port to listen on (default {SERVICE_PORT})")
+
+
+def run_service(args):
+    service = MoonService()
+    service.warm_up()
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.executor.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Moon calendar HTTP/JSON service")
+    add_service_arguments(parser)
+    run_service(parser.parse_args())
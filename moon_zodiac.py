@@ -2,22 +2,24 @@
 # https://forums.gentoo.org/viewtopic-p-8799546.html#8799546
 # https://www.dropbox.com/scl/fi/qw1x2tsnzypaxsgrdw91w/hexagram_data.txt?rlkey=aw1nou400j8f45t52gse7mmty&dl=0
 
-from skyfield_helpers import date_to_timescale_time, get_file_path
+import bisect
+import contextlib
+import os
+import re
 
-from skyfield.api import load
-from skyfield.framelib import ecliptic_frame
+import numpy as np
 
-planets = load('de421.bsp') # load a planetary ephemeris
-moon = planets['moon'] # get the Moon object
-earth = planets['earth'] # get the Earth object
-ts = load.timescale() # load a timescale object
-t = ts.now() # get the current time
+from skyfield.units import Angle
+
+import series_cache
+from body_positions import ecliptic_positions
+from instrumentation import timed
+from skyfield_helpers import date_to_timescale_time, dates_to_timescale_time, get_file_path
 
 # define a function that returns the ecliptic longitude of the Moon
 def moon_longitude(t):
-    e = earth.at(t) # get the position of the Earth at time t
-    _, lon, _ = e.observe(moon).apparent().frame_latlon(ecliptic_frame) # get the ecliptic latitude and longitude of the Moon
-    return lon # return the longitude
+    lon, _ = ecliptic_positions(t, ('moon',))['moon'] # the apparent ecliptic longitude and latitude of the Moon
+    return Angle(degrees=lon) # return the longitude
 
 # define a list of zodiac signs and their symbols
 signs = ['Aries ♈', 'Taurus ♉', 'Gemini ♊', 'Cancer ♋', 'Leo ♌', 'Virgo ♍', 'Libra ♎', 'Scorpio ♏', 'Sagittarius ♐', 'Capricorn ♑', 'Aquarius ♒', 'Pisces ♓']
@@ -29,83 +31,192 @@ def zodiac_sign(lon):
     degree = lon.degrees % 30 # get the degree within the sign by taking the remainder of dividing the longitude by 30 degrees
     return sign, degree # return the sign and degree
 
-# define a function that reads a text file containing gate and line information and returns a dictionary with this information
-def read_gates(filename):
-    gates = {}
-    with open(filename, 'r') as f:
-        current_gate = None
-        for line in f:
-            if line.startswith('gate'):
-                if current_gate is not None:
-                    gates[current_gate] = gate_data
-                gate_name, sign_name = line.strip().split(' = ')
-                #print(f"Gate Name: {gate_name}, Sign Name: {sign_name}")
-                current_gate = gate_name
-                gate_data = {'sign': sign_name, 'lines': []}
-            elif line.startswith('line'):
-                line_name, coords = line.strip().split(' = ')
-               # print(f"Line Name: {line_name}, Coords: {coords}")
-                line_number = int(line_name.split('_')[1])
-                coords = coords.replace('°', ' ').replace('Â', ' ').replace("'", ' ').replace('"', '').split(' - ')
-                start_coords = coords[0]
-                end_coords = coords[1]
-                if '/' in start_coords:
-                    start_signs = start_coords.split('/')
-                    start_dms = [tuple(map(int, sign.split())) for sign in start_signs]
-                else:
-                    start_dms = tuple(map(int, start_coords.split()))
-                if '/' in end_coords:
-                    end_signs = end_coords.split('/')
-                    end_dms = [tuple(map(int, sign.split())) for sign in end_signs]
-                else:
-                    end_dms = tuple(map(int, end_coords.split()))
-                gate_data['lines'].append((line_number, start_dms, end_dms))
-        if current_gate is not None:
-            gates[current_gate] = gate_data
-    return gates
-
-# define a function that converts degrees, minutes, and seconds to decimal degrees
-def dms_to_degrees(dms):
-    d, m, s = dms
-    return d + m / 60 + s / 3600
-
-# read the gates from a text file (replace '/home/ethan/Documents/hexagram_data.txt' with the path to your text file)
-gates = read_gates(get_file_path('./hexagram_data.txt'))
-
-
-# get the ecliptic longitude of the Moon at the current time
-lon = moon_longitude(t)
-# get the zodiac sign and degree of the Moon at the current time
-sign, degree = zodiac_sign(lon)
-# convert the degree to degrees, minutes, and seconds
-d, m, s = int(degree), int(degree * 60) % 60, int(degree * 3600) % 60
-
-
-# find which gate and line corresponds to the current position of the Moon
-current_gate = None
-current_line = None
-for gate_number, gate in gates.items():
-    if gate['sign'] == sign.split(' ')[0]:
-        print(f"Checking Gate {gate_number} ({gate['sign']})")
-        for line_number, start_dms, end_dms in gate['lines']:
-            start_degrees = dms_to_degrees(start_dms)
-            end_degrees = dms_to_degrees(end_dms)
-            if start_degrees <= degree < end_degrees:
-                print(f"  Checking Line {line_number}: {start_degrees} - {end_degrees}")
-                current_gate = gate_number
-                current_line = line_number
-                break
-
-# print the result in a formatted way
-if current_gate is not None and current_line is not None:
-    print(f'The Moon is currently at {sign}, {d}°{m}\'{s}\", Gate {current_gate}, Line {current_line}')
-else:
-    print(f'The Moon is currently at {sign}, {d}°{m}\'{s}\"')
+# === hexagram gate table ===
+# hexagram_data.txt lists the 64 gates in the order of the wheel, each with its sign (two for a gate across a sign
+# boundary) and its six lines as in-sign degrees:
+#   gate_56 = Cancer/Leo
+#   line_1 = 26° 22' 30" - 27° 18' 45"
+# It is read strictly: every non-blank line must be in one of these two forms, and the lines must tile the wheel,
+# 384 lines of 0° 56' 15" with no gap and no overlap; an error names the offending line of the file. The table
+# parsed is compiled to a .npy file under the cache root, named after the content of the text, and loaded from
+# there, so a process start reads a few kilobytes of binary instead of parsing the text.
 
+GATE_TABLE_FORMAT_VERSION = 1
+GATE_COUNT = 64
+LINES_PER_GATE = 6
+LINE_ARCSEC = 360 * 3600 // (GATE_COUNT * LINES_PER_GATE)  # 0° 56' 15"
+SIGN_ARCSEC = 30 * 3600
+WHEEL_ARCSEC = 12 * SIGN_ARCSEC
 
-def get_moon_at_sign(date):
-    t = date_to_timescale_time(date)
+# one row per gate line, sorted by the absolute ecliptic longitude (deg., 0 - 360) of its start
+gate_table_dtype = np.dtype([('start', 'f8'), ('gate', 'i8'), ('line', 'i8')])
+
+_gate_header_format = re.compile(r'gate_(\d+) = (\w+)(?:/(\w+))?')
+_gate_line_format = re.compile(r'''line_(\d) = (\d\d)° (\d\d)' (\d\d)" - (\d\d)° (\d\d)' (\d\d)"''')
+
+# index of each sign by its name, as spelled in the signs list and in hexagram_data.txt
+sign_indices = {sign.split(' ')[0]: i for i, sign in enumerate(signs)}
+sign_indices['Sagitarius'] = sign_indices['Sagittarius']
+
+
+class GateDataError(ValueError):
+    def __init__(self, filename, line_number, message):
+        super().__init__(f"{filename}:{line_number}: {message}")
+
+
+def _dms_text(arcsec):
+    return f"{arcsec // 3600:02d}° {arcsec // 60 % 60:02d}' {arcsec % 60:02d}\""
+
+
+def _in_sign_arcsec(filename, number, d, m, s):
+    if d >= 30 or m >= 60 or s >= 60:
+        raise GateDataError(filename, number, f"invalid in-sign degrees {d:02d}° {m:02d}' {s:02d}\"")
+    return (d * 60 + m) * 60 + s
+
+
+# reads the gate lines of a text file, checking each line as it is read and the whole wheel at the end;
+# returns the gate table, an array of gate_table_dtype
+@timed('gates.parse')
+def parse_gates(filename):
+    rows = []  # (start arcsec, gate number, line number, line of the file), for all the lines read
+    header_lines = {}  # gate number -> line of the file of its header
+    gate = None  # the gate being read, with the signs of its header, the sign of its last line and its rows
+    number = 0
+    with open(filename, 'r', encoding='utf-8') as f:
+        for number, text in enumerate(f, 1):
+            text = text.strip()
+            if not text:
+                continue
+            header = _gate_header_format.fullmatch(text)
+            if header:
+                if gate is not None:
+                    rows += _checked_gate(filename, gate, header_lines[gate], gate_rows)
+                gate = int(header[1])
+                if not 1 <= gate <= GATE_COUNT:
+                    raise GateDataError(filename, number, f"gate number {gate} not in 1 - {GATE_COUNT}")
+                if gate in header_lines:
+                    raise GateDataError(filename, number, f"gate_{gate} already defined at line {header_lines[gate]}")
+                header_lines[gate] = number
+                header_signs = []
+                for name in filter(None, header.group(2, 3)):
+                    if name not in sign_indices:
+                        raise GateDataError(filename, number, f"unknown sign {name!r}")
+                    header_signs.append(sign_indices[name])
+                if len(header_signs) == 2 and header_signs[1] != (header_signs[0] + 1) % 12:
+                    raise GateDataError(filename, number, f"{header[2]} and {header[3]} are not adjacent signs")
+                sign = header_signs[0]
+                gate_rows = []
+                continue
+
+            line = _gate_line_format.fullmatch(text)
+            if line is None:
+                raise GateDataError(filename, number, f"expected 'gate_N = Sign' (or 'Sign/Sign') or "
+                                                      f"'line_N = DD° MM\' SS\" - DD° MM\' SS\"', got {text!r}")
+            if gate is None:
+                raise GateDataError(filename, number, "a line before the first gate")
+            line_number = int(line[1])
+            if line_number != len(gate_rows) + 1:
+                raise GateDataError(filename, number, f"line_{line_number} of gate_{gate}, "
+                                                      f"expected line_{len(gate_rows) + 1}")
+            start = _in_sign_arcsec(filename, number, *map(int, line.group(2, 3, 4)))
+            end = _in_sign_arcsec(filename, number, *map(int, line.group(5, 6, 7)))
+            # the lines go in the ascending order, a start below the previous one is in the next sign
+            if gate_rows and start < gate_rows[-1][0] % SIGN_ARCSEC:
+                sign = (sign + 1) % 12
+            if sign not in header_signs:
+                raise GateDataError(filename, number, f"line_{line_number} starts in {signs[sign].split()[0]}, "
+                                                      f"not in a sign of gate_{gate}")
+            if (end - start) % SIGN_ARCSEC != LINE_ARCSEC:
+                raise GateDataError(filename, number, f"line_{line_number} spans "
+                                                      f"{_dms_text((end - start) % SIGN_ARCSEC)}, "
+                                                      f"a line spans {_dms_text(LINE_ARCSEC)}")
+            gate_rows.append((sign * SIGN_ARCSEC + start, gate, line_number, number))
+    if gate is not None:
+        rows += _checked_gate(filename, gate, header_lines[gate], gate_rows)
+
+    missing = sorted(set(range(1, GATE_COUNT + 1)) - set(header_lines))
+    if missing:
+        raise GateDataError(filename, number, f"missing gates {', '.join(map(str, missing))}")
+    # all the lines being of the same length, they tile the wheel when each one starts where the previous one ends
+    rows.sort()
+    for previous, (start, gate, line_number, line_of_file) in zip(rows[-1:] + rows[:-1], rows):
+        gap = (start - previous[0] - LINE_ARCSEC) % WHEEL_ARCSEC
+        if gap:
+            what = (f"a gap of {_dms_text(gap)}" if gap < WHEEL_ARCSEC - LINE_ARCSEC
+                    else f"an overlap of {_dms_text(WHEEL_ARCSEC - gap)}")
+            raise GateDataError(filename, line_of_file, f"{what} after line_{previous[2]} of gate_{previous[1]} "
+                                                        f"(line {previous[3]})")
+
+    table = np.empty(len(rows), dtype=gate_table_dtype)
+    table['start'] = [row[0] / 3600 for row in rows]
+    table['gate'] = [row[1] for row in rows]
+    table['line'] = [row[2] for row in rows]
+    return table
+
+
+def _checked_gate(filename, gate, header_line, gate_rows):
+    # the rows of a gate read, which has all its lines
+    if len(gate_rows) != LINES_PER_GATE:
+        raise GateDataError(filename, header_line, f"gate_{gate} has {len(gate_rows)} lines, "
+                                                   f"expected {LINES_PER_GATE}")
+    return gate_rows
+
+
+def compiled_gate_table_path(filename):
+    # named after the content of the text, so a changed text is compiled again and the same text extracted again
+    # (with a new time) is not
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(series_cache.cache_root,
+                        f"{name}-{GATE_TABLE_FORMAT_VERSION}-{series_cache.file_digest(filename)}.npy")
+
+
+# the gate table of a text file: the one compiled from the same text, otherwise the text is parsed and compiled
+# (a cache root not writable, or the cache disabled, only costs the parsing at every start)
+@timed('gates.load')
+def load_gate_table(filename):
+    path = compiled_gate_table_path(filename) if series_cache.enabled else None
+
+    def compile_table():
+        if path is not None:  # the tables compiled from other texts or versions are not read again
+            series_cache.remove_stale(path, f"{os.path.splitext(os.path.basename(filename))[0]}-")
+            with contextlib.suppress(OSError):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        return parse_gates(filename)
+
+    return series_cache.load_or_compute(path, compile_table)
 
+
+# the gate table as contiguous arrays for the lookups: the start longitudes (deg.) in ascending order and the gate
+# and line numbers of the line starting at each; read on first use only, so that importing this module stays free
+# of I/O
+_gate_index = None
+
+def get_gate_index():
+    global _gate_index
+    if _gate_index is None:
+        table = load_gate_table(get_file_path('./hexagram_data.txt'))
+        _gate_index = tuple(np.ascontiguousarray(table[field]) for field in ('start', 'gate', 'line'))
+    return _gate_index
+
+# define a function that returns the gate and line numbers of a given ecliptic longitude (an Angle or degrees)
+def get_gate_line(lon):
+    degrees = lon.degrees if hasattr(lon, 'degrees') else lon
+    starts, gate_numbers, line_numbers = get_gate_index()
+    # the interval before the first start wraps around 0 deg. and belongs to the last line of the wheel
+    i = bisect.bisect_right(starts, degrees % 360) - 1
+    return int(gate_numbers[i]), int(line_numbers[i])
+
+# the same for an array of longitudes, returns arrays of gate and line numbers
+def get_gate_lines(lons):
+    degrees = np.asarray(lons.degrees if hasattr(lons, 'degrees') else lons, dtype=float)
+    starts, gate_numbers, line_numbers = get_gate_index()
+    i = np.searchsorted(starts, degrees % 360, side='right') - 1
+    return gate_numbers[i], line_numbers[i]
+
+
+# define a function that returns a printable report on the position of the Moon at the given (default current) time
+def current_position_report(date=None):
+    t = date_to_timescale_time(date)
     # get the ecliptic longitude of the Moon at the current time
     lon = moon_longitude(t)
     # get the zodiac sign and degree of the Moon at the current time
@@ -113,5 +224,42 @@ def get_moon_at_sign(date):
     # convert the degree to degrees, minutes, and seconds
     d, m, s = int(degree), int(degree * 60) % 60, int(degree * 3600) % 60
 
+    # find which gate and line corresponds to the current position of the Moon
+    current_gate, current_line = get_gate_line(lon)
+
+    # return the result in a formatted way
+    return f'The Moon is currently at {sign}, {d}°{m}\'{s}\", Gate {current_gate}, Line {current_line}'
+
+
+def get_moon_at_sign(date):
+    t = date_to_timescale_time(date)
+
+    # get the ecliptic longitude of the Moon at the current time (from the series cache)
+    lon = Angle(degrees=series_cache.moon_longitude_at(t))
+    # get the zodiac sign and degree of the Moon at the current time
+    sign, degree = zodiac_sign(lon)
+    # convert the degree to degrees, minutes, and seconds
+    d, m, s = int(degree), int(degree * 60) % 60, int(degree * 3600) % 60
+
     return lon, sign, degree, d, m, s
 
+
+# the same as get_moon_at_sign(), but for a whole list of dates (or an array Time) with a single observation;
+# returns arrays of the ecliptic longitudes, sign indices (in the signs list), degrees within the signs and their DMS
+def get_moon_signs(dates):
+    t = dates_to_timescale_time(dates)
+
+    lon_degrees = np.asarray(series_cache.moon_longitude_at(t), dtype=float)
+    sign_index = (lon_degrees // 30).astype(int) % 12
+    degree = lon_degrees % 30
+    d, m, s = degree.astype(int), (degree * 60).astype(int) % 60, (degree * 3600).astype(int) % 60
+
+    return lon_degrees, sign_index, degree, d, m, s
+
+# define a function that returns the indices where the sign differs from the one at the previous index
+def get_sign_change_indices(sign_index):
+    return np.flatnonzero(np.diff(sign_index)) + 1
+
+
+if __name__ == "__main__":
+    print(current_position_report())
@@ -0,0 +1,87 @@
+import datetime
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ephemeris_registry import get_ephemeris, get_timescale
+from instrumentation import timed
+from skyfield_helpers import utc_grid_time
+
+# === parallel computation of long series ===
+# The Moon phase and ecliptic longitude on a UTC grid, computed directly from the ephemeris (not from the series
+# cache) by worker processes. The grid is split into chunks; each worker opens the ephemeris once, in the pool
+# initializer, and writes its chunks straight into a memory-mapped .npy output at their positions, so only the chunk
+# bounds travel between the processes and the output is in order when all chunks are done.
+
+PARALLEL_WORKERS = os.cpu_count() or 1
+PARALLEL_CHUNK_POINTS = 20000  # about two seconds of work, small enough to keep all the workers busy to the end
+
+moon_series_dtype = np.dtype([('phase', 'f8'), ('lon', 'f8')])
+
+
+def init_worker():
+    # the pool initializer: the ephemeris and the timescale are opened once per worker process
+    get_ephemeris()
+    get_timescale()
+
+
+def utc_grid(date_from, date_to, step):
+    # the UTC grid from date_from (included) to date_to (excluded) at a step:
+    # (the midnight of the first day, the first point and the step in seconds from it, the point count)
+    day = datetime.datetime(date_from.year, date_from.month, date_from.day)
+    step_seconds = int(step.total_seconds())
+    count = -(-int((date_to - date_from).total_seconds()) // step_seconds)
+    return day, int((date_from - day).total_seconds()), step_seconds, count
+
+
+def grid_offsets(grid, first, last):
+    # the offsets (seconds) from the grid day of the points first, ..., last - 1
+    _, start_seconds, step_seconds, _ = grid
+    return start_seconds + np.arange(first, last, dtype=np.int64) * step_seconds
+
+
+@timed('parallel.compute_chunk')
+def compute_chunk(path, grid, first, last):
+    # runs in a worker: the grid points first, ..., last - 1 into the output file
+    from moon_phases import moon_phase_and_longitude_at
+
+    phase, lon = moon_phase_and_longitude_at(utc_grid_time(grid[0], grid_offsets(grid, first, last)))
+    series = np.load(path, mmap_mode='r+')
+    series['phase'][first:last] = phase
+    series['lon'][first:last] = lon
+    series.flush()
+    return first, last
+
+
+@timed('parallel.compute_moon_series')
+def compute_moon_series(date_from, date_to, step, path=None, workers=PARALLEL_WORKERS,
+                        chunk_points=PARALLEL_CHUNK_POINTS):
+    # phase and longitude (deg.) of the Moon at the UTC grid from date_from to date_to at a step (a timedelta
+    # of whole seconds) as a structured array; with a path, the array is a memory map of that .npy file
+    # (for series larger than the memory), otherwise it is loaded and the temporary file removed
+    grid = utc_grid(date_from, date_to, step)
+    count = grid[3]
+    keep_file = path is not None
+    if not keep_file:
+        fd, path = tempfile.mkstemp(suffix='.npy')
+        os.close(fd)
+    try:
+        np.lib.format.open_memmap(path, mode='w+', dtype=moon_series_dtype, shape=(count,)).flush()
+        bounds = [(first, min(first + chunk_points, count)) for first in range(0, count, chunk_points)]
+        if workers <= 1 or len(bounds) <= 1:
+            for first, last in bounds:
+                compute_chunk(path, grid, first, last)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+                futures = [executor.submit(compute_chunk, path, grid, first, last)
+                           for first, last in bounds]
+                for future in futures:
+                    future.result()  # raises the exception of a failed chunk
+        if keep_file:
+            return np.load(path, mmap_mode='r')
+        return np.load(path)
+    finally:
+        if not keep_file:
+            os.remove(path)
@@ -0,0 +1,53 @@
+import numpy as np
+
+# === plotting helpers ===
+
+
+def lttb_downsample(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps `threshold` points of the (x, y) line that preserve its visual shape,
+    # peaks included, so long series are plotted with about as many points as there are pixels
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if threshold >= len(x) or threshold < 3:
+        return np.arange(len(x))
+
+    # the first and last points are always kept, the rest is split into threshold - 2 buckets
+    bucket_edges = np.linspace(1, len(x) - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, len(x) - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = bucket_edges[i], bucket_edges[i + 1]
+        # the average point of the next bucket (the last point for the last bucket) is the third triangle vertex
+        next_start, next_end = end, bucket_edges[i + 2] if i + 2 < len(bucket_edges) else len(x)
+        next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+
+def ellipse_polygon(center, width, height, vertex_count=64):
+    # counterclockwise vertices of an ellipse
+    angles = np.linspace(0, 2 * np.pi, vertex_count, endpoint=False)
+    return np.column_stack([center[0] + width / 2 * np.cos(angles), center[1] + height / 2 * np.sin(angles)])
+
+
+def clip_convex_polygon(subject, clip):
+    # Sutherland-Hodgman: the part of the polygon `subject` inside the convex polygon `clip`,
+    # both given as (n, 2) arrays of counterclockwise vertices; an empty array when they do not intersect
+    output = np.asarray(subject, dtype=float)
+    clip = np.asarray(clip, dtype=float)
+    for start, end in zip(clip, np.roll(clip, -1, axis=0)):
+        if not len(output):
+            break
+        # the inner side of a counterclockwise edge is on its left
+        sides = (end[0] - start[0]) * (output[:, 1] - start[1]) - (end[1] - start[1]) * (output[:, 0] - start[0])
+        next_sides = np.roll(sides, -1)
+        inside = sides >= 0
+        crossing = inside != (next_sides >= 0)
+        # every vertex is followed by the crossing of its edge with the clip edge, if any, all of an edge at once
+        fraction = sides / np.where(crossing, sides - next_sides, 1.0)
+        crossings = output + (np.roll(output, -1, axis=0) - output) * fraction[:, np.newaxis]
+        output = np.stack([output, crossings], axis=1)[np.stack([inside, crossing], axis=1)]
+    return output
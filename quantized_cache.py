@@ -0,0 +1,46 @@
+import collections
+import datetime
+import threading
+
+# === memoization of single-point queries ===
+# Dates are rounded down to a resolution (one minute by default) and the function is evaluated at the rounded date,
+# so close queries, e.g. from a cursor dragged over a plot, share a result. The least recently used results are
+# dropped above maxsize.
+
+
+class QuantizedLRUCache:
+    def __init__(self, function, resolution=datetime.timedelta(minutes=1), maxsize=4096):
+        self.function = function
+        self.resolution = resolution
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def quantize(self, date):
+        epoch = datetime.datetime(1970, 1, 1, tzinfo=date.tzinfo)
+        return epoch + (date - epoch) // self.resolution * self.resolution
+
+    def __call__(self, date):
+        key = self.quantize(date)
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]
+            self.misses += 1
+        result = self.function(key)
+        with self._lock:
+            self._results[key] = result
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._results), 'maxsize': self.maxsize}
@@ -0,0 +1,300 @@
+import contextlib
+import functools
+import hashlib
+import os
+import shutil
+import threading
+
+import numpy as np
+
+import ephemeris_registry
+from ephemeris_registry import get_timescale
+from instrumentation import timed, count
+
+# === persistent cache of computed ephemeris series ===
+# The range covered by DE421 is split into fixed chunks of CHUNK_DAYS. For each chunk requested once, the Moon phase
+# and ecliptic longitude are computed on an hourly grid (the series), or the tables of the quarter phase, sign ingress
+# and eclipse events are searched (the events), and written as .npy files under the cache dir. The two parts are
+# computed and stored apart: with the Chebyshev engine only the events are read from this cache. Later reads (also by
+# other processes) memory-map those files and interpolate, so a warm query needs no ephemeris math at all.
+# The cache lives in a subdirectory keyed by the ephemeris file and the code computing the values,
+# so a change of either starts a new cache instead of reading stale data.
+
+CACHE_FORMAT_VERSION = 1
+CHUNK_DAYS = 30
+SAMPLE_STEP_DAYS = 1.0 / 24  # linear interpolation of hourly samples is accurate to well under an arcsecond
+DENSE_QUERY_MIN_POINTS = int(CHUNK_DAYS / SAMPLE_STEP_DAYS) // 2  # points of a query in a chunk worth caching it
+ECLIPSE_SEARCH_MARGIN_DAYS = 1.0  # eclipse maxima close to chunk edges are searched for in both neighbours
+
+# the parts of a chunk, also the names of their files
+SERIES, EVENTS = 'series', 'events'
+# event kinds in the events table
+QUARTER, SIGN, ECLIPSE = 0, 1, 2
+
+series_dtype = np.dtype([('tt', 'f8'), ('phase', 'f8'), ('lon', 'f8')])  # phase and longitude are unwrapped
+events_dtype = np.dtype([('tt', 'f8'), ('kind', 'i1'), ('value', 'i1')])
+
+enabled = os.environ.get('MOON_CALENDAR_CACHE', '1') != '0'
+# the phase and longitude come from the polynomial tables of chebyshev_engine unless 'cache' (interpolated hourly
+# samples of this cache); the events are read from this cache either way
+engine = os.environ.get('MOON_CALENDAR_ENGINE', 'chebyshev')
+cache_root = os.environ.get('MOON_CALENDAR_CACHE_DIR',
+                            os.path.join(os.path.expanduser('~'), '.cache', 'moon-calendar'))
+
+_lock = threading.Lock()
+_cache_dir = None
+_chunks = {}  # (chunk index, SERIES or EVENTS) -> memory-mapped array
+_chunk_locks = {}  # (chunk index, part) -> lock held while it is loaded or computed, other chunks are not held up
+
+
+def get_cache_dir():
+    global _cache_dir
+    if _cache_dir is None:
+        _cache_dir = make_cache_dir(os.path.join(cache_root, f"series-{_cache_key()}"), 'series-')
+    return _cache_dir
+
+
+def _cache_key():
+    import body_positions, eclipse_catalog, moon_events, moon_phases, moon_zodiac  # these import this module
+
+    return cache_key(f"format {CACHE_FORMAT_VERSION}",
+                     (body_positions.__file__, eclipse_catalog.__file__, ephemeris_registry.__file__,
+                      moon_events.__file__, moon_phases.__file__, moon_zodiac.__file__, __file__))
+
+
+@functools.lru_cache(maxsize=None)
+def file_digest(path):
+    # a digest of the content of a data file, once per process: a one-file build extracts its data files again at
+    # every start, with new times but the same bytes
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha1').hexdigest()[:16]
+
+
+def cache_key(version, source_paths):
+    # a key of a cache subdirectory: the format version, the ephemeris file and the code computing the values
+    from skyfield_helpers import get_file_path
+
+    key = hashlib.sha1(version.encode())
+    ephemeris_file = ephemeris_registry.EPHEMERIS_FILE
+    ephemeris_path = get_file_path(ephemeris_file)
+    if os.path.exists(ephemeris_path):
+        key.update(f"{ephemeris_file} {os.path.getsize(ephemeris_path)} {file_digest(ephemeris_path)}".encode())
+    # the source code is not shipped with a frozen build, the format version is the only code version there
+    for source_path in source_paths:
+        if source_path and source_path.endswith('.py') and os.path.exists(source_path):
+            with open(source_path, 'rb') as f:
+                key.update(f.read())
+    return key.hexdigest()[:16]
+
+
+def remove_stale(path, prefix):
+    # removes the files and dirs next to path named with the same prefix but another key (other code, another
+    # ephemeris), which are never read again
+    directory = os.path.dirname(path)
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        stale_path = os.path.join(directory, name)
+        if not name.startswith(prefix) or stale_path == path:
+            continue
+        if os.path.isdir(stale_path):
+            shutil.rmtree(stale_path, ignore_errors=True)
+        else:
+            with contextlib.suppress(OSError):
+                os.remove(stale_path)
+
+
+def make_cache_dir(path, prefix):
+    # the cache subdirectory of the current key, the ones of other keys removed; an unwritable cache root is left
+    # as it is, the arrays are then computed in memory (see load_or_compute())
+    remove_stale(path, prefix)
+    with contextlib.suppress(OSError):
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def clear_memory():
+    # forget the opened chunks and the cache dir, the files stay on disk
+    global _cache_dir
+    with _lock:
+        _chunks.clear()
+        _cache_dir = None
+
+
+@timed('series_cache.compute_series')
+def _compute_series(chunk):
+    from moon_phases import moon_phase_at
+    from moon_zodiac import moon_longitude
+
+    start_tt, end_tt = chunk * CHUNK_DAYS, (chunk + 1) * CHUNK_DAYS
+    t = get_timescale().tt_jd(np.arange(start_tt, end_tt + SAMPLE_STEP_DAYS / 2, SAMPLE_STEP_DAYS))
+
+    series = np.empty(len(t), dtype=series_dtype)
+    series['tt'] = t.tt
+    series['phase'] = np.unwrap(moon_phase_at(t), period=360)
+    series['lon'] = np.unwrap(moon_longitude(t).degrees, period=360)
+    return series
+
+
+@timed('series_cache.compute_events')
+def _compute_events(chunk):
+    from moon_events import search_quarter_phases, search_sign_ingresses
+    from moon_phases import find_moon_eclipses
+
+    ts = get_timescale()
+    start_tt, end_tt = chunk * CHUNK_DAYS, (chunk + 1) * CHUNK_DAYS
+    start_time, end_time = ts.tt_jd(start_tt), ts.tt_jd(end_tt)
+    quarter_times, quarters = search_quarter_phases(start_time, end_time)
+    ingress_times, sign_indices = search_sign_ingresses(start_time, end_time)
+    eclipse_times, ratings = find_moon_eclipses(ts.tt_jd(start_tt - ECLIPSE_SEARCH_MARGIN_DAYS),
+                                                ts.tt_jd(end_tt + ECLIPSE_SEARCH_MARGIN_DAYS))
+    in_chunk = (eclipse_times.tt >= start_tt) & (eclipse_times.tt < end_tt)
+
+    events = np.empty(len(quarters) + len(sign_indices) + np.count_nonzero(in_chunk), dtype=events_dtype)
+    events['tt'] = np.concatenate([quarter_times.tt, ingress_times.tt, eclipse_times.tt[in_chunk]])
+    events['kind'] = np.repeat([QUARTER, SIGN, ECLIPSE], [len(quarters), len(sign_indices), np.count_nonzero(in_chunk)])
+    events['value'] = np.concatenate([quarters, sign_indices, ratings[in_chunk]])
+    events.sort(order='tt')
+    return events
+
+
+_compute_parts = {SERIES: _compute_series, EVENTS: _compute_events}
+
+
+def save_array(path, array):
+    # write to a temporary file first, so a concurrent reader never maps a partial file
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(temporary_path, path)
+    except OSError:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)  # e.g. a full disk, no partial file left behind
+        raise
+
+
+def load_or_compute(path, compute, mmap_mode=None):
+    # the array stored at path, or compute() stored there; with no path (the cache disabled), or where it cannot be
+    # written (an unwritable cache root, a full disk), the computed array is kept in memory only by the caller
+    if path is not None:
+        try:
+            return np.load(path, mmap_mode=mmap_mode)
+        except (OSError, ValueError):
+            pass  # not stored yet, or a damaged file computed again
+    array = compute()
+    if path is not None:
+        try:
+            save_array(path, array)
+        except OSError:
+            pass
+    return array
+
+
+def _chunk_lock(key):
+    with _lock:
+        return _chunk_locks.setdefault(key, threading.Lock())
+
+
+def _chunk_path(chunk, part):
+    return os.path.join(get_cache_dir(), f"{chunk}.{part}.npy")
+
+
+def get_chunk_part(chunk, part):
+    # the series or the events of a chunk, mapped from the cache or computed and stored
+    key = int(chunk), part
+    if key in _chunks:
+        return _chunks[key]
+    with _chunk_lock(key):
+        if key not in _chunks:
+            _chunks[key] = load_or_compute(_chunk_path(*key), lambda: _compute_parts[part](key[0]), mmap_mode='r')
+            count(f"series_cache.{part}_mapped")
+    return _chunks[key]
+
+
+def get_chunk(chunk):
+    # the series and the events of a chunk
+    return get_chunk_part(chunk, SERIES), get_chunk_part(chunk, EVENTS)
+
+
+def _chunk_is_stored(chunk, part=SERIES):
+    return (chunk, part) in _chunks or os.path.exists(_chunk_path(chunk, part))
+
+
+def missing_chunks(t, part=SERIES):
+    # indices of the chunks of the times of a Time (scalar or array) of which the part is not stored yet,
+    # where a sparse query is computed directly instead of interpolated
+    chunks = np.unique(np.floor(np.atleast_1d(np.asarray(t.tt, dtype=float)) / CHUNK_DAYS).astype(int))
+    return [int(chunk) for chunk in chunks if not _chunk_is_stored(chunk, part)]
+
+
+def _interpolate(t, field, compute):
+    tt = np.atleast_1d(np.asarray(t.tt, dtype=float))
+    values = np.empty(len(tt))
+    chunk_indices = np.floor(tt / CHUNK_DAYS).astype(int)
+    chunks, chunk_counts = np.unique(chunk_indices, return_counts=True)
+    direct = np.zeros(len(tt), dtype=bool)
+    for chunk, points in zip(chunks, chunk_counts):
+        in_chunk = chunk_indices == chunk
+        # a query sparser than the cached samples (e.g. a year at a few points per day) is cheaper to compute
+        # directly than to fill the chunk, so a not yet stored chunk is filled by dense queries only
+        if points < DENSE_QUERY_MIN_POINTS and not _chunk_is_stored(chunk):
+            direct |= in_chunk
+            continue
+        series = get_chunk_part(chunk, SERIES)
+        values[in_chunk] = np.interp(tt[in_chunk], series['tt'], series[field])
+    if direct.any():
+        values[direct] = compute(get_timescale().tt_jd(tt[direct]))  # a single batch for all the sparse chunks
+    values %= 360
+    return values if np.ndim(t.tt) else values[0]
+
+
+def _compute_moon_phase(t):
+    from moon_phases import moon_phase_at
+    return moon_phase_at(t)
+
+
+def _compute_moon_longitude(t):
+    from moon_zodiac import moon_longitude
+    return moon_longitude(t).degrees
+
+
+def moon_phase_at(t):
+    # the Moon phase (deg.) at a Time, scalar or array, read from the cache
+    if engine == 'chebyshev':
+        import chebyshev_engine
+        return chebyshev_engine.moon_phase_at(t)
+    if not enabled:
+        return _compute_moon_phase(t)
+    return _interpolate(t, 'phase', _compute_moon_phase)
+
+
+def moon_longitude_at(t):
+    # the ecliptic longitude (deg.) of the Moon at a Time, scalar or array, read from the cache
+    if engine == 'chebyshev':
+        import chebyshev_engine
+        return chebyshev_engine.moon_longitude_at(t)
+    if not enabled:
+        return _compute_moon_longitude(t)
+    return _interpolate(t, 'lon', _compute_moon_longitude)
+
+
+def get_events(start_time, end_time, kind):
+    # times and values of the events of a kind in the range, read from the cache
+    if not enabled:
+        return _search_events(start_time, end_time, kind)
+    first_chunk, last_chunk = int(np.floor(start_time.tt / CHUNK_DAYS)), int(np.floor(end_time.tt / CHUNK_DAYS))
+    tables = [get_chunk_part(chunk, EVENTS) for chunk in range(first_chunk, last_chunk + 1)]
+    events = np.concatenate(tables) if tables else np.empty(0, dtype=events_dtype)
+    events = events[(events['kind'] == kind) & (events['tt'] >= start_time.tt) & (events['tt'] < end_time.tt)]
+    return get_timescale().tt_jd(events['tt']), events['value'].astype(int)
+
+
+def _search_events(start_time, end_time, kind):
+    from moon_events import search_quarter_phases, search_sign_ingresses
+    from moon_phases import find_moon_eclipses
+
+    search = {QUARTER: search_quarter_phases, SIGN: search_sign_ingresses, ECLIPSE: find_moon_eclipses}[kind]
+    return search(start_time, end_time)
@@ -1,19 +1,101 @@
 import datetime
 
-from skyfield.api import load
+import numpy as np
+
+from skyfield.timelib import Time
+
+from ephemeris_registry import get_timescale
+
+# === time conversion ===
+# Dates of any form become a skyfield Time here, to the microsecond: an aware datetime by its own UTC offset, a
+# naive one as UTC (the convention of everything below the GUI: the timeline grid, the export, the service), a
+# numpy datetime64 as UTC, and a tuple as UTC (year, month, day[, hour, minute, second]). A list or array of dates
+# is a single vectorized ts.utc() call on microseconds since 1970, however many there are. The GUI shows the local
+# time of the system (or of a given zone) and converts at its boundary with local_to_utc() and utc_to_local().
+
+_US_PER_DAY = 86400 * 10 ** 6
+_EPOCH = datetime.datetime(1970, 1, 1)
+_AWARE_EPOCH = _EPOCH.replace(tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def utc_now():
+    # the current time as a naive UTC datetime
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def to_utc(date):
+    # a datetime as a naive UTC one: aware ones are converted, naive ones are UTC already
+    if date.tzinfo is None:
+        return date
+    return date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def local_to_utc(date, tz=None):
+    # a naive local (wall clock) datetime of a zone (tzinfo, None for the local zone of the system) as naive UTC
+    return to_utc(date.astimezone() if tz is None else date.replace(tzinfo=tz))
+
+
+def utc_to_local(date, tz=None):
+    # a naive UTC datetime as an aware one in a zone (tzinfo, None for the local zone of the system)
+    return date.replace(tzinfo=datetime.timezone.utc).astimezone(tz)
+
+
+def _epoch_us_to_time(us):
+    # a Time of microseconds since 1970 UTC (int64, scalar or array), split in days and time of the day as in
+    # utc_grid_time()
+    days, us_of_day = np.divmod(us, _US_PER_DAY)
+    if np.ndim(us) == 0:
+        days, us_of_day = int(days), int(us_of_day)
+    return get_timescale().utc(1970, 1, 1 + days, 0, 0, us_of_day / 1e6)
+
+
+def _epoch_us(date):
+    if isinstance(date, tuple):
+        date = datetime.datetime(*date)
+    return (date - (_EPOCH if date.tzinfo is None else _AWARE_EPOCH)) // _MICROSECOND
+
+
+def datetime64_to_timescale_time(times):
+    # a Time of UTC datetime64 (any unit, scalar or array) in one call, to the microsecond
+    return _epoch_us_to_time(np.asarray(times, dtype='datetime64[us]').astype(np.int64))
 
 
 def date_to_timescale_time(date):
-    ts = load.timescale()
+    # a Time of a date (see above), now if None
     if date is None:
-        t = ts.now()
-    elif isinstance(date, tuple):
-        t = ts.utc(*date[:5])  # e.g. t = ts.utc(2023, 7, 17, 0, 0)
-    elif isinstance(date, datetime.datetime):
-        t = ts.utc(*date.timetuple()[:5])
-    else:
-        raise ValueError(type(date))
-    return t
+        return get_timescale().now()
+    elif isinstance(date, Time):
+        return date
+    elif isinstance(date, (tuple, datetime.datetime)):
+        date = datetime.datetime(*date) if isinstance(date, tuple) else to_utc(date)
+        return get_timescale().utc(date.year, date.month, date.day, date.hour, date.minute,
+                                   date.second + date.microsecond / 1e6)
+    elif isinstance(date, np.datetime64):
+        return datetime64_to_timescale_time(date)
+    raise ValueError(type(date))
+
+
+def dates_to_timescale_time(dates):
+    # an array Time of a sequence of dates (see above), or of a datetime64 array, in a single conversion
+    if isinstance(dates, Time):
+        return dates
+    if isinstance(dates, np.ndarray) and dates.dtype.kind == 'M':
+        return datetime64_to_timescale_time(dates)
+    dates = dates if isinstance(dates, (list, tuple)) else list(dates)
+    try:
+        # naive datetimes, the common case, without a call per date
+        us = np.fromiter(((date - _EPOCH) // _MICROSECOND for date in dates), np.int64, len(dates))
+    except TypeError:
+        us = np.fromiter((_epoch_us(date) for date in dates), np.int64, len(dates))
+    return _epoch_us_to_time(us)
+
+
+def utc_grid_time(day, offsets):
+    # Array Time of a UTC grid: offsets (seconds, int array) from the midnight of a day (datetime);
+    # whole days and seconds of the day keep the grid on the UTC calendar over leap seconds
+    days, seconds = divmod(offsets, 86400)
+    return get_timescale().utc(day.year, day.month, day.day + days, 0, 0, seconds)
 
 
 import os, sys
@@ -0,0 +1,158 @@
+import datetime
+import math
+
+import numpy as np
+
+from eclipse_catalog import CATALOG_YEARS
+from ephemeris_registry import get_timescale
+from instrumentation import timed
+from moon_phases import get_moon_phases, get_moon_eclipses
+from moon_zodiac import get_moon_signs, signs
+from moon_events import find_quarter_phases, find_sign_ingresses, find_series_crossings
+from plot_helpers import lttb_downsample
+from skyfield_helpers import dates_to_timescale_time
+
+# === timeline computation ===
+# The data behind the calendar plot: Moon phase samples on a regular grid and the quarter phase, sign ingress and
+# eclipse events. Grid points are whole multiples of the sampling step from GRID_EPOCH, so timelines computed
+# separately for adjoining spans of the grid merge into one, and the grid of a step is a subset of the grid of
+# half of it. That lets the GUI extend an already computed timeline by the newly exposed edges only when panning,
+# and reuse it when zooming out.
+
+GRID_EPOCH = datetime.datetime(2000, 1, 1)
+DATE_RANGE = (datetime.datetime(CATALOG_YEARS[0], 1, 1), datetime.datetime(CATALOG_YEARS[1], 1, 1))  # the catalog years
+
+# The series is sampled by the plot width, not by the range: a few samples per pixel, but not finer than
+# the minimal step, and the plotted line is reduced to about the pixel count.
+# With a step above an hour the events are interpolated from the samples too.
+SAMPLES_PER_PIXEL = 4
+PLOTTED_POINTS_PER_PIXEL = 2
+MIN_SAMPLE_STEP = datetime.timedelta(minutes=10)
+EXACT_EVENTS_MAX_STEP = datetime.timedelta(hours=1)
+
+_list_fields = ('moon_phase_dates', 'quarter_dates', 'eclipses', 'sign_ingress_dates', 'sign_ingress_signs')
+_array_fields = ('moon_phases', 'quarter_phases', 'sign_ingress_phases')
+
+
+def sample_step(time_range, width_px):
+    # the step for a range plotted over width_px: MIN_SAMPLE_STEP times a power of two,
+    # giving from SAMPLES_PER_PIXEL / 2 to SAMPLES_PER_PIXEL samples per pixel
+    ideal_step = time_range / (width_px * SAMPLES_PER_PIXEL)
+    return MIN_SAMPLE_STEP * 2 ** max(0, math.ceil(math.log2(ideal_step / MIN_SAMPLE_STEP)))
+
+
+def grid_index(date, step):
+    # index of the last grid point at or before the date
+    return (date - GRID_EPOCH) // step
+
+
+def grid_date(index, step):
+    return GRID_EPOCH + step * index
+
+
+@timed('timeline.compute_span')
+def compute_span(step, first, last):
+    # the timeline on the grid points first, ..., last - 1 with the events from the first point to the last one;
+    # a module level function, so that it can run in a worker process
+    grid = np.datetime64(GRID_EPOCH, 'us') + np.arange(first, last + 1) * np.timedelta64(step)
+    dates = grid.tolist()  # and the next point for the crossings
+    t = dates_to_timescale_time(grid)
+    moon_phases = get_moon_phases(t)  # a single vectorized evaluation for the whole span
+
+    eclipses = get_moon_eclipses(dates[0], dates[-1])
+    if step <= EXACT_EVENTS_MAX_STEP:
+        # exact new moon, quarters and full moon times in the span, the phase is 0, 90, 180 or 270 there
+        quarter_times, quarters = find_quarter_phases(dates[0], dates[-1])
+        # exact times of the Moon entering a sign in the span
+        ingress_times, sign_indices = find_sign_ingresses(dates[0], dates[-1])
+    else:
+        # a long span: the same events interpolated from the samples, precise enough for a pixel
+        ts = get_timescale()
+        quarter_tt, quarters = find_series_crossings(t.tt, np.unwrap(moon_phases, period=360), 90)
+        quarter_times = ts.tt_jd(quarter_tt)
+        ingress_tt, sign_indices = find_series_crossings(t.tt, np.unwrap(get_moon_signs(t)[0], period=360), 30)
+        ingress_times = ts.tt_jd(ingress_tt)
+
+    return {
+        'step': step,
+        'first': first,
+        'last': last,
+        'moon_phase_dates': dates[:-1],
+        'moon_phases': moon_phases[:-1],
+        'quarter_dates': [d.replace(tzinfo=None) for d in quarter_times.utc_datetime()],
+        'quarter_phases': 90.0 * quarters,
+        'eclipses': eclipses,
+        'sign_ingress_dates': [d.replace(tzinfo=None) for d in ingress_times.utc_datetime()],
+        'sign_ingress_phases': get_moon_phases(ingress_times),
+        'sign_ingress_signs': [signs[i] for i in sign_indices],
+    }
+
+
+def compute_spans(step, bounds):
+    # several spans of a grid in one worker call, bounds is a list of (first, last)
+    return [compute_span(step, first, last) for first, last in bounds]
+
+
+def merge_spans(spans):
+    # one timeline of adjoining spans of the same grid given in order
+    for previous, span in zip(spans, spans[1:]):
+        if previous['step'] != span['step'] or previous['last'] != span['first']:
+            raise ValueError(f"spans {previous['first']}-{previous['last']} and {span['first']}-{span['last']} "
+                             f"do not adjoin")
+    merged = {'step': spans[0]['step'], 'first': spans[0]['first'], 'last': spans[-1]['last']}
+    for field in _list_fields:
+        merged[field] = [item for span in spans for item in span[field]]
+    for field in _array_fields:
+        merged[field] = np.concatenate([span[field] for span in spans])
+    return merged
+
+
+def _eclipse_date(eclipse):
+    eclipse_time, _ = eclipse
+    return datetime.datetime.strptime(eclipse_time[:19], '%Y-%m-%d %H:%M:%S')
+
+
+def _filter_events(timeline, start_date, end_date):
+    # the event fields of a timeline restricted to [start_date, end_date)
+    quarters = [start_date <= d < end_date for d in timeline['quarter_dates']]
+    ingresses = [start_date <= d < end_date for d in timeline['sign_ingress_dates']]
+    return {
+        'quarter_dates': [d for d, kept in zip(timeline['quarter_dates'], quarters) if kept],
+        'quarter_phases': timeline['quarter_phases'][np.asarray(quarters, dtype=bool)],
+        'eclipses': [e for e in timeline['eclipses'] if start_date <= _eclipse_date(e) < end_date],
+        'sign_ingress_dates': [d for d, kept in zip(timeline['sign_ingress_dates'], ingresses) if kept],
+        'sign_ingress_phases': timeline['sign_ingress_phases'][np.asarray(ingresses, dtype=bool)],
+        'sign_ingress_signs': [s for s, kept in zip(timeline['sign_ingress_signs'], ingresses) if kept],
+    }
+
+
+def trim_span(timeline, first, last):
+    # the part of a timeline on the grid points first, ..., last - 1
+    step = timeline['step']
+    first, last = max(first, timeline['first']), min(last, timeline['last'])
+    samples = slice(first - timeline['first'], max(first, last) - timeline['first'])
+    trimmed = {'step': step, 'first': first, 'last': max(first, last),
+               'moon_phase_dates': timeline['moon_phase_dates'][samples],
+               'moon_phases': timeline['moon_phases'][samples]}
+    trimmed.update(_filter_events(timeline, grid_date(first, step), grid_date(max(first, last), step)))
+    return trimmed
+
+
+def coarsen_span(timeline, factor):
+    # the timeline on the grid of a factor times longer step, made of every factor-th sample
+    first, last = -(-timeline['first'] // factor), timeline['last'] // factor
+    step = timeline['step'] * factor
+    samples = slice(first * factor - timeline['first'], max(first, last) * factor - timeline['first'], factor)
+    coarse = {'step': step, 'first': first, 'last': max(first, last),
+              'moon_phase_dates': timeline['moon_phase_dates'][samples],
+              'moon_phases': timeline['moon_phases'][samples]}
+    coarse.update(_filter_events(timeline, grid_date(first, step), grid_date(max(first, last), step)))
+    return coarse
+
+
+def plot_points(timeline, threshold):
+    # dates and y (the phase folded to 0 - 180) of the line keeping the shape of the series with threshold points
+    moon_phases = timeline['moon_phases']
+    y = np.where(moon_phases <= 180, moon_phases, 360 - moon_phases)
+    plotted = lttb_downsample(np.arange(len(y)), y, threshold)
+    return [timeline['moon_phase_dates'][i] for i in plotted], y[plotted]